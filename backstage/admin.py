@@ -1,8 +1,12 @@
 from django.contrib import admin
-from .models import Lista, FilmeCache, Filme, Profile, Comunidade, MembroComunidade, MensagemComunidade
+from .models import Lista, FilmeCache, TrilhoCache, SerieCache, TemporadaCache, AvaliacaoAgregada, Filme, Profile, Comunidade, MembroComunidade, MensagemComunidade
 
 admin.site.register(Lista)
 admin.site.register(FilmeCache)
+admin.site.register(TrilhoCache)
+admin.site.register(SerieCache)
+admin.site.register(TemporadaCache)
+admin.site.register(AvaliacaoAgregada)
 admin.site.register(Filme)
 admin.site.register(Profile)
 admin.site.register(Comunidade)
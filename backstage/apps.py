@@ -1,4 +1,24 @@
+import os
+import sys
 from django.apps import AppConfig
+from django.conf import settings
+
+# Executáveis que servem a aplicação (o agendador só roda neles e no runserver)
+SERVIDORES = ('gunicorn', 'uvicorn', 'daphne', 'uwsgi', 'hypercorn')
+
+
+def _processo_servidor():
+    """
+    True só no processo que atende requisições: migrate, test, shell e os
+    demais comandos ficam de fora, assim como o pai do autoreloader do runserver.
+    """
+    executavel = os.path.basename(sys.argv[0]) if sys.argv else ''
+    if any(nome in executavel for nome in SERVIDORES):
+        return True
+    if len(sys.argv) > 1 and sys.argv[1] == 'runserver':
+        return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
+    return False
+
 
 class BackstageConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
@@ -6,3 +26,9 @@ class BackstageConfig(AppConfig):
 
     def ready(self):
         import backstage.signals
+
+        # Aquecimento periódico do cache dentro do processo web (opcional);
+        # fora dele use `manage.py aquecer_cache --loop`
+        if getattr(settings, 'AQUECIMENTO_AGENDADOR_ATIVO', False) and _processo_servidor():
+            from backstage.services.aquecimento import iniciar_agendador
+            iniciar_agendador()
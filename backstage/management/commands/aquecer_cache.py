@@ -0,0 +1,23 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from backstage.services.aquecimento import aquecer_tudo, iniciar_agendador
+
+
+class Command(BaseCommand):
+    help = 'Atualiza os trilhos da home e os filmes mais acessados antes de expirarem'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=None, help='Quantidade de filmes mais acessados a aquecer')
+        parser.add_argument('--janela', type=int, default=None, help='Aquecer o que vence nos próximos N minutos')
+        parser.add_argument('--workers', type=int, default=None, help='Máximo de buscas simultâneas na TMDb')
+        parser.add_argument('--loop', action='store_true', help='Continuar rodando e aquecer periodicamente')
+
+    def handle(self, *args, **options):
+        janela = timedelta(minutes=options['janela']) if options['janela'] else None
+
+        trilhos, filmes = aquecer_tudo(top_n=options['top'], janela=janela, max_workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(f'✓ {trilhos} trilho(s) e {filmes} filme(s) atualizados'))
+
+        if options['loop']:
+            self.stdout.write('Aquecendo periodicamente (Ctrl+C para sair)...')
+            iniciar_agendador().join()
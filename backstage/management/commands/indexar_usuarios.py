@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from backstage.services.busca_usuarios import reconstruir_indice_usuarios
+
+
+class Command(BaseCommand):
+    help = 'Gera o índice de busca de pessoas (IndiceBuscaUsuario) dos usuários já existentes'
+
+    def handle(self, *args, **options):
+        total = reconstruir_indice_usuarios()
+        self.stdout.write(self.style.SUCCESS(f'✓ {total} usuário(s) indexado(s) para a busca'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from backstage.models import MensagemComunidade
+from backstage.services.chat import preencher_retratos
+
+
+class Command(BaseCommand):
+    help = 'Preenche o retrato do autor e o JSON pré-calculado das mensagens de chat já existentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Mensagens por lote')
+        parser.add_argument('--todas', action='store_true', help='Refaz também as mensagens já preenchidas')
+
+    def handle(self, *args, **options):
+        mensagens = MensagemComunidade.objects.all()
+        if not options['todas']:
+            mensagens = mensagens.filter(payload_json='')
+
+        ids = list(mensagens.order_by('id').values_list('id', flat=True))
+        lote = options['lote']
+        for inicio in range(0, len(ids), lote):
+            preencher_retratos(MensagemComunidade.objects.filter(id__in=ids[inicio:inicio + lote]))
+
+        self.stdout.write(self.style.SUCCESS(f'✓ {len(ids)} mensagem(ns) preenchida(s)'))
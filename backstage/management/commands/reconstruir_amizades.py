@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from backstage.services.amizades import reconstruir_arestas
+
+
+class Command(BaseCommand):
+    help = 'Gera as arestas simétricas (ArestaAmizade) das amizades já existentes'
+
+    def handle(self, *args, **options):
+        total = reconstruir_arestas()
+        self.stdout.write(self.style.SUCCESS(f'✓ Arestas geradas para {total} amizade(s)'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from backstage.services.avaliacoes import reconstruir_avaliacoes
+
+
+class Command(BaseCommand):
+    help = 'Recalcula do zero as médias do Backstage (críticas, favoritos e diário) de todos os títulos'
+
+    def handle(self, *args, **options):
+        titulos, notas = reconstruir_avaliacoes()
+        self.stdout.write(self.style.SUCCESS(f'✓ {titulos} título(s) recalculados a partir de {notas} nota(s)'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from backstage.services.amizades import reconstruir_arestas
+from backstage.signals import EVENTOS_FEED, publicar_no_feed
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera os eventos do feed de amigos a partir das críticas, diários e favoritos já existentes '
+        'e refaz as timelines (as arestas de amizade são reconstruídas antes)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sem-arestas', action='store_true',
+            help='Não reconstruir as arestas antes (só se reconstruir_amizades já rodou)'
+        )
+
+    def handle(self, *args, **options):
+        # O fan-out lê as ArestaAmizade: sem elas as timelines ficariam vazias
+        if not options['sem_arestas']:
+            amizades = reconstruir_arestas()
+            self.stdout.write(f'Arestas conferidas para {amizades} amizade(s)')
+
+        total = 0
+        for modelo in EVENTOS_FEED:
+            consulta = modelo.objects.all()
+            if hasattr(modelo, 'filme'):
+                consulta = consulta.select_related('filme')
+            elif hasattr(modelo, 'serie'):
+                consulta = consulta.select_related('serie')
+            for instancia in consulta.iterator():
+                publicar_no_feed(instancia, forcar_fanout=True)
+                total += 1
+        self.stdout.write(self.style.SUCCESS(f'✓ {total} evento(s) publicados no feed'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from backstage.services.tmdb import remover_trilhos_legados
+
+
+class Command(BaseCommand):
+    help = 'Remove do FilmeCache os trilhos da home gravados pela versão antiga (IDs 999994–999999); rodar uma vez'
+
+    def handle(self, *args, **options):
+        removidos = remover_trilhos_legados()
+        self.stdout.write(self.style.SUCCESS(f'✓ {removidos} trilho(s) legado(s) removido(s) do FilmeCache'))
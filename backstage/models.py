@@ -1,10 +1,14 @@
 from django.db import models
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex
 from django.utils.text import slugify
 import string
 import random
 
+# Índices exclusivos do PostgreSQL (trigramas) só entram quando o banco é PostgreSQL
+USA_POSTGRES = settings.DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql'
+
 class Filme(models.Model):
     tmdb_id = models.IntegerField(unique=True, null=True, blank=True)
     titulo = models.CharField(max_length=255)
@@ -27,6 +31,9 @@ class Critica(models.Model):
     tem_spoiler = models.BooleanField(default=False, verbose_name="Contém spoiler")
     criado_em = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['usuario', '-criado_em', '-id'])]
+
     def __str__(self):
         return f"{self.usuario} - {self.filme} ({self.nota})"
 
@@ -34,13 +41,65 @@ class FilmeCache(models.Model):
     id_tmdb = models.PositiveIntegerField(unique=True)
     payload = models.JSONField()
     atualizado_em = models.DateTimeField(auto_now=True)
+    acessos = models.PositiveIntegerField(default=0, db_index=True)
+    class Meta:
+        ordering = ('-atualizado_em',)
+
+    def __str__(self):
+        return f'{self.id_tmdb} (atualizado_em={self.atualizado_em})'
+
+
+class TrilhoCache(models.Model):
+    """Cache dos trilhos da página inicial, uma linha por variante (trilho + parâmetros)"""
+    trilho = models.CharField(max_length=50)
+    parametros = models.CharField(max_length=200, blank=True, default='')
+    regiao = models.CharField(max_length=10, default='BR')
+    idioma = models.CharField(max_length=10, default='pt-BR')
+    payload = models.JSONField()
+    atualizado_em = models.DateTimeField(auto_now=True)
+    expira_em = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('trilho', 'parametros', 'regiao', 'idioma')
+        verbose_name = "Cache de Trilho"
+        verbose_name_plural = "Cache de Trilhos"
+
+    def __str__(self):
+        return f'{self.trilho}[{self.parametros}] {self.regiao}/{self.idioma} (expira_em={self.expira_em})'
+
+
+class SerieCache(models.Model):
+    """Payload de detalhes de série já formatado (equivalente ao FilmeCache)"""
+    id_tmdb = models.PositiveIntegerField(unique=True)
+    payload = models.JSONField()
+    atualizado_em = models.DateTimeField(auto_now=True)
+
     class Meta:
         ordering = ('-atualizado_em',)
+        verbose_name = "Cache de Série"
+        verbose_name_plural = "Cache de Séries"
 
     def __str__(self):
         return f'{self.id_tmdb} (atualizado_em={self.atualizado_em})'
 
 
+class TemporadaCache(models.Model):
+    """Episódios de uma temporada de série, com validade conforme o status da série"""
+    serie_tmdb_id = models.PositiveIntegerField()
+    numero = models.PositiveIntegerField()
+    payload = models.JSONField()
+    atualizado_em = models.DateTimeField(auto_now=True)
+    expira_em = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('serie_tmdb_id', 'numero')
+        verbose_name = "Cache de Temporada"
+        verbose_name_plural = "Cache de Temporadas"
+
+    def __str__(self):
+        return f'{self.serie_tmdb_id} T{self.numero} (expira_em={self.expira_em})'
+
+
 class Lista(models.Model):
     nome = models.CharField(max_length=100)
     descricao = models.TextField(blank=True, null=True)
@@ -80,6 +139,9 @@ class CriticaSerie(models.Model):
     tem_spoiler = models.BooleanField(default=False, verbose_name="Contém spoiler")
     criado_em = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['usuario', '-criado_em', '-id'])]
+
     def __str__(self):
         return f"{self.usuario} - {self.serie} ({self.nota})"
 
@@ -220,6 +282,26 @@ class Amizade(models.Model):
     def __str__(self):
         return f"{self.usuario1.username} ↔ {self.usuario2.username}"
 
+class ArestaAmizade(models.Model):
+    """
+    Amizade vista de um dos lados: cada Amizade gera duas arestas (a->b e b->a),
+    então "amigos de X" e "X e Y são amigos?" viram consultas simples por índice.
+    Mantida pelos sinais de Amizade; apagada em cascata junto com ela.
+    """
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='arestas_amizade')
+    amigo = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='arestas_como_amigo')
+    amizade = models.ForeignKey(Amizade, on_delete=models.CASCADE, related_name='arestas')
+    data_criacao = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('usuario', 'amigo')
+        verbose_name = "Aresta de Amizade"
+        verbose_name_plural = "Arestas de Amizade"
+
+    def __str__(self):
+        return f"{self.usuario_id} → {self.amigo_id}"
+
+
 class DiarioFilme(models.Model):
     usuario = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -401,10 +483,19 @@ class MensagemComunidade(models.Model):
     filme_poster = models.URLField(blank=True, null=True)
     filme_trailer = models.URLField(blank=True, null=True)
 
+    # Retrato do autor no momento do envio: as listas do chat saem sem join com usuário/perfil
+    autor_username = models.CharField(max_length=150, blank=True, default='')
+    autor_foto = models.CharField(max_length=500, blank=True, null=True)
+    autor_papel = models.CharField(max_length=20, blank=True, default='')
+    # Mensagem já serializada (fragmento JSON devolvido pelas APIs do chat)
+    payload_json = models.TextField(blank=True, default='')
+
     class Meta:
         verbose_name = "Mensagem da Comunidade"
         verbose_name_plural = "Mensagens da Comunidade"
         ordering = ['criado_em']
+        # Histórico paginado por ID dentro da comunidade ("últimas N", "antes do ID X")
+        indexes = [models.Index(fields=['comunidade', 'id'])]
 
     def __str__(self):
         return f"{self.usuario.username} em {self.comunidade.nome}: {self.conteudo[:50]}"
@@ -456,3 +547,110 @@ class SerieFavorita(models.Model):
 
     def __str__(self):
         return f"{self.usuario.username} - {self.titulo} ({self.nota}⭐)"
+
+
+TIPOS_OBRA = [('filme', 'Filme'), ('serie', 'Série')]
+
+
+class AvaliacaoAgregada(models.Model):
+    """
+    Média do Backstage por título, mantida incrementalmente (ver services/avaliacoes.py).
+    Cada usuário conta uma vez, com a nota efetiva guardada em NotaEfetiva.
+    """
+    tipo = models.CharField(max_length=5, choices=TIPOS_OBRA)
+    tmdb_id = models.IntegerField()
+    soma = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('tipo', 'tmdb_id')
+        verbose_name = "Avaliação Agregada"
+        verbose_name_plural = "Avaliações Agregadas"
+
+    @property
+    def media(self):
+        return round(self.soma / self.total, 1) if self.total else None
+
+    def __str__(self):
+        return f"{self.tipo} {self.tmdb_id}: {self.media} ({self.total})"
+
+
+class NotaEfetiva(models.Model):
+    """Nota que conta na média do título para um usuário (diário > favorito > crítica)"""
+    ORIGENS = [('diario', 'Diário'), ('favorito', 'Favorito'), ('critica', 'Crítica')]
+
+    tipo = models.CharField(max_length=5, choices=TIPOS_OBRA)
+    tmdb_id = models.IntegerField()
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notas_efetivas')
+    nota = models.IntegerField()
+    origem = models.CharField(max_length=10, choices=ORIGENS)
+
+    class Meta:
+        unique_together = ('tipo', 'tmdb_id', 'usuario')
+        verbose_name = "Nota Efetiva"
+        verbose_name_plural = "Notas Efetivas"
+
+    def __str__(self):
+        return f"{self.usuario_id} - {self.tipo} {self.tmdb_id}: {self.nota} ({self.origem})"
+
+
+class EventoFeed(models.Model):
+    """Atividade de um usuário (crítica, diário ou favorito) exibida no feed dos amigos"""
+    TIPOS_EVENTO = [('critica', 'Crítica'), ('diario', 'Diário'), ('favorito', 'Favorito')]
+
+    autor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='eventos_feed')
+    origem = models.CharField(max_length=40, unique=True)  # ex.: "critica:12", "diario_serie:3"
+    tipo_evento = models.CharField(max_length=10, choices=TIPOS_EVENTO)
+    tipo_obra = models.CharField(max_length=5, choices=TIPOS_OBRA)
+    tmdb_id = models.IntegerField()
+    titulo = models.CharField(max_length=255)
+    nota = models.IntegerField(null=True, blank=True)
+    criado_em = models.DateTimeField(db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['autor', '-criado_em'])]
+        verbose_name = "Evento do Feed"
+        verbose_name_plural = "Eventos do Feed"
+
+    def __str__(self):
+        return f"{self.autor_id} {self.tipo_evento} {self.tipo_obra} {self.tmdb_id}"
+
+
+class EntradaFeed(models.Model):
+    """Linha do tempo pré-calculada: um evento de amigo na timeline de um usuário (fan-out na escrita)"""
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='feed')
+    evento = models.ForeignKey(EventoFeed, on_delete=models.CASCADE, related_name='entradas')
+    criado_em = models.DateTimeField()  # cópia de evento.criado_em para a leitura por faixa no índice
+
+    class Meta:
+        unique_together = ('usuario', 'evento')
+        indexes = [models.Index(fields=['usuario', '-criado_em', '-id'])]
+        verbose_name = "Entrada do Feed"
+        verbose_name_plural = "Entradas do Feed"
+
+    def __str__(self):
+        return f"{self.usuario_id} <- {self.evento}"
+
+
+class IndiceBuscaUsuario(models.Model):
+    """
+    Termo de busca normalizado de cada usuário (username, nome e sobrenome,
+    minúsculo e sem acentos), usado pela busca de pessoas. No PostgreSQL tem
+    índice GIN de trigramas; em outros bancos a busca usa a trie em memória.
+    """
+    usuario = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='indice_busca'
+    )
+    termo = models.CharField(max_length=320)
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['termo'], name='busca_usuario_trgm_idx', opclasses=['gin_trgm_ops'])
+        ] if USA_POSTGRES else []
+        verbose_name = "Índice de Busca de Usuário"
+        verbose_name_plural = "Índices de Busca de Usuários"
+
+    def __str__(self):
+        return f"{self.usuario_id}: {self.termo}"
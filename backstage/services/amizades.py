@@ -0,0 +1,102 @@
+from django.contrib.auth.models import User
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from ..models import Amizade, ArestaAmizade, SolicitacaoAmizade, Critica, Lista, DiarioFilme
+
+
+def criar_arestas(amizade):
+    """Grava as duas direções da amizade (chamado pelo sinal de Amizade)"""
+    ArestaAmizade.objects.bulk_create([
+        ArestaAmizade(usuario_id=amizade.usuario1_id, amigo_id=amizade.usuario2_id, amizade=amizade),
+        ArestaAmizade(usuario_id=amizade.usuario2_id, amigo_id=amizade.usuario1_id, amizade=amizade),
+    ], ignore_conflicts=True)
+
+
+def amigos_ids(usuario_id):
+    """IDs dos amigos do usuário"""
+    return list(ArestaAmizade.objects.filter(usuario_id=usuario_id).values_list('amigo_id', flat=True))
+
+
+def amigos_de(usuario):
+    """QuerySet dos amigos (User) do usuário"""
+    return User.objects.filter(arestas_como_amigo__usuario=usuario)
+
+
+def _contagem_por_usuario(modelo):
+    """Subquery correlacionada com o total de linhas de `modelo` do usuário da linha externa"""
+    total = modelo.objects.filter(usuario=OuterRef('pk')).order_by().values('usuario') \
+        .annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(total, output_field=IntegerField()), 0)
+
+
+def amigos_com_contadores(usuario):
+    """
+    Amigos do usuário com `criticas_count`, `listas_count` e `diario_count`
+    calculados no próprio SELECT (subqueries correlacionadas que usam o
+    índice de usuário de cada tabela): uma única consulta, qualquer que seja
+    o número de amigos.
+    """
+    return amigos_de(usuario).select_related('profile').annotate(
+        criticas_count=_contagem_por_usuario(Critica),
+        listas_count=_contagem_por_usuario(Lista),
+        diario_count=_contagem_por_usuario(DiarioFilme),
+    ).order_by('username')
+
+
+def contar_amigos(usuario):
+    return ArestaAmizade.objects.filter(usuario=usuario).count()
+
+
+def verificar_amizade(usuario_a, usuario_b):
+    """True se os dois usuários são amigos (uma consulta pelo índice único)"""
+    return ArestaAmizade.objects.filter(usuario=usuario_a, amigo=usuario_b).exists()
+
+
+def obter_amizade(usuario_a, usuario_b):
+    """A Amizade entre os dois usuários (em qualquer ordem) ou None"""
+    aresta = ArestaAmizade.objects.filter(usuario=usuario_a, amigo=usuario_b).select_related('amizade').first()
+    return aresta.amizade if aresta else None
+
+
+STATUS_RELACIONAMENTO = {
+    'amigo': 'Amigo',
+    'pendente_enviada': 'Solicitação enviada',
+    'pendente_recebida': 'Aceitar solicitação',
+    'adicionar': 'Adicionar amigo',
+}
+
+
+def status_relacionamentos(usuario, ids):
+    """
+    Status de relacionamento do `usuario` com cada um dos `ids` em duas
+    consultas, independente da quantidade: arestas de amizade e solicitações
+    pendentes (nas duas direções).
+
+    Retorna dict id -> status ('amigo', 'pendente_enviada', 'pendente_recebida'
+    ou 'adicionar'); o texto para exibição está em STATUS_RELACIONAMENTO.
+    """
+    ids = list(ids)
+    status = dict.fromkeys(ids, 'adicionar')
+
+    pendentes = SolicitacaoAmizade.objects.filter(
+        Q(remetente=usuario, destinatario_id__in=ids) | Q(destinatario=usuario, remetente_id__in=ids),
+        status='pending'
+    ).values_list('remetente_id', 'destinatario_id')
+    for remetente_id, destinatario_id in pendentes:
+        if remetente_id == usuario.id:
+            status[destinatario_id] = 'pendente_enviada'
+        elif status[remetente_id] != 'pendente_enviada':
+            status[remetente_id] = 'pendente_recebida'
+
+    for amigo_id in ArestaAmizade.objects.filter(usuario=usuario, amigo_id__in=ids).values_list('amigo_id', flat=True):
+        status[amigo_id] = 'amigo'
+    return status
+
+
+def reconstruir_arestas():
+    """Gera as arestas de todas as amizades existentes; retorna quantas amizades foram processadas"""
+    total = 0
+    for amizade in Amizade.objects.all().iterator():
+        criar_arestas(amizade)
+        total += 1
+    return total
@@ -0,0 +1,150 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from django.conf import settings
+from django.db import connections
+from ..models import FilmeCache, TrilhoCache
+from .cache import adquirir_lock, liberar_lock
+from . import tmdb
+
+# Variantes de trilhos usadas pela página inicial (ver views.filmes_home)
+TRILHOS_HOME = [
+    ('trending', {'limit': 5}),
+    ('goats', {'limit': 20}),
+    ('recommended', {'limit': 12}),
+    ('now_playing', {'limit': 12}),
+    ('classics', {'limit': 12}),
+]
+
+
+def _parametros_do_trilho(texto):
+    """Converte 'limit=12&page=1' de volta para {'limit': 12, 'page': 1}"""
+    parametros = {}
+    for par in filter(None, texto.split('&')):
+        chave, _, valor = par.partition('=')
+        parametros[chave] = int(valor) if valor.isdigit() else valor
+    return parametros
+
+
+def _executar_limitado(tarefas, max_workers):
+    """
+    Executa as funções de `tarefas` em um pool limitado de threads.
+    Cada thread fecha as próprias conexões com o banco ao terminar.
+    Retorna quantas terminaram sem erro.
+    """
+    def _rodar(func):
+        try:
+            func()
+            return True
+        except Exception as e:
+            print(f"[AQUECIMENTO] Falha: {e}")
+            return False
+        finally:
+            connections.close_all()
+
+    if not tarefas:
+        return 0
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="aquecimento") as executor:
+        return sum(executor.map(_rodar, tarefas))
+
+
+def aquecer_trilhos(janela=None, max_workers=None):
+    """
+    Atualiza os trilhos que vencem dentro de `janela` (timedelta) e cria
+    os trilhos da home que ainda não estão em cache.
+    """
+    janela = janela or timedelta(minutes=getattr(settings, "AQUECIMENTO_JANELA_MINUTOS", 30))
+    max_workers = max_workers or getattr(settings, "AQUECIMENTO_MAX_WORKERS", 4)
+    limite = datetime.now(timezone.utc) + janela
+
+    variantes = {}
+    for trilho, parametros in TRILHOS_HOME:
+        chave = tmdb._chave_trilho(trilho, **parametros)
+        if not TrilhoCache.objects.filter(**chave, expira_em__gt=limite).exists():
+            variantes[tuple(chave.values())] = (trilho, parametros, chave['regiao'], chave['idioma'])
+
+    vencendo = TrilhoCache.objects.filter(expira_em__lte=limite, trilho__in=tmdb.CONSTRUTORES_TRILHOS)
+    for tc in vencendo:
+        variantes[(tc.trilho, tc.parametros, tc.regiao, tc.idioma)] = (
+            tc.trilho, _parametros_do_trilho(tc.parametros), tc.regiao, tc.idioma
+        )
+
+    tarefas = [
+        (lambda t=t, p=p, r=r, i=i: tmdb.atualizar_trilho(t, regiao=r, idioma=i, **p))
+        for t, p, r, i in variantes.values()
+    ]
+    return _executar_limitado(tarefas, max_workers)
+
+
+def aquecer_filmes(top_n=None, janela=None, max_workers=None):
+    """
+    Atualiza os `top_n` filmes mais acessados cujo payload no FilmeCache
+    vence dentro de `janela`.
+    """
+    top_n = top_n or getattr(settings, "AQUECIMENTO_TOP_FILMES", 50)
+    janela = janela or timedelta(minutes=getattr(settings, "AQUECIMENTO_JANELA_MINUTOS", 30))
+    max_workers = max_workers or getattr(settings, "AQUECIMENTO_MAX_WORKERS", 4)
+
+    # Atualizado antes deste instante => vence dentro da janela
+    corte = datetime.now(timezone.utc) - timedelta(minutes=tmdb.TTL_FILME_MINUTOS) + janela
+    ids = list(
+        FilmeCache.objects.filter(acessos__gt=0, atualizado_em__lte=corte)
+        .order_by('-acessos')
+        .values_list('id_tmdb', flat=True)[:top_n]
+    )
+
+    tarefas = [
+        (lambda id_tmdb=id_tmdb: tmdb._atualizar_filme_cache(id_tmdb, tmdb.TTL_FILME_MINUTOS))
+        for id_tmdb in ids
+    ]
+    return _executar_limitado(tarefas, max_workers)
+
+
+def aquecer_tudo(**opcoes):
+    """Aquece trilhos e filmes; só um processo por vez executa o ciclo"""
+    if not adquirir_lock("aquecimento", ttl=getattr(settings, "AQUECIMENTO_INTERVALO", 600)):
+        print("[AQUECIMENTO] Outro processo já está aquecendo o cache")
+        return 0, 0
+    try:
+        trilhos = aquecer_trilhos(
+            janela=opcoes.get('janela'), max_workers=opcoes.get('max_workers')
+        )
+        filmes = aquecer_filmes(
+            top_n=opcoes.get('top_n'), janela=opcoes.get('janela'), max_workers=opcoes.get('max_workers')
+        )
+        return trilhos, filmes
+    finally:
+        liberar_lock("aquecimento")
+
+
+def _loop_agendador(intervalo, jitter):
+    while True:
+        # Jitter evita que vários processos acordem ao mesmo tempo
+        time.sleep(max(1, intervalo + random.uniform(-jitter, jitter)))
+        try:
+            trilhos, filmes = aquecer_tudo()
+            print(f"[AQUECIMENTO] {trilhos} trilho(s) e {filmes} filme(s) atualizados")
+        except Exception as e:
+            print(f"[AQUECIMENTO] Erro no ciclo: {e}")
+        finally:
+            connections.close_all()
+
+
+_agendador = None
+
+
+def iniciar_agendador(intervalo=None, jitter=None):
+    """Inicia (uma vez por processo) a thread que aquece o cache periodicamente"""
+    global _agendador
+    if _agendador is not None:
+        return _agendador
+
+    intervalo = intervalo or getattr(settings, "AQUECIMENTO_INTERVALO", 600)
+    jitter = jitter if jitter is not None else getattr(settings, "AQUECIMENTO_JITTER", 60)
+    _agendador = threading.Thread(
+        target=_loop_agendador, args=(intervalo, jitter), name="aquecimento-agendador", daemon=True
+    )
+    _agendador.start()
+    return _agendador
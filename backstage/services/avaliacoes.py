@@ -0,0 +1,128 @@
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import F
+from ..models import (
+    AvaliacaoAgregada, NotaEfetiva, Critica, CriticaSerie,
+    DiarioFilme, DiarioSerie, FilmeFavorito, SerieFavorita,
+)
+
+def _nota_efetiva(tipo, tmdb_id, usuario_id):
+    """
+    Nota do usuário que conta na média do título, com a precedência
+    diário (entrada mais recente) > favorito > crítica (mais recente).
+    Retorna (nota, origem) ou None.
+    """
+    if tipo == 'filme':
+        diario = DiarioFilme.objects.filter(usuario_id=usuario_id, filme__tmdb_id=tmdb_id)
+        favorito = FilmeFavorito.objects.filter(usuario_id=usuario_id, tmdb_id=tmdb_id)
+        critica = Critica.objects.filter(usuario_id=usuario_id, filme__tmdb_id=tmdb_id)
+    else:
+        diario = DiarioSerie.objects.filter(usuario_id=usuario_id, serie__tmdb_id=tmdb_id)
+        favorito = SerieFavorita.objects.filter(usuario_id=usuario_id, tmdb_id=tmdb_id)
+        critica = CriticaSerie.objects.filter(usuario_id=usuario_id, serie__tmdb_id=tmdb_id)
+
+    for origem, consulta in (
+        ('diario', diario.order_by('-data_assistido', '-criado_em')),
+        ('favorito', favorito),
+        ('critica', critica.order_by('-criado_em', '-id')),
+    ):
+        nota = consulta.values_list('nota', flat=True).first()
+        if nota is not None:
+            return nota, origem
+    return None
+
+
+def _ajustar_agregado(tipo, tmdb_id, delta_soma, delta_total):
+    if not delta_soma and not delta_total:
+        return
+    AvaliacaoAgregada.objects.get_or_create(tipo=tipo, tmdb_id=tmdb_id)
+    AvaliacaoAgregada.objects.filter(tipo=tipo, tmdb_id=tmdb_id).update(
+        soma=F('soma') + delta_soma, total=F('total') + delta_total
+    )
+
+
+def atualizar_nota_usuario(tipo, tmdb_id, usuario_id):
+    """
+    Recalcula a nota efetiva de um usuário para um título e aplica só a
+    diferença na AvaliacaoAgregada (chamado pelos sinais de crítica, diário e favorito).
+    """
+    if not tmdb_id or not usuario_id:
+        return
+
+    with transaction.atomic():
+        nova = _nota_efetiva(tipo, tmdb_id, usuario_id)
+        anterior = NotaEfetiva.objects.select_for_update().filter(
+            tipo=tipo, tmdb_id=tmdb_id, usuario_id=usuario_id
+        ).first()
+
+        if anterior and nova:
+            _ajustar_agregado(tipo, tmdb_id, nova[0] - anterior.nota, 0)
+            anterior.nota, anterior.origem = nova
+            anterior.save(update_fields=['nota', 'origem'])
+        elif nova:
+            _ajustar_agregado(tipo, tmdb_id, nova[0], 1)
+            NotaEfetiva.objects.create(
+                tipo=tipo, tmdb_id=tmdb_id, usuario_id=usuario_id, nota=nova[0], origem=nova[1]
+            )
+        elif anterior:
+            _ajustar_agregado(tipo, tmdb_id, -anterior.nota, -1)
+            anterior.delete()
+
+
+def remover_notas_usuario(usuario_id):
+    """Tira da média todas as notas de um usuário que está sendo removido"""
+    with transaction.atomic():
+        for nota in NotaEfetiva.objects.select_for_update().filter(usuario_id=usuario_id):
+            _ajustar_agregado(nota.tipo, nota.tmdb_id, -nota.nota, -1)
+        NotaEfetiva.objects.filter(usuario_id=usuario_id).delete()
+
+
+def obter_media_backstage(tipo, tmdb_id):
+    """Retorna (média com 1 casa decimal ou None, total de avaliações) lendo uma única linha"""
+    agregado = AvaliacaoAgregada.objects.filter(tipo=tipo, tmdb_id=tmdb_id).first()
+    if not agregado or not agregado.total:
+        return None, 0
+    return agregado.media, agregado.total
+
+
+def reconstruir_avaliacoes():
+    """
+    Recalcula do zero NotaEfetiva e AvaliacaoAgregada a partir de críticas,
+    favoritos e diário. Usado pelo comando reconstruir_avaliacoes.
+    Retorna (títulos, notas).
+    """
+    notas = {}
+
+    def _coletar(tipo, linhas, origem):
+        # Linhas vêm da menor para a maior precedência dentro da origem;
+        # origens mais fortes são coletadas por último e sobrescrevem
+        for usuario_id, tmdb_id, nota in linhas:
+            if usuario_id and tmdb_id:
+                notas[(tipo, tmdb_id, usuario_id)] = (nota, origem)
+
+    for tipo, critica, favorito, diario, campo in (
+        ('filme', Critica, FilmeFavorito, DiarioFilme, 'filme__tmdb_id'),
+        ('serie', CriticaSerie, SerieFavorita, DiarioSerie, 'serie__tmdb_id'),
+    ):
+        _coletar(tipo, critica.objects.order_by('criado_em', 'id').values_list('usuario_id', campo, 'nota'), 'critica')
+        _coletar(tipo, favorito.objects.order_by().values_list('usuario_id', 'tmdb_id', 'nota'), 'favorito')
+        _coletar(tipo, diario.objects.order_by('data_assistido', 'criado_em').values_list('usuario_id', campo, 'nota'), 'diario')
+
+    agregados = defaultdict(lambda: [0, 0])
+    for (tipo, tmdb_id, _), (nota, _) in notas.items():
+        agregados[(tipo, tmdb_id)][0] += nota
+        agregados[(tipo, tmdb_id)][1] += 1
+
+    with transaction.atomic():
+        NotaEfetiva.objects.all().delete()
+        AvaliacaoAgregada.objects.all().delete()
+        NotaEfetiva.objects.bulk_create([
+            NotaEfetiva(tipo=tipo, tmdb_id=tmdb_id, usuario_id=usuario_id, nota=nota, origem=origem)
+            for (tipo, tmdb_id, usuario_id), (nota, origem) in notas.items()
+        ], batch_size=1000)
+        AvaliacaoAgregada.objects.bulk_create([
+            AvaliacaoAgregada(tipo=tipo, tmdb_id=tmdb_id, soma=soma, total=total)
+            for (tipo, tmdb_id), (soma, total) in agregados.items()
+        ], batch_size=1000)
+
+    return len(agregados), len(notas)
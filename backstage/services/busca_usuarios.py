@@ -0,0 +1,219 @@
+import threading
+import unicodedata
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from ..models import IndiceBuscaUsuario
+
+CAMPOS_BUSCA = {'username', 'first_name', 'last_name'}
+
+
+def normalizar(texto):
+    """Minúsculo, sem acentos e com espaços simples"""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+
+def termo_de_busca(usuario):
+    return normalizar(f"{usuario.username} {usuario.first_name} {usuario.last_name}")
+
+
+class TriePrefixos:
+    """
+    Trie de prefixos das palavras do termo de cada usuário. Cada nó guarda os
+    IDs de todos os usuários com alguma palavra que passa por ele, então a
+    busca de um prefixo custa O(tamanho do prefixo).
+    """
+
+    def __init__(self):
+        self._raiz = {}
+        self._termos = {}  # usuario_id -> termo indexado
+        self._lock = threading.Lock()
+        self.marca = None  # maior atualizado_em já aplicado
+        self.carregada = False
+
+    def _inserir(self, usuario_id, termo):
+        for palavra in set(termo.split()):
+            no = self._raiz
+            for letra in palavra:
+                no = no.setdefault(letra, {'ids': set()})
+                no['ids'].add(usuario_id)
+
+    def _retirar(self, usuario_id):
+        termo = self._termos.pop(usuario_id, None)
+        if not termo:
+            return
+        for palavra in set(termo.split()):
+            no = self._raiz
+            for letra in palavra:
+                no = no.get(letra)
+                if no is None:
+                    break
+                no['ids'].discard(usuario_id)
+
+    def atualizar(self, usuario_id, termo):
+        with self._lock:
+            if self._termos.get(usuario_id) == termo:
+                return
+            self._retirar(usuario_id)
+            self._termos[usuario_id] = termo
+            self._inserir(usuario_id, termo)
+
+    def remover(self, usuario_id):
+        with self._lock:
+            self._retirar(usuario_id)
+
+    def limpar(self):
+        with self._lock:
+            self._raiz, self._termos = {}, {}
+            self.marca, self.carregada = None, False
+
+    def _ids_do_prefixo(self, prefixo):
+        no = self._raiz
+        for letra in prefixo:
+            no = no.get(letra)
+            if no is None:
+                return set()
+        return set(no['ids'])
+
+    def buscar(self, consulta):
+        """IDs cujo termo tem, para cada palavra da consulta, uma palavra começando com ela"""
+        palavras = consulta.split()
+        if not palavras:
+            return set()
+        with self._lock:
+            ids = self._ids_do_prefixo(palavras[0])
+            for palavra in palavras[1:]:
+                ids &= self._ids_do_prefixo(palavra)
+            return ids
+
+    def termo(self, usuario_id):
+        return self._termos.get(usuario_id, '')
+
+
+# Trie local de cada processo (usada quando o banco não é PostgreSQL)
+_trie = TriePrefixos()
+
+
+def _usa_trigramas():
+    return connection.vendor == 'postgresql'
+
+
+def _sincronizar_trie():
+    """
+    Carrega a trie na primeira busca e, depois, aplica só as linhas do índice
+    alteradas desde a última sincronização (inclusive por outros processos).
+    """
+    linhas = IndiceBuscaUsuario.objects.all()
+    if _trie.carregada and _trie.marca:
+        linhas = linhas.filter(atualizado_em__gt=_trie.marca)
+    for usuario_id, termo, atualizado_em in linhas.values_list('usuario_id', 'termo', 'atualizado_em'):
+        _trie.atualizar(usuario_id, termo)
+        if _trie.marca is None or atualizado_em > _trie.marca:
+            _trie.marca = atualizado_em
+    _trie.carregada = True
+
+
+def indexar_usuario(usuario):
+    """Grava o termo de busca do usuário (se mudou) e atualiza a trie local"""
+    termo = termo_de_busca(usuario)
+    alterados = IndiceBuscaUsuario.objects.filter(usuario_id=usuario.pk).exclude(termo=termo) \
+        .update(termo=termo, atualizado_em=timezone.now())
+    if not alterados:
+        IndiceBuscaUsuario.objects.get_or_create(usuario_id=usuario.pk, defaults={'termo': termo})
+    if _trie.carregada:
+        _trie.atualizar(usuario.pk, termo)
+
+
+def remover_usuario_do_indice(usuario_id):
+    _trie.remover(usuario_id)
+
+
+def reconstruir_indice_usuarios():
+    """Regrava o índice de busca de todos os usuários. Retorna o total indexado."""
+    indices = [
+        IndiceBuscaUsuario(usuario_id=usuario.pk, termo=termo_de_busca(usuario))
+        for usuario in User.objects.only('id', 'username', 'first_name', 'last_name').iterator()
+    ]
+    with transaction.atomic():
+        IndiceBuscaUsuario.objects.all().delete()
+        IndiceBuscaUsuario.objects.bulk_create(indices, batch_size=1000)
+    _trie.limpar()
+    return len(indices)
+
+
+def _buscar_ids_trigramas(consulta, limite, excluir_id):
+    """
+    PostgreSQL: substring (LIKE) ou similaridade de palavra (operador <%), os
+    dois atendidos pelo índice GIN gin_trgm_ops. O corte de similaridade vai
+    em pg_trgm.word_similarity_threshold (só nesta transação), e a anotação
+    serve apenas para ordenar os resultados.
+    """
+    from django.contrib.postgres.search import TrigramWordSimilarity
+
+    similaridade = getattr(settings, "BUSCA_USUARIOS_SIMILARIDADE", 0.3)
+    # termo e consulta já estão normalizados (minúsculos), então LIKE basta e usa o índice
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)", [str(similaridade)])
+        return list(
+            IndiceBuscaUsuario.objects
+            .filter(Q(termo__trigram_word_similar=consulta) | Q(termo__contains=consulta))
+            .exclude(usuario_id=excluir_id)
+            .annotate(similaridade=TrigramWordSimilarity(consulta, 'termo'))
+            .order_by('-similaridade', 'termo')
+            .values_list('usuario_id', flat=True)[:limite]
+        )
+
+
+def _buscar_ids_trie(consulta, excluir_id):
+    """Todos os IDs da trie que casam com a consulta, em ordem de relevância"""
+    _sincronizar_trie()
+    ids = _trie.buscar(consulta)
+    ids.discard(excluir_id)
+    # Quem tem o username começando com a consulta aparece primeiro
+    return sorted(ids, key=lambda i: (not _trie.termo(i).startswith(consulta), _trie.termo(i)))
+
+
+def _usuarios_da_trie(consulta, limite, excluir_id):
+    """
+    Users dos primeiros IDs da trie. A sincronização incremental não vê
+    remoções feitas por outros processos (a linha do índice some junto com
+    o User), então IDs que não existem mais são tirados da trie aqui e a
+    busca segue nos próximos candidatos até completar `limite`.
+    """
+    candidatos = _buscar_ids_trie(consulta, excluir_id)
+    usuarios = []
+    for inicio in range(0, len(candidatos), limite):
+        lote = candidatos[inicio:inicio + limite]
+        encontrados = User.objects.filter(id__in=lote).select_related('profile').in_bulk()
+        for usuario_id in lote:
+            if usuario_id in encontrados:
+                usuarios.append(encontrados[usuario_id])
+            else:
+                _trie.remover(usuario_id)
+        if len(usuarios) >= limite:
+            break
+    return usuarios[:limite]
+
+
+def buscar_usuarios(consulta, limite=None, excluir_id=None):
+    """
+    Busca de pessoas para o typeahead. Usa o índice de trigramas no
+    PostgreSQL (prefixo, substring e erros de digitação) e a trie de
+    prefixos em memória nos demais bancos. Retorna os Users na ordem de relevância.
+    """
+    limite = limite or getattr(settings, "BUSCA_USUARIOS_LIMITE", 10)
+    consulta = normalizar(consulta)
+    if not consulta:
+        return []
+
+    if not _usa_trigramas():
+        return _usuarios_da_trie(consulta, limite, excluir_id)
+
+    ids = _buscar_ids_trigramas(consulta, limite, excluir_id)
+    usuarios = User.objects.filter(id__in=ids).select_related('profile').in_bulk()
+    return [usuarios[i] for i in ids if i in usuarios]
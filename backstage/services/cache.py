@@ -0,0 +1,260 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+_AUSENTE = object()
+
+
+class _Entrada:
+    """Valor gravado no backend junto com o horário (time.time) em que expira"""
+
+    __slots__ = ('valor', 'expira_em')
+
+    def __init__(self, valor, expira_em):
+        self.valor = valor
+        self.expira_em = expira_em
+
+    def __getstate__(self):
+        return (self.valor, self.expira_em)
+
+    def __setstate__(self, estado):
+        self.valor, self.expira_em = estado
+
+
+class CacheLRU:
+    """
+    Cache em memória do processo, limitado por quantidade de itens (LRU) e com TTL
+
+    Os valores são devolvidos sem cópia: quem chama não deve alterá-los.
+    """
+
+    def __init__(self, max_itens=1000, ttl=300):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave, default=None):
+        with self._lock:
+            item = self._itens.get(chave, _AUSENTE)
+            if item is _AUSENTE:
+                return default
+            valor, expira_em = item
+            if expira_em <= time.monotonic():
+                del self._itens[chave]
+                return default
+            self._itens.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor, ttl=None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._itens[chave] = (valor, time.monotonic() + ttl)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def delete(self, chave):
+        with self._lock:
+            self._itens.pop(chave, None)
+
+    def clear(self):
+        with self._lock:
+            self._itens.clear()
+
+
+class CacheEmCamadas:
+    """
+    Cache em duas camadas: LRU local do processo na frente de um backend do
+    Django (locmem, arquivo ou Redis, conforme CACHES em settings)
+
+    Leituras tentam a camada local, depois o backend compartilhado (e
+    repopulam a local só pelo tempo que ainda resta no backend, para que
+    entradas curtas, como o cache negativo, não sobrevivam nos workers).
+    Escritas vão para as duas camadas.
+    """
+
+    def __init__(self, prefixo, max_itens=None, ttl_local=None, alias=None):
+        self.prefixo = prefixo
+        self.alias = alias or getattr(settings, "CACHE_BACKEND_ALIAS", "default")
+        self.local = CacheLRU(
+            max_itens=max_itens or getattr(settings, "CACHE_LOCAL_MAX_ITENS", 1000),
+            ttl=ttl_local or getattr(settings, "CACHE_LOCAL_TTL", 300),
+        )
+
+    def _chave(self, chave):
+        return f"{self.prefixo}:{chave}"
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def get(self, chave, default=None):
+        chave = self._chave(chave)
+        valor = self.local.get(chave, _AUSENTE)
+        if valor is not _AUSENTE:
+            return valor
+
+        try:
+            valor = self.backend.get(chave, _AUSENTE)
+        except Exception as e:
+            print(f"[AVISO] Backend de cache indisponível ({chave}): {e}")
+            return default
+        if not isinstance(valor, _Entrada):
+            return default
+
+        restante = valor.expira_em - time.time()
+        if restante <= 0:
+            return default
+        self.local.set(chave, valor.valor, ttl=restante)
+        return valor.valor
+
+    def set(self, chave, valor, ttl):
+        """Grava nas duas camadas; `ttl` em segundos (a local usa no máximo CACHE_LOCAL_TTL)"""
+        chave = self._chave(chave)
+        self.local.set(chave, valor, ttl=ttl)
+        try:
+            self.backend.set(chave, _Entrada(valor, time.time() + ttl), timeout=ttl)
+        except Exception as e:
+            print(f"[AVISO] Falha ao gravar no backend de cache ({chave}): {e}")
+
+    def delete(self, chave):
+        chave = self._chave(chave)
+        self.local.delete(chave)
+        try:
+            self.backend.delete(chave)
+        except Exception as e:
+            print(f"[AVISO] Falha ao remover do backend de cache ({chave}): {e}")
+
+
+class _Voo:
+    """Busca em andamento para uma chave (usada pelo single-flight)"""
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+
+_voos = {}
+_voos_lock = threading.Lock()
+
+
+def executar_uma_vez(chave, func, timeout=None):
+    """
+    Single-flight: dentro do processo, só uma thread por chave executa `func`.
+    As demais esperam e recebem o mesmo resultado (ou a mesma exceção).
+
+    Se a thread líder demorar mais que `timeout` (CACHE_SINGLE_FLIGHT_TIMEOUT),
+    quem está esperando executa `func` por conta própria.
+    """
+    with _voos_lock:
+        voo = _voos.get(chave)
+        lider = voo is None
+        if lider:
+            voo = _voos[chave] = _Voo()
+
+    if not lider:
+        timeout = timeout or getattr(settings, "CACHE_SINGLE_FLIGHT_TIMEOUT", 15)
+        if not voo.evento.wait(timeout):
+            return func()
+        if voo.erro is not None:
+            raise voo.erro
+        return voo.resultado
+
+    try:
+        voo.resultado = func()
+        return voo.resultado
+    except Exception as e:
+        voo.erro = e
+        raise
+    finally:
+        with _voos_lock:
+            _voos.pop(chave, None)
+        voo.evento.set()
+
+
+def _backend():
+    return caches[getattr(settings, "CACHE_BACKEND_ALIAS", "default")]
+
+
+def cache_compartilhado():
+    """
+    False quando o backend do Django guarda tudo dentro do processo (LocMem, o
+    padrão de CACHE_BACKEND, ou Dummy): com vários workers cada um vê só as
+    próprias escritas, então o que precisa valer entre processos vai ao banco.
+    """
+    from django.core.cache.backends.dummy import DummyCache
+    from django.core.cache.backends.locmem import LocMemCache
+    return not isinstance(_backend(), (LocMemCache, DummyCache))
+
+
+def adquirir_lock(chave, ttl=None):
+    """
+    Lock entre processos via cache.add (atômico no locmem, Redis e memcached).
+    Retorna True se este worker ficou com o lock.
+    """
+    ttl = ttl or getattr(settings, "CACHE_LOCK_TTL", 30)
+    try:
+        return _backend().add(f"lock:{chave}", 1, timeout=ttl)
+    except Exception as e:
+        print(f"[AVISO] Não foi possível obter lock para {chave}: {e}")
+        return True
+
+
+def liberar_lock(chave):
+    try:
+        _backend().delete(f"lock:{chave}")
+    except Exception as e:
+        print(f"[AVISO] Não foi possível liberar lock de {chave}: {e}")
+
+
+def revalidar_em_segundo_plano(chave, func):
+    """
+    Stale-while-revalidate: executa `func` em uma thread separada, desde que
+    nenhum outro worker (deste ou de outro processo) já esteja atualizando a chave.
+
+    Retorna True se a atualização foi disparada. Com
+    CACHE_REVALIDAR_EM_SEGUNDO_PLANO = False a atualização roda na própria
+    requisição (útil em testes).
+    """
+    if not adquirir_lock(chave):
+        return False
+
+    em_segundo_plano = getattr(settings, "CACHE_REVALIDAR_EM_SEGUNDO_PLANO", True)
+
+    def _executar():
+        try:
+            func()
+        except Exception as e:
+            print(f"[ERRO] Falha ao atualizar {chave} em segundo plano: {e}")
+        finally:
+            liberar_lock(chave)
+            if em_segundo_plano:
+                # A thread abriu sua própria conexão com o banco
+                connections.close_all()
+
+    if em_segundo_plano:
+        threading.Thread(target=_executar, name=f"revalidar-{chave}", daemon=True).start()
+    else:
+        _executar()
+    return True
+
+
+# Payloads agregados de filmes (camada na frente do FilmeCache)
+cache_filmes = CacheEmCamadas("filme")
+
+# Payloads de detalhes de séries (camada na frente do SerieCache)
+cache_series = CacheEmCamadas("serie")
+
+# Episódios por temporada (camada na frente do TemporadaCache)
+cache_temporadas = CacheEmCamadas("temporada")
+
+# IDs que a API externa respondeu como inexistentes (cache negativo, TTL curto)
+cache_negativo = CacheEmCamadas("negativo")
+
+# Mapa usuario_id -> papel de cada comunidade (versionado, ver services.chat)
+cache_membros = CacheEmCamadas("membros")
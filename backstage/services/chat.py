@@ -0,0 +1,204 @@
+import json
+import uuid
+from django.conf import settings
+from django.db import transaction
+from ..models import MembroComunidade, MensagemComunidade
+from .cache import _backend, cache_compartilhado, cache_membros
+
+MENSAGENS_POR_PAGINA = 50
+
+
+def pagina_de_mensagens(comunidade_id, antes_de=None, limite=MENSAGENS_POR_PAGINA):
+    """
+    Uma página do histórico do chat: as `limite` mensagens mais recentes
+    (ou as anteriores ao ID `antes_de`), lidas pelo índice (comunidade, id).
+
+    Retorna (mensagens em ordem cronológica, tem_mais).
+    """
+    mensagens = MensagemComunidade.objects.filter(comunidade_id=comunidade_id)
+    if antes_de:
+        mensagens = mensagens.filter(id__lt=antes_de)
+
+    mensagens = list(mensagens.only('id', 'comunidade_id', 'payload_json').order_by('-id')[:limite + 1])
+    tem_mais = len(mensagens) > limite
+    mensagens = mensagens[:limite]
+    mensagens.reverse()
+    return mensagens, tem_mais
+
+
+def _chave_versao_membros(comunidade_id):
+    return f"membros_versao:{comunidade_id}"
+
+
+def _versao_membros(comunidade_id):
+    """
+    Versão atual do mapa de membros no backend de cache. Entra na chave do
+    mapa, então com um cache compartilhado (Redis, memcached) a invalidação
+    vale na hora para todos os processos. Com o LocMem padrão ela só vale
+    no processo que fez a mudança; ver papeis_da_comunidade.
+    """
+    chave = _chave_versao_membros(comunidade_id)
+    try:
+        versao = _backend().get(chave)
+        if versao is None:
+            _backend().add(chave, uuid.uuid4().hex, timeout=None)
+            versao = _backend().get(chave)
+        return versao
+    except Exception as e:
+        print(f"[AVISO] Backend de cache indisponível (membros da comunidade {comunidade_id}): {e}")
+        return None
+
+
+def papeis_da_comunidade(comunidade_id):
+    """
+    Mapa usuario_id -> papel ('admin', 'mod' ou 'member') dos membros da
+    comunidade, lido do cache em camadas; o banco só é consultado quando o
+    mapa muda (entrar, sair, promover, expulsar).
+
+    Com cache local (por processo) os outros workers não veem a invalidação,
+    então o mapa vale só CHAT_MEMBROS_TTL_LOCAL segundos. Escrita e moderação
+    usam papel_do_membro_no_banco e não dependem deste mapa.
+    """
+    versao = _versao_membros(comunidade_id)
+    chave = f"{comunidade_id}:{versao}"
+    papeis = cache_membros.get(chave) if versao else None
+    if papeis is None:
+        papeis = dict(
+            MembroComunidade.objects.filter(comunidade_id=comunidade_id).values_list('usuario_id', 'role')
+        )
+        if versao:
+            if cache_compartilhado():
+                ttl = getattr(settings, "CHAT_MEMBROS_TTL", 3600)
+            else:
+                ttl = getattr(settings, "CHAT_MEMBROS_TTL_LOCAL", 30)
+            cache_membros.set(chave, papeis, ttl)
+    return papeis
+
+
+def papel_do_membro(comunidade_id, usuario_id):
+    """Papel do usuário na comunidade ou None se ele não for membro (leituras do chat)"""
+    return papeis_da_comunidade(comunidade_id).get(usuario_id)
+
+
+def papel_do_membro_no_banco(comunidade_id, usuario_id):
+    """Mesmo que papel_do_membro, direto do banco: para enviar mensagens e moderar"""
+    return MembroComunidade.objects.filter(comunidade_id=comunidade_id, usuario_id=usuario_id) \
+        .values_list('role', flat=True).first()
+
+
+def invalidar_membros(comunidade_id):
+    """Troca a versão do mapa (chamado pelos sinais de MembroComunidade)"""
+    try:
+        _backend().set(_chave_versao_membros(comunidade_id), uuid.uuid4().hex, timeout=None)
+    except Exception as e:
+        print(f"[AVISO] Falha ao invalidar membros da comunidade {comunidade_id}: {e}")
+
+
+# ---------------------------------------------------------------------------
+# Retrato do autor e mensagem pré-serializada
+# ---------------------------------------------------------------------------
+
+def _foto_do_usuario(usuario):
+    if hasattr(usuario, 'profile') and usuario.profile.foto_perfil:
+        return usuario.profile.foto_perfil.url
+    return None
+
+
+def serializar_mensagem(mensagem):
+    """Formato das APIs do chat, montado só com as colunas da própria mensagem"""
+    return {
+        'id': mensagem.id,
+        'usuario': {
+            'username': mensagem.autor_username,
+            'foto_perfil': mensagem.autor_foto,
+            'role': mensagem.autor_papel or 'member',
+        },
+        'conteudo': mensagem.conteudo,
+        'tipo_mensagem': mensagem.tipo_mensagem,
+        'filme_tmdb_id': mensagem.filme_tmdb_id,
+        'filme_titulo': mensagem.filme_titulo,
+        'filme_poster': mensagem.filme_poster,
+        'criado_em': mensagem.criado_em.isoformat(),
+        'editado': mensagem.editado,
+    }
+
+
+def criar_mensagem(comunidade_id, usuario, papel, **campos):
+    """
+    Cria a mensagem com o retrato do autor (username, foto e papel no envio)
+    e grava o fragmento JSON. Retorna (mensagem, dados serializados).
+
+    O fragmento leva o ID, então é gravado logo depois do INSERT, na mesma
+    transação: ninguém lê a mensagem sem ele, e a versão do chat só avança
+    no commit (sinal atualizar_versao_chat).
+    """
+    with transaction.atomic():
+        mensagem = MensagemComunidade.objects.create(
+            comunidade_id=comunidade_id,
+            usuario=usuario,
+            autor_username=usuario.username,
+            autor_foto=_foto_do_usuario(usuario),
+            autor_papel=papel or 'member',
+            **campos
+        )
+        dados = serializar_mensagem(mensagem)
+        mensagem.payload_json = json.dumps(dados)
+        mensagem.save(update_fields=['payload_json'])
+    return mensagem, dados
+
+
+def preencher_retratos(mensagens):
+    """
+    Preenche (ou refaz) o retrato do autor e o fragmento JSON de um
+    QuerySet de mensagens, com bulk_update. O papel já gravado é mantido;
+    mensagens antigas sem papel recebem o papel atual do autor.
+    Retorna as mensagens atualizadas.
+    """
+    papeis = {}
+    atualizadas = []
+    for mensagem in mensagens.select_related('usuario', 'usuario__profile'):
+        if not mensagem.autor_papel:
+            if mensagem.comunidade_id not in papeis:
+                papeis[mensagem.comunidade_id] = papeis_da_comunidade(mensagem.comunidade_id)
+            mensagem.autor_papel = papeis[mensagem.comunidade_id].get(mensagem.usuario_id, 'member')
+        mensagem.autor_username = mensagem.usuario.username
+        mensagem.autor_foto = _foto_do_usuario(mensagem.usuario)
+        mensagem.payload_json = json.dumps(serializar_mensagem(mensagem))
+        atualizadas.append(mensagem)
+
+    MensagemComunidade.objects.bulk_update(
+        atualizadas, ['autor_username', 'autor_foto', 'autor_papel', 'payload_json'], batch_size=500
+    )
+    return atualizadas
+
+
+def atualizar_retrato_autor(usuario):
+    """Username ou foto mudou: refaz o retrato nas mensagens do usuário que ficaram desatualizadas"""
+    desatualizadas = MensagemComunidade.objects.filter(usuario=usuario).exclude(
+        autor_username=usuario.username, autor_foto=_foto_do_usuario(usuario)
+    )
+    return len(preencher_retratos(desatualizadas))
+
+
+def fragmentos_das_mensagens(mensagens):
+    """
+    Fragmentos JSON das mensagens, na mesma ordem. Mensagens gravadas antes
+    do retrato existir são preenchidas aqui uma única vez.
+    """
+    faltando = [m.id for m in mensagens if not m.payload_json]
+    preenchidas = {}
+    if faltando:
+        preenchidas = {
+            m.id: m.payload_json
+            for m in preencher_retratos(MensagemComunidade.objects.filter(id__in=faltando))
+        }
+    return [m.payload_json or preenchidas[m.id] for m in mensagens]
+
+
+def json_da_lista(fragmentos, **extras):
+    """Corpo JSON {"success": true, "mensagens": [...], **extras} juntando os fragmentos prontos"""
+    corpo = ['{"success": true, "mensagens": [', ','.join(fragmentos), ']']
+    for chave, valor in extras.items():
+        corpo.append(f', {json.dumps(chave)}: {json.dumps(valor)}')
+    corpo.append('}')
+    return ''.join(corpo)
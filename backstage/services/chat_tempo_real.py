@@ -0,0 +1,228 @@
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from ..models import MensagemComunidade
+from .cache import _backend, adquirir_lock, cache_compartilhado, liberar_lock
+
+# comunidade_id -> set de Assinatura; salas sem ninguém conectado não ficam no dict
+_assinaturas = defaultdict(set)
+_lock = threading.Lock()
+
+
+class Assinatura:
+    """
+    Fila de eventos de uma conexão (WebSocket ou SSE) em uma comunidade.
+
+    Vive no event loop da conexão; `publicar` pode ser chamado de qualquer
+    thread (views síncronas) e entrega via call_soon_threadsafe.
+    """
+
+    def __init__(self, comunidade_id, usuario_id=None):
+        self.comunidade_id = comunidade_id
+        self.usuario_id = usuario_id
+        self._loop = asyncio.get_running_loop()
+        self._fila = asyncio.Queue(maxsize=getattr(settings, "CHAT_FILA_MAX_EVENTOS", 100))
+
+    def _entregar(self, evento):
+        # Cliente lento: descarta o evento mais antigo em vez de crescer sem limite
+        if self._fila.full():
+            self._fila.get_nowait()
+        self._fila.put_nowait(evento)
+
+    def entregar(self, evento):
+        try:
+            self._loop.call_soon_threadsafe(self._entregar, evento)
+        except RuntimeError:
+            pass  # loop da conexão já foi encerrado
+
+    async def proximo(self, timeout=None):
+        """Próximo evento ou None se o timeout passar"""
+        try:
+            return await asyncio.wait_for(self._fila.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+def assinar(comunidade_id, usuario_id=None):
+    """Registra uma conexão para receber os eventos da comunidade (chamar dentro do event loop)"""
+    assinatura = Assinatura(comunidade_id, usuario_id)
+    with _lock:
+        _assinaturas[comunidade_id].add(assinatura)
+    return assinatura
+
+
+def cancelar_assinatura(assinatura):
+    with _lock:
+        conectados = _assinaturas.get(assinatura.comunidade_id)
+        if conectados is not None:
+            conectados.discard(assinatura)
+            if not conectados:
+                del _assinaturas[assinatura.comunidade_id]
+
+
+def publicar(comunidade_id, evento):
+    """
+    Entrega o evento a todas as conexões abertas da comunidade neste processo.
+    Sala sem conexões custa só uma consulta ao dict.
+    """
+    with _lock:
+        conectados = list(_assinaturas.get(comunidade_id, ()))
+    for assinatura in conectados:
+        assinatura.entregar(evento)
+    return len(conectados)
+
+
+def publicar_mensagem(comunidade_id, mensagem):
+    """Evento de nova mensagem (mesmo formato serializado que as APIs do chat retornam)"""
+    return publicar(comunidade_id, {'tipo': 'mensagem', 'mensagem': mensagem})
+
+
+def publicar_chat_limpo(comunidade_id):
+    return publicar(comunidade_id, {'tipo': 'chat_limpo'})
+
+
+# Evento que encerra a conexão: o WebSocket/SSE repassa ao cliente e fecha
+EVENTO_REMOVIDO = {'tipo': 'removido'}
+
+
+def encerrar_assinaturas(comunidade_id, usuario_id):
+    """
+    Membro saiu ou foi expulso: encerra as conexões dele neste processo.
+    Conexões em outros processos percebem na rechecagem periódica
+    (CHAT_MEMBRO_RECHECAGEM).
+    """
+    with _lock:
+        conectados = [a for a in _assinaturas.get(comunidade_id, ()) if a.usuario_id == usuario_id]
+    for assinatura in conectados:
+        assinatura.entregar(EVENTO_REMOVIDO)
+    return len(conectados)
+
+
+def conexoes_abertas(comunidade_id=None):
+    with _lock:
+        if comunidade_id is not None:
+            return len(_assinaturas.get(comunidade_id, ()))
+        return sum(len(conectados) for conectados in _assinaturas.values())
+
+
+# ---------------------------------------------------------------------------
+# Versão de cada comunidade (ID da última mensagem) para o long-polling
+# ---------------------------------------------------------------------------
+
+# Long-polls parados neste processo esperam na Condition da comunidade
+_condicoes = defaultdict(threading.Condition)
+_lock_condicoes = threading.Lock()
+
+
+def _chave_versao(comunidade_id):
+    return f"chat_versao:{comunidade_id}"
+
+
+def _condicao(comunidade_id):
+    with _lock_condicoes:
+        return _condicoes[comunidade_id]
+
+
+def _versao_do_banco(comunidade_id, depois_de=0):
+    """ID da última mensagem da comunidade acima de `depois_de` (ou `depois_de` se não houver)"""
+    return MensagemComunidade.objects.filter(comunidade_id=comunidade_id, id__gt=depois_de) \
+        .order_by('-id').values_list('id', flat=True).first() or depois_de
+
+
+def versao_chat(comunidade_id):
+    """
+    ID da última mensagem da comunidade segundo o backend de cache, ou None se
+    não houver. Com cache local (por processo) a versão gravada por outro
+    worker não aparece aqui; nesse caso a fonte é o banco.
+    """
+    if not cache_compartilhado():
+        return _versao_do_banco(comunidade_id)
+    try:
+        return _backend().get(_chave_versao(comunidade_id))
+    except Exception as e:
+        print(f"[AVISO] Backend de cache indisponível (versão do chat {comunidade_id}): {e}")
+        return None
+
+
+def _gravar_versao_se_maior(comunidade_id, mensagem_id, ttl):
+    """
+    Compare-and-set sob o lock do cache: lê, compara e grava sem que outra
+    escrita entre no meio. Retorna False se o lock estiver com outro worker.
+    """
+    chave = _chave_versao(comunidade_id)
+    if not adquirir_lock(chave, ttl=getattr(settings, "CHAT_VERSAO_LOCK_TTL", 2)):
+        return False
+    try:
+        atual = _backend().get(chave)
+        if atual is None or atual < mensagem_id:
+            _backend().set(chave, mensagem_id, timeout=ttl)
+    finally:
+        liberar_lock(chave)
+    return True
+
+
+def definir_versao_chat(comunidade_id, mensagem_id):
+    """
+    Grava a versão no backend de cache sem deixá-la voltar para trás
+    (compare-and-set com lock via cache.add) e acorda os long-polls deste
+    processo. Enquanto outro worker segura o lock, espera a vez, a menos que
+    ele já tenha gravado uma versão igual ou maior.
+    """
+    ttl = getattr(settings, "CHAT_VERSAO_TTL", 300)
+    # Um lock abandonado expira em CHAT_VERSAO_LOCK_TTL: a espera é limitada
+    limite = time.monotonic() + getattr(settings, "CHAT_VERSAO_LOCK_TTL", 2) + 1
+    try:
+        while not _gravar_versao_se_maior(comunidade_id, mensagem_id, ttl):
+            atual = _backend().get(_chave_versao(comunidade_id))
+            if atual is not None and atual >= mensagem_id:
+                break
+            if time.monotonic() > limite:
+                print(f"[AVISO] Lock da versão do chat {comunidade_id} ocupado; versão {mensagem_id} não gravada")
+                break
+            time.sleep(0.01)
+    except Exception as e:
+        print(f"[AVISO] Falha ao gravar a versão do chat {comunidade_id}: {e}")
+
+    condicao = _condicao(comunidade_id)
+    with condicao:
+        condicao.notify_all()
+
+
+def reiniciar_versao_chat(comunidade_id):
+    """Chat limpo: a próxima consulta relê a versão do banco"""
+    try:
+        _backend().delete(_chave_versao(comunidade_id))
+    except Exception as e:
+        print(f"[AVISO] Falha ao remover a versão do chat {comunidade_id}: {e}")
+
+
+def aguardar_versao(comunidade_id, depois_de, espera, versao_atual=None):
+    """
+    Long-poll: bloqueia até a versão da comunidade passar de `depois_de` ou
+    até `espera` segundos. Mensagens deste processo acordam na hora; as de
+    outros processos são vistas na releitura a cada CHAT_LONG_POLL_INTERVALO
+    segundos no cache compartilhado. Com cache local a releitura vai ao banco
+    (id__gt), então só acontece quando uma mensagem deste processo acorda a
+    espera ou a cada CHAT_LONG_POLL_INTERVALO_LOCAL segundos.
+    `versao_atual`, se já lida pelo chamador, dispensa a primeira leitura.
+    Retorna a última versão lida.
+    """
+    local = not cache_compartilhado()
+    if local:
+        intervalo = getattr(settings, "CHAT_LONG_POLL_INTERVALO_LOCAL", 10)
+    else:
+        intervalo = getattr(settings, "CHAT_LONG_POLL_INTERVALO", 1)
+    fim = time.monotonic() + espera
+    condicao = _condicao(comunidade_id)
+    versao = versao_atual
+    while True:
+        if versao is None:
+            versao = _versao_do_banco(comunidade_id, depois_de) if local else versao_chat(comunidade_id)
+        restante = fim - time.monotonic()
+        if versao is None or versao > depois_de or restante <= 0:
+            return versao
+        with condicao:
+            condicao.wait(min(restante, intervalo))
+        versao = None
@@ -0,0 +1,107 @@
+from datetime import datetime
+from django.db import connections
+from ..models import Filme, FilmeCache, Serie, SerieCache
+from . import tmdb
+
+URL_POSTER = "https://image.tmdb.org/t/p/w300{}"
+
+
+def _data(texto):
+    try:
+        return datetime.strptime(texto, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def _filme_sem_omdb(id_tmdb):
+    """Listas só precisam de poster e data: não vale uma chamada ao OMDB por título"""
+    return tmdb.obter_detalhes_com_cache(id_tmdb, incluir_omdb=False)
+
+
+def _buscar_faltantes(ids, obter_com_cache):
+    """
+    Busca, em paralelo, os IDs que não estavam no banco pela mesma leitura com
+    cache das páginas de detalhes: o resultado vai para o FilmeCache/SerieCache
+    (ou para o cache negativo), então cada título custa uma busca por TTL.
+    """
+    def _obter(id_tmdb):
+        try:
+            return obter_com_cache(id_tmdb)
+        finally:
+            # A thread do pool abriu sua própria conexão com o banco
+            connections.close_all()
+
+    resultados = tmdb._em_paralelo({id_tmdb: (lambda id_tmdb=id_tmdb: _obter(id_tmdb)) for id_tmdb in ids})
+    dados = {}
+    for id_tmdb, resultado in resultados.items():
+        if isinstance(resultado, Exception):
+            print(f"[AVISO] Não foi possível enriquecer {id_tmdb}: {resultado}")
+        elif resultado:
+            dados[id_tmdb] = resultado
+    return dados
+
+
+def enriquecer_filmes(filmes):
+    """
+    Preenche poster e data de lançamento dos filmes que ainda não têm.
+
+    Consulta o FilmeCache de todos de uma vez, busca só o que faltar na TMDb
+    (em paralelo, gravando no cache) e grava de volta no Filme com um único bulk_update. Depois
+    da primeira vez, as páginas leem só do banco.
+    """
+    pendentes = {}
+    for filme in filmes:
+        if filme.tmdb_id and (not filme.poster or not filme.data_lancamento):
+            pendentes.setdefault(filme.tmdb_id, []).append(filme)
+    if not pendentes:
+        return 0
+
+    dados = dict(FilmeCache.objects.filter(id_tmdb__in=pendentes).values_list('id_tmdb', 'payload'))
+    dados.update(_buscar_faltantes([i for i in pendentes if i not in dados], _filme_sem_omdb))
+
+    alterados = []
+    for id_tmdb, detalhes in dados.items():
+        for filme in pendentes[id_tmdb]:
+            alterado = False
+            if not filme.poster and detalhes.get('poster_path'):
+                filme.poster = URL_POSTER.format(detalhes['poster_path'])
+                alterado = True
+            if not filme.data_lancamento and _data(detalhes.get('data_lancamento')):
+                filme.data_lancamento = _data(detalhes['data_lancamento'])
+                alterado = True
+            if alterado:
+                alterados.append(filme)
+
+    if alterados:
+        Filme.objects.bulk_update(alterados, ['poster', 'data_lancamento'])
+    return len(alterados)
+
+
+def enriquecer_series(series):
+    """Mesmo que enriquecer_filmes, para poster e data de estreia das séries (SerieCache)"""
+    pendentes = {}
+    for serie in series:
+        if serie.tmdb_id and (not serie.poster or not serie.data_primeira_exibicao):
+            pendentes.setdefault(serie.tmdb_id, []).append(serie)
+    if not pendentes:
+        return 0
+
+    dados = dict(SerieCache.objects.filter(id_tmdb__in=pendentes).values_list('id_tmdb', 'payload'))
+    dados.update(_buscar_faltantes([i for i in pendentes if i not in dados], tmdb.obter_detalhes_serie_com_cache))
+
+    alterados = []
+    for id_tmdb, detalhes in dados.items():
+        for serie in pendentes[id_tmdb]:
+            alterado = False
+            if not serie.poster and detalhes.get('poster_path'):
+                serie.poster = URL_POSTER.format(detalhes['poster_path'])
+                alterado = True
+            if not serie.data_primeira_exibicao and _data(detalhes.get('data_primeira_exibicao')):
+                serie.data_primeira_exibicao = _data(detalhes['data_primeira_exibicao'])
+                alterado = True
+            if alterado:
+                alterados.append(serie)
+
+    if alterados:
+        Serie.objects.bulk_update(alterados, ['poster', 'data_primeira_exibicao'])
+    return len(alterados)
@@ -0,0 +1,113 @@
+import base64
+import json
+from datetime import datetime
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from ..models import EventoFeed, EntradaFeed
+from .amizades import amigos_ids
+
+ITENS_POR_PAGINA = 10
+
+
+def publicar_evento(autor_id, origem, tipo_evento, tipo_obra, tmdb_id, titulo, nota, criado_em,
+                    forcar_fanout=False):
+    """
+    Cria (ou atualiza) o evento e, se for novo, grava uma entrada na
+    timeline de cada amigo do autor (fan-out na escrita).
+
+    forcar_fanout=True (reconstrução do feed) grava as entradas mesmo para
+    eventos já existentes; as que já existem são ignoradas.
+    """
+    if not autor_id or not tmdb_id:
+        return None
+
+    with transaction.atomic():
+        evento, criado = EventoFeed.objects.update_or_create(
+            origem=origem,
+            defaults={
+                'autor_id': autor_id,
+                'tipo_evento': tipo_evento,
+                'tipo_obra': tipo_obra,
+                'tmdb_id': tmdb_id,
+                'titulo': titulo,
+                'nota': nota,
+                'criado_em': criado_em,
+            }
+        )
+        if criado or forcar_fanout:
+            EntradaFeed.objects.bulk_create([
+                EntradaFeed(usuario_id=amigo_id, evento=evento, criado_em=evento.criado_em)
+                for amigo_id in amigos_ids(autor_id)
+            ], ignore_conflicts=True)
+    return evento
+
+
+def remover_evento(origem):
+    """Remove o evento (e as entradas nas timelines, em cascata)"""
+    EventoFeed.objects.filter(origem=origem).delete()
+
+
+def conectar_feeds(usuario_a_id, usuario_b_id):
+    """Novos amigos: copia os eventos recentes de cada um para a timeline do outro"""
+    limite = getattr(settings, "FEED_EVENTOS_AO_CONECTAR", 50)
+    entradas = []
+    for autor_id, leitor_id in ((usuario_a_id, usuario_b_id), (usuario_b_id, usuario_a_id)):
+        for evento_id, criado_em in EventoFeed.objects.filter(autor_id=autor_id).order_by('-criado_em') \
+                .values_list('id', 'criado_em')[:limite]:
+            entradas.append(EntradaFeed(usuario_id=leitor_id, evento_id=evento_id, criado_em=criado_em))
+    EntradaFeed.objects.bulk_create(entradas, ignore_conflicts=True)
+
+
+def desconectar_feeds(usuario_a_id, usuario_b_id):
+    """Amizade desfeita: tira os eventos de um da timeline do outro"""
+    EntradaFeed.objects.filter(
+        Q(usuario_id=usuario_a_id, evento__autor_id=usuario_b_id) |
+        Q(usuario_id=usuario_b_id, evento__autor_id=usuario_a_id)
+    ).delete()
+
+
+def _codificar_cursor(criado_em, id_):
+    return base64.urlsafe_b64encode(json.dumps([criado_em.isoformat(), id_]).encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    """Retorna (criado_em, id) ou None se o cursor for inválido"""
+    try:
+        criado_em, id_ = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(criado_em), int(id_)
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def pagina_do_feed(usuario, cursor=None, limite=ITENS_POR_PAGINA):
+    """
+    Uma página do feed de atividades dos amigos: leitura por faixa no índice
+    (usuario, -criado_em, -id) da EntradaFeed. Retorna (atividades, proximo_cursor).
+    """
+    entradas = EntradaFeed.objects.filter(usuario=usuario)
+    posicao = decodificar_cursor(cursor) if cursor else None
+    if posicao:
+        criado_em, id_ = posicao
+        entradas = entradas.filter(Q(criado_em__lt=criado_em) | Q(criado_em=criado_em, id__lt=id_))
+
+    entradas = list(
+        entradas.select_related('evento__autor').order_by('-criado_em', '-id')[:limite + 1]
+    )
+    tem_mais = len(entradas) > limite
+    entradas = entradas[:limite]
+
+    atividades = [
+        {
+            'tipo': entrada.evento.tipo_obra,
+            'evento': entrada.evento.tipo_evento,
+            'usuario': entrada.evento.autor,
+            'titulo': entrada.evento.titulo,
+            'nota': entrada.evento.nota,
+            'data': entrada.evento.criado_em,
+            'tmdb_id': entrada.evento.tmdb_id,
+        }
+        for entrada in entradas
+    ]
+    proximo_cursor = _codificar_cursor(entradas[-1].criado_em, entradas[-1].id) if tem_mais else None
+    return atividades, proximo_cursor
@@ -0,0 +1,135 @@
+import threading
+import time
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+_sessao = None
+_lock = threading.Lock()
+
+
+class CircuitoAberto(Exception):
+    """O serviço externo está falhando; a chamada foi recusada sem usar a rede"""
+
+
+class RecursoNaoEncontrado(Exception):
+    """O serviço externo respondeu 404 (ID inexistente ou inválido)"""
+
+
+class Disjuntor:
+    """
+    Circuit breaker de um serviço externo (um por host)
+
+    Depois de `limite_falhas` falhas seguidas o circuito abre e as chamadas
+    falham na hora por `tempo_aberto` segundos. Passado esse tempo, uma única
+    chamada de teste é liberada: se der certo o circuito fecha, senão reabre.
+    """
+
+    def __init__(self, nome, limite_falhas=None, tempo_aberto=None):
+        self.nome = nome
+        self.limite_falhas = limite_falhas or getattr(settings, "DISJUNTOR_LIMITE_FALHAS", 5)
+        self.tempo_aberto = tempo_aberto or getattr(settings, "DISJUNTOR_TEMPO_ABERTO", 30)
+        self.falhas = 0
+        self.aberto_em = None
+        self.em_teste = False
+        self._lock = threading.Lock()
+
+    @property
+    def aberto(self):
+        """True enquanto as chamadas devem ser recusadas (não consome a chamada de teste)"""
+        with self._lock:
+            if self.aberto_em is None:
+                return False
+            return self.em_teste or time.monotonic() - self.aberto_em < self.tempo_aberto
+
+    def permitir(self):
+        with self._lock:
+            if self.aberto_em is None:
+                return True
+            if self.em_teste or time.monotonic() - self.aberto_em < self.tempo_aberto:
+                return False
+            self.em_teste = True
+            return True
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self.falhas = 0
+            self.aberto_em = None
+            self.em_teste = False
+
+    def registrar_falha(self):
+        with self._lock:
+            self.falhas += 1
+            if self.em_teste or self.falhas >= self.limite_falhas:
+                if self.aberto_em is None or self.em_teste:
+                    print(f"[AVISO] Circuito aberto para {self.nome} após {self.falhas} falha(s)")
+                self.aberto_em = time.monotonic()
+                self.em_teste = False
+
+
+_disjuntores = {}
+
+
+def obter_disjuntor(url):
+    """Disjuntor do host da URL (api.themoviedb.org, www.omdbapi.com, ...)"""
+    host = urlparse(url).netloc
+    with _lock:
+        if host not in _disjuntores:
+            _disjuntores[host] = Disjuntor(host)
+        return _disjuntores[host]
+
+
+def _criar_sessao():
+    """
+    Cria a sessão HTTP compartilhada com pool de conexões e keep-alive
+
+    O tamanho do pool é por host (api.themoviedb.org, www.omdbapi.com, ...)
+    e pode ser ajustado em settings via HTTP_POOL_CONNECTIONS e HTTP_POOL_MAXSIZE.
+    """
+    sessao = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=getattr(settings, "HTTP_POOL_CONNECTIONS", 4),
+        pool_maxsize=getattr(settings, "HTTP_POOL_MAXSIZE", 20),
+    )
+    sessao.mount("https://", adapter)
+    sessao.mount("http://", adapter)
+    sessao.headers.update({
+        "Accept": "application/json",
+        "Accept-Encoding": "gzip, deflate",
+    })
+    return sessao
+
+
+def obter_sessao():
+    """Retorna a sessão HTTP do processo, criando-a na primeira chamada"""
+    global _sessao
+    if _sessao is None:
+        with _lock:
+            if _sessao is None:
+                _sessao = _criar_sessao()
+    return _sessao
+
+
+def get(url, params=None, timeout=10):
+    """
+    GET usando a sessão compartilhada (reaproveita conexões TCP/TLS abertas)
+
+    Passa pelo disjuntor do host: lança CircuitoAberto sem usar a rede quando o
+    serviço está falhando. Erros de conexão, 5xx e 429 contam como falha.
+    """
+    disjuntor = obter_disjuntor(url)
+    if not disjuntor.permitir():
+        raise CircuitoAberto(f"{disjuntor.nome} indisponível no momento")
+
+    try:
+        resp = obter_sessao().get(url, params=params, timeout=timeout)
+    except Exception:
+        disjuntor.registrar_falha()
+        raise
+
+    if resp.status_code >= 500 or resp.status_code == 429:
+        disjuntor.registrar_falha()
+    else:
+        disjuntor.registrar_sucesso()
+    return resp
@@ -0,0 +1,96 @@
+import base64
+import json
+from datetime import datetime
+from django.db.models import CharField, Count, Q, Value
+from ..models import Critica, CriticaSerie
+from .enriquecimento import enriquecer_filmes, enriquecer_series
+
+REVIEWS_POR_PAGINA = 20
+
+
+def codificar_cursor(criado_em, tipo, id_):
+    """Cursor opaco da última review exibida: (criado_em, tipo, id)"""
+    texto = json.dumps([criado_em.isoformat(), tipo, id_])
+    return base64.urlsafe_b64encode(texto.encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    """Retorna (criado_em, tipo, id) ou None se o cursor for inválido"""
+    try:
+        criado_em, tipo, id_ = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(criado_em), tipo, int(id_)
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def _depois_do_cursor(tipo, cursor):
+    """
+    Filtro keyset para as reviews de `tipo` que vêm depois do cursor na
+    ordem (criado_em, tipo, id) decrescente.
+    """
+    criado_em, tipo_cursor, id_cursor = cursor
+    filtro = Q(criado_em__lt=criado_em)
+    if tipo < tipo_cursor:
+        filtro |= Q(criado_em=criado_em)
+    elif tipo == tipo_cursor:
+        filtro |= Q(criado_em=criado_em, id__lt=id_cursor)
+    return filtro
+
+
+def pagina_de_reviews(usuario, cursor=None, limite=REVIEWS_POR_PAGINA):
+    """
+    Uma página da linha do tempo de reviews (filmes e séries juntos) do usuário.
+
+    A mesclagem e a ordenação são feitas no banco (UNION ALL ordenado por
+    criado_em, tipo e id, com paginação keyset), então o custo não depende do
+    tamanho do histórico. Retorna (reviews, proximo_cursor); cada review recebe
+    os atributos `tipo` ('filme' ou 'serie') e `obra` (Filme ou Serie).
+    """
+    filmes = Critica.objects.filter(usuario=usuario)
+    series = CriticaSerie.objects.filter(usuario=usuario)
+    cursor = decodificar_cursor(cursor) if cursor else None
+    if cursor:
+        filmes = filmes.filter(_depois_do_cursor('filme', cursor))
+        series = series.filter(_depois_do_cursor('serie', cursor))
+
+    linha = list(
+        filmes.annotate(tipo=Value('filme', output_field=CharField())).values('id', 'criado_em', 'tipo')
+        .union(
+            series.annotate(tipo=Value('serie', output_field=CharField())).values('id', 'criado_em', 'tipo'),
+            all=True
+        )
+        .order_by('-criado_em', '-tipo', '-id')[:limite + 1]
+    )
+    tem_mais = len(linha) > limite
+    linha = linha[:limite]
+
+    ids = {'filme': [], 'serie': []}
+    for item in linha:
+        ids[item['tipo']].append(item['id'])
+
+    objetos = {
+        ('filme', c.id): c
+        for c in Critica.objects.filter(id__in=ids['filme']).select_related('filme', 'usuario')
+        .annotate(total_likes=Count('likes', distinct=True))
+    }
+    objetos.update({
+        ('serie', c.id): c
+        for c in CriticaSerie.objects.filter(id__in=ids['serie']).select_related('serie', 'usuario')
+        .annotate(total_likes=Count('likes', distinct=True))
+    })
+
+    reviews = []
+    for item in linha:
+        critica = objetos.get((item['tipo'], item['id']))
+        if critica is None:
+            continue
+        critica.tipo = item['tipo']
+        critica.obra = critica.filme if item['tipo'] == 'filme' else critica.serie
+        reviews.append(critica)
+
+    enriquecer_filmes([c.obra for c in reviews if c.tipo == 'filme'])
+    enriquecer_series([c.obra for c in reviews if c.tipo == 'serie'])
+
+    ultimo = linha[-1] if linha else None
+    proximo_cursor = codificar_cursor(ultimo['criado_em'], ultimo['tipo'], ultimo['id']) if tem_mais else None
+    return reviews, proximo_cursor
@@ -1,50 +1,62 @@
-import json
-import requests
 import random
-from urllib import request, parse
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta, timezone
 from django.conf import settings
-from ..models import FilmeCache
+from ..models import FilmeCache, SerieCache, TemporadaCache, TrilhoCache
+from . import http_client
+from .http_client import CircuitoAberto, RecursoNaoEncontrado
+from .cache import cache_filmes, cache_series, cache_temporadas, cache_negativo, executar_uma_vez, revalidar_em_segundo_plano
 
 def _get(endpoint, params=None, max_retries=3, timeout=10):
     """
     Faz requisição à API do TMDb com retry e timeout
 
+    Não tenta de novo quando a TMDb responde 404 (lança RecursoNaoEncontrado)
+    nem quando o circuito da TMDb está aberto (lança CircuitoAberto na hora).
+
     Args:
         endpoint: Endpoint da API (ex: /movie/123)
         params: Parâmetros da query string
         max_retries: Número máximo de tentativas em caso de erro
         timeout: Timeout em segundos para cada requisição
     """
-    params = params or {}
+    params = dict(params or {})
     params["api_key"] = settings.TMDB_API_KEY
-    url = f"{settings.TMDB_BASE_URL}{endpoint}?{parse.urlencode(params)}"
+    url = f"{settings.TMDB_BASE_URL}{endpoint}"
 
     last_error = None
 
     for attempt in range(max_retries):
         try:
-            # Usar timeout para evitar requisições travadas
-            with request.urlopen(url, timeout=timeout) as resp:
-                if resp.status != 200:
-                    raise Exception(f"Erro TMDb: status {resp.status}")
-                return json.load(resp)
+            # Sessão compartilhada: reaproveita a conexão keep-alive do pool
+            resp = http_client.get(url, params=params, timeout=timeout)
+            if resp.status_code == 404:
+                raise RecursoNaoEncontrado(f"TMDb não encontrou {endpoint}")
+            if resp.status_code != 200:
+                raise Exception(f"Erro TMDb: status {resp.status_code}")
+            return resp.json()
+
+        except (RecursoNaoEncontrado, CircuitoAberto):
+            raise
 
         except Exception as e:
             last_error = e
 
-            # Se não for a última tentativa, aguardar antes de tentar novamente
-            if attempt < max_retries - 1:
-                import time
+            # Se não for a última tentativa (e a TMDb não estiver fora), aguardar antes de tentar novamente
+            if attempt < max_retries - 1 and not http_client.obter_disjuntor(url).aberto:
                 wait_time = (attempt + 1) * 0.5  # Espera progressiva: 0.5s, 1s, 1.5s
                 print(f"Tentativa {attempt + 1}/{max_retries} falhou para {endpoint}. Tentando novamente em {wait_time}s...")
                 time.sleep(wait_time)
             else:
                 # Última tentativa falhou
-                print(f"Todas as {max_retries} tentativas falharam para {endpoint}: {str(e)}")
+                print(f"Todas as {attempt + 1} tentativas falharam para {endpoint}: {str(e)}")
+                break
 
     # Se chegou aqui, todas as tentativas falharam
-    raise Exception(f"Falha ao buscar dados da API TMDb após {max_retries} tentativas: {str(last_error)}")
+    raise Exception(f"Falha ao buscar dados da API TMDb após {attempt + 1} tentativas: {str(last_error)}")
 
 def buscar_detalhes_filme(id_tmdb: int):
     return _get(f"/movie/{id_tmdb}", params={"language": "pt-BR"})
@@ -56,6 +68,42 @@ def buscar_plataformas(id_tmdb: int, region: str):
     data = _get(f"/movie/{id_tmdb}/watch/providers")
     return data.get("results", {}).get(region, {})
 
+def buscar_detalhes_completos(id_tmdb: int, region: str):
+    """
+    Busca detalhes, créditos e plataformas em uma única requisição
+    (append_to_response da TMDb). Retorna (detalhes, creditos, plataformas)
+    """
+    data = _get(f"/movie/{id_tmdb}", params={
+        "language": "pt-BR",
+        "append_to_response": "credits,watch/providers"
+    })
+    creditos = data.pop("credits", None) or {}
+    provs = (data.pop("watch/providers", None) or {}).get("results", {}).get(region, {})
+    return data, creditos, provs
+
+def _em_paralelo(tarefas, max_workers=None):
+    """
+    Executa as funções de `tarefas` (dict chave -> função sem argumentos) em um
+    pool de threads limitado (TMDB_MAX_WORKERS).
+
+    Retorna dict chave -> resultado. Exceções são devolvidas como valor para
+    que o chamador decida se a falha parcial é aceitável.
+    """
+    if not tarefas:
+        return {}
+
+    max_workers = min(max_workers or getattr(settings, "TMDB_MAX_WORKERS", 8), len(tarefas))
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futuros = {executor.submit(func): chave for chave, func in tarefas.items()}
+        for futuro in as_completed(futuros):
+            chave = futuros[futuro]
+            try:
+                resultados[chave] = futuro.result()
+            except Exception as e:
+                resultados[chave] = e
+    return resultados
+
 def buscar_filmes_populares(page=1):
     data = _get("/movie/popular", params={"language": "pt-BR", "page": page})
     filmes = data.get("results", [])
@@ -294,12 +342,33 @@ def buscar_series_por_filtros(genero_id=None, ordenacao='popular', page=1):
         'nota_tmdb': serie.get('vote_average')
     } for serie in series]
 
-def montar_payload_agregado(id_tmdb: int, region: str = None):
+def montar_payload_agregado(id_tmdb: int, region: str = None, modo: str = None):
+    """
+    Monta o payload do filme (detalhes + créditos + plataformas)
+
+    modo:
+        'append'   - uma única requisição com append_to_response (padrão)
+        'paralelo' - três requisições simultâneas em um pool limitado
+    Definido por TMDB_PAYLOAD_MODO em settings quando não informado.
+    Em ambos os modos, falha em qualquer parte propaga a exceção (como antes).
+    """
     region = region or getattr(settings, "TMDB_DEFAULT_REGION", "BR")
+    modo = modo or getattr(settings, "TMDB_PAYLOAD_MODO", "append")
 
-    detalhes = buscar_detalhes_filme(id_tmdb)
-    creditos = buscar_creditos(id_tmdb)
-    provs = buscar_plataformas(id_tmdb, region)
+    if modo == "paralelo":
+        resultados = _em_paralelo({
+            "detalhes": lambda: buscar_detalhes_filme(id_tmdb),
+            "creditos": lambda: buscar_creditos(id_tmdb),
+            "provs": lambda: buscar_plataformas(id_tmdb, region),
+        })
+        for resultado in resultados.values():
+            if isinstance(resultado, Exception):
+                raise resultado
+        detalhes = resultados["detalhes"]
+        creditos = resultados["creditos"]
+        provs = resultados["provs"]
+    else:
+        detalhes, creditos, provs = buscar_detalhes_completos(id_tmdb, region)
 
     # Garantir que creditos sempre tenha os campos necessários, mesmo que vazios
     elenco = creditos.get("cast") if creditos else []
@@ -327,6 +396,7 @@ def montar_payload_agregado(id_tmdb: int, region: str = None):
     # Retorna com campos padronizados - garantir que listas sejam sempre listas vazias, nunca None
     return {
         "tmdb_id": id_tmdb,
+        "imdb_id": detalhes.get("imdb_id"),
         "titulo": detalhes.get("title") or "Título não disponível",
         "titulo_original": detalhes.get("original_title") or "",
         "sinopse": detalhes.get("overview") or "",
@@ -354,46 +424,158 @@ def montar_payload_agregado(id_tmdb: int, region: str = None):
         "plataformas": plataformas
     }
 
-def obter_detalhes_com_cache(id_tmdb: int, ttl_minutos: int = 1440, region: str = None):
+def _incluir_ratings_omdb(payload, anterior=None):
+    """
+    Guarda no payload do filme os ratings do OMDB (Metacritic, Rotten Tomatoes...).
+
+    Os ratings têm validade própria (OMDB_TTL_HORAS): enquanto os do payload
+    anterior estiverem válidos, são reaproveitados sem chamar o OMDB. Se a
+    chamada falhar, mantém os anteriores e tenta de novo na próxima atualização.
     """
-    Busca detalhes do filme com cache. Trata race condition em requisições simultâneas.
+    anterior = anterior or {}
+    if anterior.get("imdb_id") == payload.get("imdb_id") and anterior.get("ratings_omdb_em"):
+        payload["ratings_omdb"] = anterior.get("ratings_omdb")
+        payload["ratings_omdb_em"] = anterior["ratings_omdb_em"]
+        idade = datetime.now(timezone.utc) - datetime.fromisoformat(anterior["ratings_omdb_em"])
+        if idade < timedelta(hours=getattr(settings, "OMDB_TTL_HORAS", 168)):
+            return payload
+
+    ratings = obter_ratings_omdb(payload.get("imdb_id"))
+    if ratings:
+        payload["ratings_omdb"] = ratings
+        payload["ratings_omdb_em"] = datetime.now(timezone.utc).isoformat()
+    return payload
+
+def _atualizar_filme_cache(id_tmdb: int, ttl_minutos: int, region: str = None, incluir_omdb: bool = True):
     """
-    from django.db import IntegrityError
+    Busca o payload na TMDb (e os ratings do OMDB) e grava no FilmeCache e nas camadas de cache.
+
+    Com incluir_omdb=False o OMDB não é chamado: o payload fica marcado com
+    'omdb_pendente' e os ratings entram na próxima visita à página do filme.
+    """
+    payload = montar_payload_agregado(id_tmdb, region=region)
+    anterior = FilmeCache.objects.filter(id_tmdb=id_tmdb).values_list("payload", flat=True).first()
+    if incluir_omdb:
+        _incluir_ratings_omdb(payload, anterior)
+    else:
+        payload["omdb_pendente"] = True
+    # update_or_create já trata a corrida de inserção (IntegrityError) entre requisições
+    FilmeCache.objects.update_or_create(id_tmdb=id_tmdb, defaults={"payload": payload})
+    cache_filmes.set(id_tmdb, payload, ttl=ttl_minutos * 60)
+    return payload
+
+# Validade padrão do payload de filmes no FilmeCache (24h)
+TTL_FILME_MINUTOS = 1440
+
+# Acessos às páginas de filmes, acumulados em memória e gravados em lote no FilmeCache
+_acessos = Counter()
+_acessos_lock = threading.Lock()
+_acessos_gravados_em = time.monotonic()
+
+def registrar_acesso_filme(id_tmdb: int):
+    """
+    Conta um acesso à página do filme (usado para escolher quais filmes aquecer).
+
+    A contagem fica em memória e é gravada no FilmeCache no máximo uma vez
+    a cada ACESSOS_INTERVALO_GRAVACAO segundos, para não escrever no banco a cada visita.
+    """
+    global _acessos_gravados_em
+    intervalo = getattr(settings, "ACESSOS_INTERVALO_GRAVACAO", 60)
+
+    with _acessos_lock:
+        _acessos[id_tmdb] += 1
+        if time.monotonic() - _acessos_gravados_em < intervalo:
+            return
+        pendentes = dict(_acessos)
+        _acessos.clear()
+        _acessos_gravados_em = time.monotonic()
+
+    gravar_acessos(pendentes)
+
+def gravar_acessos(pendentes):
+    """Soma os acessos pendentes (dict id_tmdb -> total) no FilmeCache"""
+    from django.db.models import F
+    for id_tmdb, total in pendentes.items():
+        FilmeCache.objects.filter(id_tmdb=id_tmdb).update(acessos=F('acessos') + total)
+
+def _completar_ratings_omdb(id_tmdb: int, ttl_minutos: int):
+    """Busca os ratings do OMDB de um payload gravado sem eles, sem renovar a validade da linha"""
+    linha = FilmeCache.objects.filter(id_tmdb=id_tmdb).first()
+    if not linha or not linha.payload.get("omdb_pendente"):
+        return
+    payload = dict(linha.payload)
+    del payload["omdb_pendente"]
+    _incluir_ratings_omdb(payload)
+    FilmeCache.objects.filter(id_tmdb=id_tmdb).update(payload=payload)
+    restante = timedelta(minutes=ttl_minutos) - (datetime.now(timezone.utc) - linha.atualizado_em)
+    if restante.total_seconds() > 0:
+        cache_filmes.set(id_tmdb, payload, ttl=int(restante.total_seconds()))
+
+def obter_detalhes_com_cache(id_tmdb: int, ttl_minutos: int = TTL_FILME_MINUTOS, region: str = None,
+                             incluir_omdb: bool = True):
+    """
+    Busca detalhes do filme com cache.
+
+    Ordem de leitura: LRU local -> backend de cache do Django -> FilmeCache (banco).
+    Ao atualizar, grava no FilmeCache e nas camadas de cache (write-through).
+
+    Se a linha do FilmeCache expirou, o payload antigo é servido enquanto um único
+    worker atualiza em segundo plano. Sem nenhum cache, requisições simultâneas
+    para o mesmo filme esperam uma única busca na TMDb (single-flight).
+
+    incluir_omdb=False (enriquecimento de listas) busca só na TMDb; os ratings
+    do OMDB são completados em segundo plano quando a página do filme é aberta.
+    """
+    payload = _payload_com_cache(
+        FilmeCache, cache_filmes, "filme", id_tmdb, ttl_minutos,
+        lambda: _atualizar_filme_cache(id_tmdb, ttl_minutos, region, incluir_omdb)
+    )
+    if incluir_omdb and payload and payload.get("omdb_pendente"):
+        revalidar_em_segundo_plano(f"omdb_filme:{id_tmdb}", lambda: _completar_ratings_omdb(id_tmdb, ttl_minutos))
+    return payload
+
+def _payload_com_cache(modelo, camadas, tipo: str, id_tmdb: int, ttl_minutos: int, atualizar):
+    """
+    Leitura com cache compartilhada por filmes (FilmeCache) e séries (SerieCache).
+
+    `atualizar` busca o payload na TMDb e grava no banco e nas camadas de cache.
+    Retorna uma cópia do payload, ou None se o ID não existe ou a TMDb falhou.
+    """
+    payload = camadas.get(id_tmdb)
+    if payload is not None:
+        return dict(payload)
+
+    # ID inexistente na TMDb consultado há pouco: nem tenta de novo
+    if cache_negativo.get(f"{tipo}:{id_tmdb}"):
+        return None
 
     # Tenta usar cache até 'ttl_minutos' (default 24h). Se expirado, refaz na TMDb e atualiza.
-    try:
-        fc = FilmeCache.objects.get(id_tmdb=id_tmdb)
-        if (datetime.now(timezone.utc) - fc.atualizado_em) < timedelta(minutes=ttl_minutos):
-            return fc.payload
-    except FilmeCache.DoesNotExist:
-        fc = None
+    linha = modelo.objects.filter(id_tmdb=id_tmdb).first()
+    if linha:
+        idade = datetime.now(timezone.utc) - linha.atualizado_em
+        if idade < timedelta(minutes=ttl_minutos):
+            restante = timedelta(minutes=ttl_minutos) - idade
+            camadas.set(id_tmdb, linha.payload, ttl=int(restante.total_seconds()))
+        else:
+            # Expirado: serve o payload antigo enquanto um único worker atualiza
+            camadas.set(id_tmdb, linha.payload, ttl=getattr(settings, "CACHE_STALE_TTL", 60))
+            revalidar_em_segundo_plano(f"{tipo}:{id_tmdb}", atualizar)
+        return dict(linha.payload)
 
     try:
-        payload = montar_payload_agregado(id_tmdb, region=region)
+        payload = executar_uma_vez(f"{tipo}:{id_tmdb}", atualizar)
+    except RecursoNaoEncontrado:
+        cache_negativo.set(f"{tipo}:{id_tmdb}", True, ttl=getattr(settings, "CACHE_NEGATIVO_TTL", 300))
+        return None
     except Exception as e:
-        print(f"[ERRO] Falha ao buscar detalhes do filme {id_tmdb}: {e}")
+        print(f"[ERRO] Falha ao buscar detalhes ({tipo}) {id_tmdb}: {e}")
         return None
 
-    if fc:
-        # Cache existe mas está expirado - atualizar
-        fc.payload = payload
-        fc.save(update_fields=["payload", "atualizado_em"])
-    else:
-        # Cache não existe - tentar criar
-        try:
-            FilmeCache.objects.create(id_tmdb=id_tmdb, payload=payload)
-        except IntegrityError:
-            # Outra requisição já criou o cache - buscar e retornar
-            # Isso acontece quando múltiplas requisições chegam simultaneamente
-            print(f"[INFO] Cache para filme {id_tmdb} já existe (criado por outra requisição)")
-            try:
-                fc = FilmeCache.objects.get(id_tmdb=id_tmdb)
-                return fc.payload
-            except FilmeCache.DoesNotExist:
-                # Caso extremamente raro - retornar o payload que acabamos de buscar
-                pass
+    return dict(payload)
 
-    return payload
+def inexistente_na_tmdb(tipo: str, id_tmdb: int) -> bool:
+    """True se a TMDb respondeu 404 para o ID há pouco (cache negativo de _payload_com_cache)"""
+    return bool(cache_negativo.get(f"{tipo}:{id_tmdb}"))
 
 def converter_para_estrelas(nota_tmdb):
     """Converte nota TMDb (0-10) para escala de 5 estrelas com meia estrela"""
@@ -413,32 +595,135 @@ def formatar_duracao(minutos):
         return f"{horas}h {mins}min" if mins > 0 else f"{horas}h"
     return f"{mins}min"
 
+# Gêneros de filmes da TMDb (pt-BR), usados quando os detalhes não estão disponíveis
+GENEROS_FILMES = {
+    28: 'Ação', 12: 'Aventura', 16: 'Animação', 35: 'Comédia', 80: 'Crime',
+    99: 'Documentário', 18: 'Drama', 10751: 'Família', 14: 'Fantasia',
+    36: 'História', 27: 'Terror', 10402: 'Música', 9648: 'Mistério',
+    10749: 'Romance', 878: 'Ficção científica', 10770: 'Cinema TV',
+    53: 'Thriller', 10752: 'Guerra', 37: 'Faroeste'
+}
+
+def _resolver_duracao_generos(ids_tmdb):
+    """
+    Resolve duração e gêneros de vários filmes de uma vez para os trilhos da home.
+
+    Usa primeiro os payloads já salvos no FilmeCache e busca apenas os que
+    faltam, em paralelo. Filmes cuja busca falhou ficam fora do dict retornado
+    (id -> {'duracao_min', 'generos'}).
+    """
+    ids_tmdb = [i for i in ids_tmdb if i]
+    info = {}
+
+    for fc in FilmeCache.objects.filter(id_tmdb__in=ids_tmdb):
+        payload = fc.payload or {}
+        info[fc.id_tmdb] = {
+            'duracao_min': payload.get('duracao_min'),
+            'generos': payload.get('generos') or []
+        }
+
+    faltando = [i for i in ids_tmdb if i not in info]
+    buscados = _em_paralelo({i: (lambda i=i: buscar_detalhes_filme(i)) for i in faltando})
+    for id_tmdb, detalhes in buscados.items():
+        if isinstance(detalhes, Exception):
+            print(f"[AVISO] Detalhes do filme {id_tmdb} indisponíveis: {detalhes}")
+            continue
+        info[id_tmdb] = {
+            'duracao_min': detalhes.get('runtime'),
+            'generos': [g['name'] for g in detalhes.get('genres', [])]
+        }
+
+    return info
+
+# IDs falsos em que os trilhos eram gravados no FilmeCache antes do TrilhoCache
+IDS_TRILHOS_LEGADOS = range(999994, 1000000)
+
+def remover_trilhos_legados():
+    """Apaga do FilmeCache as linhas antigas de trilhos (payload com 'cache_type'). Retorna quantas."""
+    removidos, _ = FilmeCache.objects.filter(
+        id_tmdb__in=IDS_TRILHOS_LEGADOS, payload__has_key='cache_type'
+    ).delete()
+    return removidos
+
+# Validade do cache de cada trilho da home
+TTL_TRILHOS = {
+    'top_rated': timedelta(hours=6),
+    'trending': timedelta(hours=1),
+    'recommended': timedelta(hours=3),
+    'goats': timedelta(hours=12),
+    'now_playing': timedelta(hours=6),
+    'classics': timedelta(hours=24),
+}
+
+def _chave_trilho(trilho, regiao=None, idioma="pt-BR", **parametros):
+    """Campos que identificam uma variante de trilho no TrilhoCache"""
+    return {
+        'trilho': trilho,
+        'parametros': "&".join(f"{k}={v}" for k, v in sorted(parametros.items())),
+        'regiao': regiao or getattr(settings, "TMDB_DEFAULT_REGION", "BR"),
+        'idioma': idioma,
+    }
+
+def atualizar_trilho(trilho, regiao=None, idioma="pt-BR", **parametros):
+    """Busca o trilho na TMDb e grava no TrilhoCache, sem olhar a validade atual"""
+    filmes = CONSTRUTORES_TRILHOS[trilho](**parametros)
+    if filmes:
+        TrilhoCache.objects.update_or_create(
+            **_chave_trilho(trilho, regiao, idioma, **parametros),
+            defaults={
+                'payload': {'filmes': filmes},
+                'expira_em': datetime.now(timezone.utc) + TTL_TRILHOS[trilho],
+            }
+        )
+    return filmes
+
+def _trilho_com_cache(trilho, usar_cache=True, regiao=None, idioma="pt-BR", **parametros):
+    """
+    Cache dos trilhos da home no TrilhoCache, uma linha por
+    (trilho, parâmetros, região, idioma) e validade definida em TTL_TRILHOS.
+
+    - Cache válido: retorna direto.
+    - Cache expirado: retorna o conteúdo antigo e atualiza em segundo plano
+      (stale-while-revalidate), com um único worker atualizando por variante.
+    - Sem cache: single-flight, só uma thread busca na TMDb e as demais esperam.
+    """
+    if not usar_cache:
+        return CONSTRUTORES_TRILHOS[trilho](**parametros)
+
+    chave = _chave_trilho(trilho, regiao, idioma, **parametros)
+    chave_lock = "trilho:{trilho}:{parametros}:{regiao}:{idioma}".format(**chave)
+
+    def atualizar():
+        return atualizar_trilho(trilho, regiao, idioma, **parametros)
+
+    try:
+        tc = TrilhoCache.objects.filter(**chave).first()
+    except Exception:
+        tc = None
+
+    if tc:
+        if tc.expira_em <= datetime.now(timezone.utc):
+            revalidar_em_segundo_plano(chave_lock, atualizar)
+        return tc.payload.get('filmes', [])
+
+    return executar_uma_vez(chave_lock, atualizar)
+
 def obter_top_filmes(limit=5, usar_cache=True):
     """Busca os filmes mais bem avaliados para a Hero Section"""
-    cache_key = f"top_rated_{limit}"
-
-    if usar_cache:
-        try:
-            fc = FilmeCache.objects.filter(id_tmdb=999999).first()
-            if fc and fc.payload.get('cache_type') == cache_key:
-                if (datetime.now(timezone.utc) - fc.atualizado_em) < timedelta(hours=6):
-                    return fc.payload.get('filmes', [])
-        except:
-            pass
+    return _trilho_com_cache("top_rated", usar_cache=usar_cache, limit=limit)
 
+def _construir_top_filmes(limit):
     # Buscar da API
     data = _get("/movie/top_rated", params={"language": "pt-BR", "page": 1})
     filmes = data.get("results", [])[:limit]
 
+    # Duração vem do FilmeCache ou de uma busca paralela dos que faltam
+    info_filmes = _resolver_duracao_generos([filme.get('id') for filme in filmes])
+
     # Formatar para Hero Section
     hero_movies = []
     for filme in filmes:
-        # Buscar detalhes completos para ter duração
-        try:
-            detalhes = buscar_detalhes_filme(filme['id'])
-            duracao = detalhes.get('runtime')
-        except:
-            duracao = None
+        duracao = info_filmes.get(filme.get('id'), {}).get('duracao_min')
 
         hero_movies.append({
             'tmdb_id': filme.get('id'),
@@ -452,49 +737,31 @@ def obter_top_filmes(limit=5, usar_cache=True):
             'sinopse': filme.get('overview', '')
         })
 
-    # Salvar no cache
-    if usar_cache and hero_movies:
-        cache_payload = {
-            'cache_type': cache_key,
-            'filmes': hero_movies
-        }
-        FilmeCache.objects.update_or_create(
-            id_tmdb=999999,
-            defaults={'payload': cache_payload}
-        )
-
     return hero_movies
 
 def obter_trending(limit=20, usar_cache=True):
     """Busca filmes em tendência (trending da semana)"""
-    cache_key = f"trending_{limit}"
-
-    if usar_cache:
-        try:
-            fc = FilmeCache.objects.filter(id_tmdb=999998).first()
-            if fc and fc.payload.get('cache_type') == cache_key:
-                if (datetime.now(timezone.utc) - fc.atualizado_em) < timedelta(hours=1):
-                    return fc.payload.get('filmes', [])
-        except:
-            pass
+    return _trilho_com_cache("trending", usar_cache=usar_cache, limit=limit)
 
+def _construir_trending(limit):
     # Buscar da API
     data = _get("/trending/movie/week", params={"language": "pt-BR"})
     filmes = data.get("results", [])[:limit]
 
+    # Duração e gêneros vêm do FilmeCache ou de uma busca paralela dos que faltam
+    info_filmes = _resolver_duracao_generos([filme.get('id') for filme in filmes])
+
     # Formatar
     trending_movies = []
     for filme in filmes:
-        # Buscar detalhes do filme para obter duração e gêneros
-        duracao_formatada = ""
-        generos = []
-        try:
-            detalhes = buscar_detalhes_filme(filme.get('id'))
-            duracao_min = detalhes.get('runtime')
-            duracao_formatada = formatar_duracao(duracao_min)
-            generos = [g['name'] for g in detalhes.get('genres', [])]
-        except:
-            pass
+        info = info_filmes.get(filme.get('id'))
+        if info:
+            duracao_formatada = formatar_duracao(info.get('duracao_min'))
+            generos = info.get('generos') or []
+        else:
+            # Fallback: gêneros a partir dos IDs que já vêm no trilho
+            duracao_formatada = ""
+            generos = [GENEROS_FILMES[g] for g in filme.get('genre_ids', []) if g in GENEROS_FILMES]
 
         trending_movies.append({
             'tmdb_id': filme.get('id'),
@@ -509,17 +776,6 @@ def obter_trending(limit=20, usar_cache=True):
             'duracao': duracao_formatada
         })
 
-    # Salvar no cache
-    if usar_cache and trending_movies:
-        cache_payload = {
-            'cache_type': cache_key,
-            'filmes': trending_movies
-        }
-        FilmeCache.objects.update_or_create(
-            id_tmdb=999998,
-            defaults={'payload': cache_payload}
-        )
-
     return trending_movies
 
 def obter_recomendados(limit=12, usar_cache=True, usuario=None):
@@ -628,18 +884,9 @@ def obter_recomendados(limit=12, usar_cache=True, usuario=None):
     
     # Fallback: recomendações genéricas se não houver histórico suficiente ou usuário não autenticado
     print("[DEBUG] Usando fallback genérico para recomendações")
-    cache_key = f"recommended_{limit}"
-
-    if usar_cache:
-        try:
-            from backstage.models import FilmeCache
-            fc = FilmeCache.objects.filter(id_tmdb=999997).first()
-            if fc and fc.payload.get('cache_type') == cache_key:
-                if (datetime.now(timezone.utc) - fc.atualizado_em) < timedelta(hours=3):
-                    return fc.payload.get('filmes', [])
-        except:
-            pass
+    return _trilho_com_cache("recommended", usar_cache=usar_cache, limit=limit)
 
+def _construir_recomendados(limit):
     # Buscar filmes populares
     data = _get("/movie/popular", params={"language": "pt-BR", "page": 1})
     # Filtrar apenas filmes com nota >= 7
@@ -660,21 +907,6 @@ def obter_recomendados(limit=12, usar_cache=True, usuario=None):
             'generos': []
         })
 
-    # Salvar no cache
-    if usar_cache and recommended_movies:
-        try:
-            from backstage.models import FilmeCache
-            cache_payload = {
-                'cache_type': cache_key,
-                'filmes': recommended_movies
-            }
-            FilmeCache.objects.update_or_create(
-                id_tmdb=999997,
-                defaults={'payload': cache_payload}
-            )
-        except:
-            pass
-
     return recommended_movies
 
 def obter_recomendados_por_favoritos(usuario, limit=12, offset=0):
@@ -782,17 +1014,9 @@ def obter_recomendados_por_favoritos(usuario, limit=12, offset=0):
 
 def obter_goats(limit=20, usar_cache=True):
     """Busca filmes GOATS (Greatest of All Time) - os com as maiores notas da história"""
-    cache_key = f"goats_{limit}"
-
-    if usar_cache:
-        try:
-            fc = FilmeCache.objects.filter(id_tmdb=999996).first()
-            if fc and fc.payload.get('cache_type') == cache_key:
-                if (datetime.now(timezone.utc) - fc.atualizado_em) < timedelta(hours=12):
-                    return fc.payload.get('filmes', [])
-        except:
-            pass
+    return _trilho_com_cache("goats", usar_cache=usar_cache, limit=limit)
 
+def _construir_goats(limit):
     # Buscar filmes com melhor avaliação (top rated) com filtro mais rigoroso
     goats_movies = []
 
@@ -836,32 +1060,13 @@ def obter_goats(limit=20, usar_cache=True):
     goats_movies.sort(key=lambda x: (x['nota'], x['votos']), reverse=True)
     goats_movies = goats_movies[:limit]
 
-    # Salvar no cache
-    if usar_cache and goats_movies:
-        cache_payload = {
-            'cache_type': cache_key,
-            'filmes': goats_movies
-        }
-        FilmeCache.objects.update_or_create(
-            id_tmdb=999996,
-            defaults={'payload': cache_payload}
-        )
-
     return goats_movies
 
 def obter_em_cartaz(limit=12, usar_cache=True):
     """Busca filmes em cartaz nos cinemas"""
-    cache_key = f"now_playing_{limit}"
-
-    if usar_cache:
-        try:
-            fc = FilmeCache.objects.filter(id_tmdb=999995).first()
-            if fc and fc.payload.get('cache_type') == cache_key:
-                if (datetime.now(timezone.utc) - fc.atualizado_em) < timedelta(hours=6):
-                    return fc.payload.get('filmes', [])
-        except:
-            pass
+    return _trilho_com_cache("now_playing", usar_cache=usar_cache, limit=limit)
 
+def _construir_em_cartaz(limit):
     # Buscar filmes em cartaz
     data = _get("/movie/now_playing", params={"language": "pt-BR", "region": "BR"})
     filmes = data.get("results", [])[:limit]
@@ -881,32 +1086,13 @@ def obter_em_cartaz(limit=12, usar_cache=True):
             'generos': []
         })
 
-    # Salvar no cache
-    if usar_cache and now_playing_movies:
-        cache_payload = {
-            'cache_type': cache_key,
-            'filmes': now_playing_movies
-        }
-        FilmeCache.objects.update_or_create(
-            id_tmdb=999995,
-            defaults={'payload': cache_payload}
-        )
-
     return now_playing_movies
 
 def obter_classicos(limit=12, usar_cache=True):
     """Busca filmes clássicos (filmes antigos bem avaliados)"""
-    cache_key = f"classics_{limit}"
-
-    if usar_cache:
-        try:
-            fc = FilmeCache.objects.filter(id_tmdb=999994).first()
-            if fc and fc.payload.get('cache_type') == cache_key:
-                if (datetime.now(timezone.utc) - fc.atualizado_em) < timedelta(hours=24):
-                    return fc.payload.get('filmes', [])
-        except:
-            pass
+    return _trilho_com_cache("classics", usar_cache=usar_cache, limit=limit)
 
+def _construir_classicos(limit):
     # Buscar filmes clássicos (top rated com data antiga)
     classics_movies = []
 
@@ -955,34 +1141,29 @@ def obter_classicos(limit=12, usar_cache=True):
     classics_movies.sort(key=lambda x: (x['nota'], -x['ano']), reverse=True)
     classics_movies = classics_movies[:limit]
 
-    # Salvar no cache
-    if usar_cache and classics_movies:
-        cache_payload = {
-            'cache_type': cache_key,
-            'filmes': classics_movies
-        }
-        FilmeCache.objects.update_or_create(
-            id_tmdb=999994,
-            defaults={'payload': cache_payload}
-        )
-
     return classics_movies
 
+# Funções que montam cada trilho (sem cache), usadas pelo TrilhoCache e pelo aquecimento
+CONSTRUTORES_TRILHOS = {
+    'top_rated': _construir_top_filmes,
+    'trending': _construir_trending,
+    'recommended': _construir_recomendados,
+    'goats': _construir_goats,
+    'now_playing': _construir_em_cartaz,
+    'classics': _construir_classicos,
+}
+
 def buscar_detalhes_serie(tmdb_id):
-    """Busca detalhes completos de uma série no TMDb"""
-   
-    api_key = settings.TMDB_API_KEY
-    url = f"https://api.themoviedb.org/3/tv/{tmdb_id}"
-    
-    params = {
-        'api_key': api_key,
+    """
+    Busca detalhes completos de uma série no TMDb
+
+    Sem 'images' no append_to_response: o bloco de imagens é grande e a
+    página da série não usa. Lança RecursoNaoEncontrado se o ID não existir.
+    """
+    data = _get(f"/tv/{tmdb_id}", {
         'language': 'pt-BR',
-        'append_to_response': 'credits,videos,images,similar,content_ratings'
-    }
-    
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-    data = response.json()
+        'append_to_response': 'credits,videos,similar,content_ratings'
+    })
     
     # Formatar dados
     return {
@@ -1009,21 +1190,38 @@ def buscar_detalhes_serie(tmdb_id):
         'series_similares': data.get('similar', {}).get('results', [])[:12],
     }
 
-def buscar_temporada(tmdb_id, numero_temporada):
-    """Busca detalhes de uma temporada específica"""
+# Validade padrão do payload de séries no SerieCache (24h)
+TTL_SERIE_MINUTOS = 1440
 
-    api_key = settings.TMDB_API_KEY
-    url = f"https://api.themoviedb.org/3/tv/{tmdb_id}/season/{numero_temporada}"
-    
-    params = {
-        'api_key': api_key,
-        'language': 'pt-BR'
-    }
-    
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-    data = response.json()
-    
+def _atualizar_serie_cache(tmdb_id: int, ttl_minutos: int):
+    """
+    Busca a série na TMDb e grava no SerieCache e nas camadas de cache.
+    Na primeira vez que a série entra no cache, as temporadas são pré-carregadas.
+    """
+    payload = buscar_detalhes_serie(tmdb_id)
+    _, criada = SerieCache.objects.update_or_create(id_tmdb=tmdb_id, defaults={"payload": payload})
+    cache_series.set(tmdb_id, payload, ttl=ttl_minutos * 60)
+    if criada:
+        revalidar_em_segundo_plano(
+            f"temporadas:{tmdb_id}",
+            lambda: precarregar_temporadas(tmdb_id, payload)
+        )
+    return payload
+
+def obter_detalhes_serie_com_cache(tmdb_id: int, ttl_minutos: int = TTL_SERIE_MINUTOS):
+    """
+    Busca detalhes da série com cache (mesma estratégia de obter_detalhes_com_cache).
+
+    Ordem de leitura: LRU local -> backend de cache do Django -> SerieCache (banco).
+    Retorna None se a série não existir na TMDb ou se a busca falhar sem cache.
+    """
+    return _payload_com_cache(
+        SerieCache, cache_series, "serie", tmdb_id, ttl_minutos,
+        lambda: _atualizar_serie_cache(tmdb_id, ttl_minutos)
+    )
+
+def _formatar_temporada(data):
+    """Formata a resposta de /tv/{id}/season/{n} da TMDb"""
     return {
         'numero_temporada': data.get('season_number'),
         'nome': data.get('name'),
@@ -1044,6 +1242,114 @@ def buscar_temporada(tmdb_id, numero_temporada):
         ]
     }
 
+def buscar_temporada(tmdb_id, numero_temporada):
+    """Busca detalhes de uma temporada específica"""
+    return _formatar_temporada(_get(f"/tv/{tmdb_id}/season/{numero_temporada}", {'language': 'pt-BR'}))
+
+# Validade das temporadas no TemporadaCache conforme o status da série
+TTL_TEMPORADAS = {
+    'finalizada': timedelta(days=30),  # série finalizada ou cancelada
+    'anterior': timedelta(days=7),     # temporada já encerrada de série em exibição
+    'atual': timedelta(hours=6),       # última temporada de série em exibição
+}
+
+# Temporadas por requisição no pré-carregamento (limite do append_to_response da TMDb)
+TEMPORADAS_POR_REQUISICAO = 20
+
+def _ttl_temporada(tmdb_id, numero_temporada, serie=None):
+    """Escolhe a validade da temporada a partir do status da série em cache"""
+    if serie is None:
+        serie = cache_series.get(tmdb_id)
+    if serie is None:
+        serie = SerieCache.objects.filter(id_tmdb=tmdb_id).values_list("payload", flat=True).first() or {}
+
+    if serie.get('status') in ('Finalizada', 'Cancelada'):
+        return TTL_TEMPORADAS['finalizada']
+    ultima = serie.get('numero_temporadas') or 0
+    if ultima and numero_temporada < ultima:
+        return TTL_TEMPORADAS['anterior']
+    return TTL_TEMPORADAS['atual']
+
+def _gravar_temporada(tmdb_id, numero_temporada, temporada, serie=None):
+    """Grava a temporada no TemporadaCache e nas camadas de cache"""
+    ttl = _ttl_temporada(tmdb_id, numero_temporada, serie)
+    TemporadaCache.objects.update_or_create(
+        serie_tmdb_id=tmdb_id, numero=numero_temporada,
+        defaults={'payload': temporada, 'expira_em': datetime.now(timezone.utc) + ttl}
+    )
+    cache_temporadas.set(f"{tmdb_id}:{numero_temporada}", temporada, ttl=int(ttl.total_seconds()))
+    return temporada
+
+def _atualizar_temporada(tmdb_id, numero_temporada):
+    return _gravar_temporada(tmdb_id, numero_temporada, buscar_temporada(tmdb_id, numero_temporada))
+
+def obter_temporada_com_cache(tmdb_id: int, numero_temporada: int):
+    """
+    Busca os episódios de uma temporada com cache.
+
+    Ordem de leitura: LRU local -> backend de cache do Django -> TemporadaCache.
+    Temporada expirada é servida enquanto um único worker atualiza; sem cache,
+    single-flight. Lança RecursoNaoEncontrado se a temporada não existir.
+    """
+    chave = f"{tmdb_id}:{numero_temporada}"
+    temporada = cache_temporadas.get(chave)
+    if temporada is not None:
+        return dict(temporada)
+
+    if cache_negativo.get(f"temporada:{chave}"):
+        raise RecursoNaoEncontrado(f"Temporada {numero_temporada} da série {tmdb_id} não encontrada")
+
+    def atualizar():
+        return _atualizar_temporada(tmdb_id, numero_temporada)
+
+    tc = TemporadaCache.objects.filter(serie_tmdb_id=tmdb_id, numero=numero_temporada).first()
+    if tc:
+        restante = tc.expira_em - datetime.now(timezone.utc)
+        if restante.total_seconds() > 0:
+            cache_temporadas.set(chave, tc.payload, ttl=int(restante.total_seconds()))
+        else:
+            cache_temporadas.set(chave, tc.payload, ttl=getattr(settings, "CACHE_STALE_TTL", 60))
+            revalidar_em_segundo_plano(f"temporada:{chave}", atualizar)
+        return dict(tc.payload)
+
+    try:
+        return dict(executar_uma_vez(f"temporada:{chave}", atualizar))
+    except RecursoNaoEncontrado:
+        cache_negativo.set(f"temporada:{chave}", True, ttl=getattr(settings, "CACHE_NEGATIVO_TTL", 300))
+        raise
+
+def precarregar_temporadas(tmdb_id, serie=None):
+    """
+    Grava no TemporadaCache todas as temporadas da série que ainda não estão em cache.
+
+    Usa append_to_response=season/1,season/2,... para trazer até
+    TEMPORADAS_POR_REQUISICAO temporadas por chamada à TMDb.
+    Retorna quantas temporadas foram gravadas.
+    """
+    if serie is None:
+        serie = obter_detalhes_serie_com_cache(tmdb_id) or {}
+
+    numeros = [t.get('season_number') for t in serie.get('temporadas', []) if t.get('season_number') is not None]
+    em_cache = set(
+        TemporadaCache.objects.filter(
+            serie_tmdb_id=tmdb_id, numero__in=numeros, expira_em__gt=datetime.now(timezone.utc)
+        ).values_list('numero', flat=True)
+    )
+    pendentes = [n for n in numeros if n not in em_cache]
+
+    gravadas = 0
+    for i in range(0, len(pendentes), TEMPORADAS_POR_REQUISICAO):
+        lote = pendentes[i:i + TEMPORADAS_POR_REQUISICAO]
+        data = _get(f"/tv/{tmdb_id}", {
+            'language': 'pt-BR',
+            'append_to_response': ','.join(f"season/{n}" for n in lote)
+        })
+        for n in lote:
+            if data.get(f"season/{n}"):
+                _gravar_temporada(tmdb_id, n, _formatar_temporada(data[f"season/{n}"]), serie)
+                gravadas += 1
+    return gravadas
+
 def traduzir_status_serie(status):
     """Traduz o status da série"""
     traducoes = {
@@ -1143,10 +1449,14 @@ def obter_ratings_omdb(imdb_id):
     """
     if not imdb_id:
         return None
+
+    # Filme que o OMDB já disse não conhecer
+    if cache_negativo.get(f"omdb:{imdb_id}"):
+        return None
         
     try:
-        url = f"{settings.OMDB_BASE_URL}?apikey={settings.OMDB_API_KEY}&i={imdb_id}"
-        response = requests.get(url, timeout=5)
+        params = {'apikey': settings.OMDB_API_KEY, 'i': imdb_id}
+        response = http_client.get(settings.OMDB_BASE_URL, params=params, timeout=5)
         
         if response.status_code != 200:
             print(f"Erro OMDB API: status {response.status_code}")
@@ -1156,6 +1466,7 @@ def obter_ratings_omdb(imdb_id):
         
         if data.get('Response') == 'False':
             print(f"OMDB não encontrou filme: {data.get('Error')}")
+            cache_negativo.set(f"omdb:{imdb_id}", True, ttl=getattr(settings, "CACHE_NEGATIVO_TTL", 300))
             return None
         
         # Extrair ratings
@@ -1,7 +1,18 @@
-from django.db.models.signals import post_save
+from django.db import connections, transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_migrate
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Lista, Profile
+from .models import (
+    Lista, Profile, Filme, Serie, Critica, CriticaSerie,
+    DiarioFilme, DiarioSerie, FilmeFavorito, SerieFavorita, Amizade, MensagemComunidade, MembroComunidade,
+)
+from .services.avaliacoes import atualizar_nota_usuario, remover_notas_usuario
+from .services.amizades import criar_arestas
+from .services.busca_usuarios import CAMPOS_BUSCA, indexar_usuario, remover_usuario_do_indice
+from .services.chat import invalidar_membros, atualizar_retrato_autor
+from .services.chat_tempo_real import definir_versao_chat, encerrar_assinaturas
+from .services.feed import publicar_evento, remover_evento, conectar_feeds, desconectar_feeds
 
 
 @receiver(post_save, sender=User)
@@ -21,3 +32,166 @@ def criar_lista_assistir_mais_tarde(sender, instance, created, **kwargs):
         
         # Criar Profile para o usuário
         Profile.objects.get_or_create(usuario=instance)
+
+
+def _tmdb_id_da_obra(modelo, obra_id):
+    """tmdb_id do Filme/Serie da linha (a obra pode já ter sido apagada em cascata)"""
+    return modelo.objects.filter(pk=obra_id).values_list('tmdb_id', flat=True).first()
+
+
+def _remocao_de_usuario(origin):
+    """
+    True se a linha está sendo apagada em cascata pela remoção de um User
+    (as notas dele já saíram das médias em remover_notas_do_usuario).
+    O `origin` vem do próprio delete(), então um rollback não deixa estado para trás.
+    """
+    modelo = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(modelo, User)
+
+
+@receiver([post_save, post_delete], sender=Critica)
+@receiver([post_save, post_delete], sender=DiarioFilme)
+def atualizar_media_filme(sender, instance, **kwargs):
+    """Mantém a média do Backstage do filme ao salvar/remover crítica ou diário"""
+    if _remocao_de_usuario(kwargs.get('origin')):
+        return
+    atualizar_nota_usuario('filme', _tmdb_id_da_obra(Filme, instance.filme_id), instance.usuario_id)
+
+
+@receiver([post_save, post_delete], sender=CriticaSerie)
+@receiver([post_save, post_delete], sender=DiarioSerie)
+def atualizar_media_serie(sender, instance, **kwargs):
+    """Mantém a média do Backstage da série ao salvar/remover crítica ou diário"""
+    if _remocao_de_usuario(kwargs.get('origin')):
+        return
+    atualizar_nota_usuario('serie', _tmdb_id_da_obra(Serie, instance.serie_id), instance.usuario_id)
+
+
+@receiver([post_save, post_delete], sender=FilmeFavorito)
+def atualizar_media_filme_favorito(sender, instance, **kwargs):
+    if _remocao_de_usuario(kwargs.get('origin')):
+        return
+    atualizar_nota_usuario('filme', instance.tmdb_id, instance.usuario_id)
+
+
+@receiver([post_save, post_delete], sender=SerieFavorita)
+def atualizar_media_serie_favorita(sender, instance, **kwargs):
+    if _remocao_de_usuario(kwargs.get('origin')):
+        return
+    atualizar_nota_usuario('serie', instance.tmdb_id, instance.usuario_id)
+
+
+@receiver(pre_delete, sender=User)
+def remover_notas_do_usuario(sender, instance, **kwargs):
+    """Tira as notas do usuário das médias antes da remoção em cascata"""
+    remover_notas_usuario(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def finalizar_remocao_usuario(sender, instance, **kwargs):
+    remover_usuario_do_indice(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def indexar_usuario_na_busca(sender, instance, update_fields=None, **kwargs):
+    """Mantém o índice de busca de pessoas ao registrar ou renomear um usuário"""
+    if update_fields and not CAMPOS_BUSCA.intersection(update_fields):
+        return  # ex.: login só atualiza last_login
+    indexar_usuario(instance)
+
+
+@receiver(pre_migrate)
+def habilitar_trigramas(sender, using, **kwargs):
+    """O índice GIN de IndiceBuscaUsuario precisa da extensão pg_trgm no PostgreSQL"""
+    if sender.name == 'backstage' and connections[using].vendor == 'postgresql':
+        with connections[using].cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+
+# Feed de atividades: (prefixo da origem, tipo de evento, tipo de obra) por modelo
+EVENTOS_FEED = {
+    Critica: ('critica', 'critica', 'filme'),
+    CriticaSerie: ('critica_serie', 'critica', 'serie'),
+    DiarioFilme: ('diario_filme', 'diario', 'filme'),
+    DiarioSerie: ('diario_serie', 'diario', 'serie'),
+    FilmeFavorito: ('filme_favorito', 'favorito', 'filme'),
+    SerieFavorita: ('serie_favorita', 'favorito', 'serie'),
+}
+
+
+def publicar_no_feed(instance, forcar_fanout=False):
+    """Publica (ou atualiza) no feed dos amigos o evento de uma crítica, diário ou favorito"""
+    prefixo, tipo_evento, tipo_obra = EVENTOS_FEED[type(instance)]
+    if tipo_evento == 'favorito':
+        tmdb_id, titulo, criado_em = instance.tmdb_id, instance.titulo, instance.adicionado_em
+    else:
+        obra = instance.filme if tipo_obra == 'filme' else instance.serie
+        tmdb_id, titulo, criado_em = obra.tmdb_id, obra.titulo, instance.criado_em
+    publicar_evento(
+        instance.usuario_id, f"{prefixo}:{instance.pk}", tipo_evento, tipo_obra,
+        tmdb_id, titulo, instance.nota, criado_em, forcar_fanout=forcar_fanout
+    )
+
+
+def _publicar_evento_feed(sender, instance, **kwargs):
+    publicar_no_feed(instance)
+
+
+def _remover_evento_feed(sender, instance, **kwargs):
+    remover_evento(f"{EVENTOS_FEED[sender][0]}:{instance.pk}")
+
+
+for _modelo in EVENTOS_FEED:
+    post_save.connect(_publicar_evento_feed, sender=_modelo, dispatch_uid=f"feed_publicar_{_modelo.__name__}")
+    post_delete.connect(_remover_evento_feed, sender=_modelo, dispatch_uid=f"feed_remover_{_modelo.__name__}")
+
+
+@receiver(post_save, sender=Amizade)
+def conectar_feeds_amizade(sender, instance, created, **kwargs):
+    """Nova amizade: grava as arestas dos dois lados e conecta os feeds"""
+    if created:
+        criar_arestas(instance)
+        conectar_feeds(instance.usuario1_id, instance.usuario2_id)
+
+
+@receiver(post_delete, sender=Amizade)
+def desconectar_feeds_amizade(sender, instance, **kwargs):
+    desconectar_feeds(instance.usuario1_id, instance.usuario2_id)
+
+
+@receiver(post_save, sender=MensagemComunidade)
+def atualizar_versao_chat(sender, instance, created, **kwargs):
+    """
+    Nova mensagem: avança a versão da comunidade e acorda os long-polls.
+    Espera o commit, para que o long-poll acordado já encontre o fragmento JSON.
+    """
+    if created:
+        comunidade_id, mensagem_id = instance.comunidade_id, instance.pk
+        transaction.on_commit(lambda: definir_versao_chat(comunidade_id, mensagem_id))
+
+
+@receiver([post_save, post_delete], sender=MembroComunidade)
+def invalidar_membros_comunidade(sender, instance, **kwargs):
+    """Entrar, sair, promover ou expulsar: o mapa de papéis da comunidade é refeito"""
+    invalidar_membros(instance.comunidade_id)
+
+
+@receiver(post_delete, sender=MembroComunidade)
+def encerrar_conexoes_do_membro(sender, instance, **kwargs):
+    """Saiu ou foi expulso: fecha o WebSocket/SSE do chat que ele tiver aberto"""
+    encerrar_assinaturas(instance.comunidade_id, instance.usuario_id)
+
+
+@receiver(post_save, sender=User)
+def atualizar_retrato_por_usuario(sender, instance, created, update_fields=None, **kwargs):
+    """Username alterado: atualiza o retrato do autor nas mensagens do chat"""
+    if created or (update_fields and 'username' not in update_fields):
+        return
+    atualizar_retrato_autor(instance)
+
+
+@receiver(post_save, sender=Profile)
+def atualizar_retrato_por_perfil(sender, instance, created, **kwargs):
+    """Foto de perfil alterada: atualiza o retrato do autor nas mensagens do chat"""
+    if not created:
+        atualizar_retrato_autor(instance.usuario)
@@ -0,0 +1,83 @@
+// Feed de atividade dos amigos - "Carregar mais" pelo cursor da /api/feed/
+document.addEventListener('DOMContentLoaded', function() {
+    const botao = document.getElementById('activityLoadMore');
+    const lista = document.getElementById('activityList');
+
+    if (!botao || !lista) return; // Sem mais páginas ou usuário não logado
+
+    const verbos = { diario: 'assistiu', favorito: 'favoritou', critica: 'avaliou' };
+
+    function tempoDecorrido(iso) {
+        const segundos = Math.max(0, (Date.now() - new Date(iso).getTime()) / 1000);
+        const unidades = [
+            [86400 * 365, 'ano', 'anos'],
+            [86400 * 30, 'mês', 'meses'],
+            [86400 * 7, 'semana', 'semanas'],
+            [86400, 'dia', 'dias'],
+            [3600, 'hora', 'horas'],
+            [60, 'minuto', 'minutos'],
+        ];
+        for (const [tamanho, singular, plural] of unidades) {
+            const quantidade = Math.floor(segundos / tamanho);
+            if (quantidade >= 1) {
+                return `${quantidade} ${quantidade === 1 ? singular : plural} atrás`;
+            }
+        }
+        return '0 minutos atrás';
+    }
+
+    // Mesmo HTML do template (texto sempre via textContent)
+    function criarItem(atividade) {
+        const item = document.createElement('div');
+        item.className = 'activity-item';
+
+        const avatar = document.createElement('img');
+        avatar.className = 'activity-avatar';
+        avatar.alt = atividade.usuario;
+        avatar.src = `https://ui-avatars.com/api/?name=${encodeURIComponent(atividade.usuario)}&background=random&size=48`;
+
+        const conteudo = document.createElement('div');
+        conteudo.className = 'activity-content';
+
+        const texto = document.createElement('p');
+        const autor = document.createElement('strong');
+        autor.textContent = atividade.usuario;
+        const link = document.createElement('a');
+        link.href = atividade.tipo === 'filme' ? `/filmes/${atividade.tmdb_id}/` : `/series/${atividade.tmdb_id}/`;
+        link.textContent = atividade.titulo;
+        const estrelas = document.createElement('span');
+        estrelas.className = 'rating-stars';
+        estrelas.textContent = [1, 2, 3, 4, 5].map(i => (i <= atividade.nota ? '★' : '☆')).join('');
+        texto.append(autor, ` ${verbos[atividade.evento] || 'avaliou'} `, link, ' com ', estrelas);
+
+        const tempo = document.createElement('span');
+        tempo.className = 'activity-time';
+        tempo.textContent = tempoDecorrido(atividade.data);
+
+        conteudo.append(texto, tempo);
+        item.append(avatar, conteudo);
+        return item;
+    }
+
+    botao.addEventListener('click', async function() {
+        botao.disabled = true;
+        try {
+            const url = `${botao.dataset.url}?cursor=${encodeURIComponent(botao.dataset.cursor)}`;
+            const response = await fetch(url);
+            const data = await response.json();
+            if (!data.success) throw new Error(data.error);
+
+            data.atividades.forEach(atividade => lista.appendChild(criarItem(atividade)));
+
+            if (data.proximo_cursor) {
+                botao.dataset.cursor = data.proximo_cursor;
+                botao.disabled = false;
+            } else {
+                botao.remove();
+            }
+        } catch (error) {
+            console.error('Erro ao carregar mais atividades:', error);
+            botao.disabled = false;
+        }
+    });
+});
@@ -11,10 +11,22 @@ class CommunityChat {
     this.messagesContainer = null;
     this.inputElement = null;
     this.sendButton = null;
+    // null until the history is loaded; 0 means the chat is empty
     this.lastMessageId = null;
     this.lastMessageUser = null;
-    this.pollInterval = null;
+    this.oldestMessageId = null;
+    this.hasMoreHistory = false;
+    this.loadingHistory = false;
+    this.polling = false;
     this.pollDelay = options.pollDelay || 3000;
+    this.longPollWait = options.longPollWait || 25;
+    this.socket = null;
+    this.eventSource = null;
+    // While a stream is open, a slow poll picks up messages sent through
+    // other server processes (the realtime pub/sub is per process)
+    this.catchUpInterval = options.catchUpInterval || 30000;
+    this.catchUpTimer = null;
+    this.removed = false;
 
     // Attachment state
     this.attachedMedia = null;
@@ -25,7 +37,7 @@ class CommunityChat {
   /**
    * Initialize chat
    */
-  init() {
+  async init() {
     this.messagesContainer = document.getElementById('chat-messages');
     this.inputElement = document.getElementById('chat-input');
     this.sendButton = document.getElementById('chat-send');
@@ -47,8 +59,10 @@ class CommunityChat {
     this.setupEventListeners();
     this.setupAttachmentListeners();
     this.setupAdminListeners();
-    this.loadMessages();
-    this.startPolling();
+    // The realtime catch-up polls after the last loaded message, so the
+    // history has to be on screen before the channel opens
+    await this.loadMessages();
+    this.connectRealtime();
     this.scrollToBottom();
   }
 
@@ -70,6 +84,13 @@ class CommunityChat {
       }
     });
 
+    // Load older messages when scrolling near the top
+    this.messagesContainer.addEventListener('scroll', () => {
+      if (this.messagesContainer.scrollTop < 80) {
+        this.loadOlderMessages();
+      }
+    });
+
     // Auto-resize textarea
     this.inputElement.addEventListener('input', () => {
       this.autoResizeTextarea();
@@ -169,8 +190,12 @@ class CommunityChat {
 
       if (data.success) {
         this.renderMessages(data.mensagens);
+        this.hasMoreHistory = data.tem_mais;
         if (data.mensagens.length > 0) {
+          this.oldestMessageId = data.mensagens[0].id;
           this.lastMessageId = data.mensagens[data.mensagens.length - 1].id;
+        } else {
+          this.lastMessageId = 0;
         }
       }
     } catch (error) {
@@ -180,33 +205,210 @@ class CommunityChat {
   }
 
   /**
-   * Start polling for new messages
+   * Load the page of messages before the oldest one on screen
+   */
+  async loadOlderMessages() {
+    if (this.loadingHistory || !this.hasMoreHistory || !this.oldestMessageId) return;
+    this.loadingHistory = true;
+
+    try {
+      const response = await fetch(`/comunidade/${this.communityId}/mensagens/?antes=${this.oldestMessageId}`);
+      const data = await response.json();
+
+      if (data.success && data.mensagens.length > 0) {
+        // Keep the current messages in place while content is added above
+        const previousHeight = this.messagesContainer.scrollHeight;
+        const fragment = document.createDocumentFragment();
+
+        data.mensagens.forEach((msg, index) => {
+          const isFirstInGroup = index === 0 || data.mensagens[index - 1].usuario.username !== msg.usuario.username;
+          fragment.appendChild(this.createMessageElement(msg, isFirstInGroup));
+        });
+
+        this.messagesContainer.insertBefore(fragment, this.messagesContainer.firstChild);
+        this.messagesContainer.scrollTop += this.messagesContainer.scrollHeight - previousHeight;
+        this.oldestMessageId = data.mensagens[0].id;
+      }
+
+      this.hasMoreHistory = Boolean(data.success && data.tem_mais);
+    } catch (error) {
+      console.error('Error loading older messages:', error);
+    } finally {
+      this.loadingHistory = false;
+    }
+  }
+
+  /**
+   * Connect to the realtime channel: WebSocket first, then Server-Sent
+   * Events, and interval polling only as a last resort
+   */
+  connectRealtime() {
+    if ('WebSocket' in window) {
+      this.connectWebSocket();
+    } else {
+      this.connectEventSource();
+    }
+  }
+
+  /**
+   * Open the WebSocket channel (served by the ASGI app)
    */
-  startPolling() {
-    this.pollInterval = setInterval(() => {
+  connectWebSocket() {
+    const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    const socket = new WebSocket(`${protocol}://${window.location.host}/ws/comunidade/${this.communityId}/`);
+    let opened = false;
+
+    socket.addEventListener('open', () => {
+      opened = true;
+      this.stopPolling();
+      // Catch up on anything sent while connecting
+      this.pollNewMessages();
+      this.startCatchUp();
+    });
+
+    socket.addEventListener('message', (event) => {
+      this.handleRealtimeEvent(JSON.parse(event.data));
+    });
+
+    socket.addEventListener('close', () => {
+      if (this.socket !== socket) return;
+      this.socket = null;
+      this.stopCatchUp();
+      if (this.removed) return;
+
+      if (opened) {
+        // Connection dropped: reconnect after a short delay
+        setTimeout(() => this.connectWebSocket(), this.pollDelay);
+      } else {
+        // Server without WebSocket support: fall back to SSE
+        this.connectEventSource();
+      }
+    });
+
+    this.socket = socket;
+  }
+
+  /**
+   * Open the Server-Sent Events channel (fallback for WebSocket)
+   */
+  connectEventSource() {
+    if (!('EventSource' in window)) {
+      this.startPolling();
+      return;
+    }
+
+    const source = new EventSource(`/comunidade/${this.communityId}/eventos/`);
+    let opened = false;
+
+    source.addEventListener('open', () => {
+      opened = true;
+      this.stopPolling();
+      // Also runs on every automatic reconnect
       this.pollNewMessages();
-    }, this.pollDelay);
+      this.startCatchUp();
+    });
+
+    source.addEventListener('message', (event) => {
+      this.handleRealtimeEvent(JSON.parse(event.data));
+    });
+
+    source.addEventListener('error', () => {
+      // After a successful open the browser reconnects on its own
+      if (!opened) {
+        source.close();
+        this.eventSource = null;
+        this.startPolling();
+      }
+    });
+
+    this.eventSource = source;
+  }
+
+  /**
+   * Handle an event pushed by the server
+   */
+  handleRealtimeEvent(event) {
+    if (event.tipo === 'removido') {
+      // Left or was removed from the community: stop every channel
+      this.removed = true;
+      this.destroy();
+      this.showError('Você não é mais membro desta comunidade');
+      return;
+    }
+
+    if (event.tipo === 'chat_limpo') {
+      this.messagesContainer.innerHTML = '';
+      this.showEmptyState();
+      this.lastMessageId = 0;
+      this.oldestMessageId = null;
+      this.hasMoreHistory = false;
+      return;
+    }
+
+    if (event.tipo !== 'mensagem') return;
+
+    const msg = event.mensagem;
+    // Already rendered (own message or caught up by a poll)
+    if (this.lastMessageId && msg.id <= this.lastMessageId) return;
+
+    const wasAtBottom = this.isScrolledToBottom();
+    this.appendMessage(msg);
+    this.lastMessageId = msg.id;
+
+    if (wasAtBottom) {
+      this.scrollToBottom();
+    }
+  }
+
+  /**
+   * Start long-polling for new messages (the server holds each request
+   * until a message arrives or the wait expires)
+   */
+  async startPolling() {
+    if (this.polling || this.removed) return;
+    this.polling = true;
+
+    while (this.polling) {
+      const ok = await this.pollNewMessages(this.longPollWait);
+      if (!ok && this.polling) {
+        // Back off on errors instead of hammering the server
+        await new Promise(resolve => setTimeout(resolve, this.pollDelay));
+      }
+    }
   }
 
   /**
    * Stop polling
    */
   stopPolling() {
-    if (this.pollInterval) {
-      clearInterval(this.pollInterval);
-      this.pollInterval = null;
+    this.polling = false;
+  }
+
+  /**
+   * Slow reconciliation poll while the WebSocket/SSE stream is open
+   */
+  startCatchUp() {
+    this.stopCatchUp();
+    this.catchUpTimer = setInterval(() => this.pollNewMessages(), this.catchUpInterval);
+  }
+
+  stopCatchUp() {
+    if (this.catchUpTimer) {
+      clearInterval(this.catchUpTimer);
+      this.catchUpTimer = null;
     }
   }
 
   /**
-   * Poll for new messages
+   * Poll for new messages; `wait` > 0 turns the request into a long-poll.
+   * Returns false when the request failed or the history is not loaded yet.
    */
-  async pollNewMessages() {
-    if (!this.lastMessageId) return;
+  async pollNewMessages(wait = 0) {
+    if (this.lastMessageId === null) return false;
 
     try {
       const response = await fetch(
-        `/comunidade/${this.communityId}/mensagens/novas/?after=${this.lastMessageId}`
+        `/comunidade/${this.communityId}/mensagens/novas/?after=${this.lastMessageId}&espera=${wait}`
       );
       const data = await response.json();
 
@@ -214,17 +416,20 @@ class CommunityChat {
         const wasAtBottom = this.isScrolledToBottom();
 
         data.mensagens.forEach(msg => {
+          // Skip messages already delivered by the realtime channel
+          if (this.lastMessageId && msg.id <= this.lastMessageId) return;
           this.appendMessage(msg);
+          this.lastMessageId = msg.id;
         });
 
-        this.lastMessageId = data.mensagens[data.mensagens.length - 1].id;
-
         if (wasAtBottom) {
           this.scrollToBottom();
         }
       }
+      return Boolean(data.success);
     } catch (error) {
       console.error('Error polling messages:', error);
+      return false;
     }
   }
 
@@ -271,9 +476,11 @@ class CommunityChat {
         this.autoResizeTextarea();
         this.attachedMedia = null;
 
-        // Add message to UI
-        this.appendMessage(data.mensagem);
-        this.lastMessageId = data.mensagem.id;
+        // Add message to UI (unless the realtime channel already did)
+        if (!this.lastMessageId || data.mensagem.id > this.lastMessageId) {
+          this.appendMessage(data.mensagem);
+          this.lastMessageId = data.mensagem.id;
+        }
 
         // Scroll to bottom
         this.scrollToBottom();
@@ -619,7 +826,9 @@ class CommunityChat {
       if (data.success) {
         this.messagesContainer.innerHTML = '';
         this.showEmptyState();
-        this.lastMessageId = null;
+        this.lastMessageId = 0;
+        this.oldestMessageId = null;
+        this.hasMoreHistory = false;
       } else {
         alert(data.error || 'Erro ao limpar chat');
       }
@@ -634,6 +843,18 @@ class CommunityChat {
    */
   destroy() {
     this.stopPolling();
+    this.stopCatchUp();
+
+    if (this.socket) {
+      const socket = this.socket;
+      this.socket = null;
+      socket.close();
+    }
+
+    if (this.eventSource) {
+      this.eventSource.close();
+      this.eventSource = null;
+    }
   }
 }
 
@@ -0,0 +1,41 @@
+// Rolagem infinita da página de reviews (paginação por cursor)
+(function () {
+  const sentinela = document.getElementById('reviews-sentinela');
+  const grid = document.querySelector('.reviews-grid');
+  if (!sentinela || !grid) return;
+
+  let carregando = false;
+
+  async function carregarMais() {
+    const cursor = sentinela.dataset.cursor;
+    if (carregando || !cursor) return;
+    carregando = true;
+
+    try {
+      const resposta = await fetch(`${sentinela.dataset.url}?cursor=${encodeURIComponent(cursor)}`, {
+        headers: { 'X-Requested-With': 'XMLHttpRequest' }
+      });
+      const data = await resposta.json();
+      if (!data.success) throw new Error(data.error || 'Erro ao carregar reviews');
+
+      grid.insertAdjacentHTML('beforeend', data.html);
+
+      if (data.proximo_cursor) {
+        sentinela.dataset.cursor = data.proximo_cursor;
+      } else {
+        observer.disconnect();
+        sentinela.remove();
+      }
+    } catch (erro) {
+      console.error('Erro ao carregar mais reviews:', erro);
+    } finally {
+      carregando = false;
+    }
+  }
+
+  const observer = new IntersectionObserver((entries) => {
+    if (entries.some((entry) => entry.isIntersecting)) carregarMais();
+  }, { rootMargin: '400px' });
+
+  observer.observe(sentinela);
+})();
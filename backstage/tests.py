@@ -1,4 +1,5 @@
-from django.test import TestCase
+import json
+from django.test import TestCase, TransactionTestCase
 from django.conf import settings
 from django.contrib.auth.models import User
 from .models import Filme, Critica, Lista, Serie, CriticaSerie
@@ -78,3 +79,1063 @@ class ListaModelTests(TestCase):
         )
         self.assertEqual(lista.nome, 'Meus Favoritos')
         self.assertTrue(lista.publica)
+
+
+class HttpClientTests(TestCase):
+    """Testes da sessão HTTP compartilhada"""
+
+    def test_sessao_compartilhada(self):
+        """Testa se todas as chamadas reaproveitam a mesma sessão com pool"""
+        from .services import http_client
+        sessao = http_client.obter_sessao()
+        self.assertIs(sessao, http_client.obter_sessao())
+        self.assertIn('gzip', sessao.headers['Accept-Encoding'])
+        adapter = sessao.get_adapter(settings.TMDB_BASE_URL)
+        self.assertEqual(adapter._pool_maxsize, settings.HTTP_POOL_MAXSIZE)
+
+
+class PayloadAgregadoTests(TestCase):
+    """Testes da montagem do payload de filmes"""
+
+    def _fake_get(self, endpoint, params=None, **kwargs):
+        self.chamadas.append(endpoint)
+        if endpoint.endswith('/credits'):
+            return {'cast': [{'name': 'Ator', 'order': 0}], 'crew': []}
+        if endpoint.endswith('/watch/providers'):
+            return {'results': {'BR': {'flatrate': [{'provider_name': 'Netflix'}]}}}
+        detalhes = {'title': 'Inception', 'runtime': 148}
+        if params and params.get('append_to_response'):
+            detalhes['credits'] = {'cast': [{'name': 'Ator', 'order': 0}], 'crew': []}
+            detalhes['watch/providers'] = {'results': {'BR': {'flatrate': [{'provider_name': 'Netflix'}]}}}
+        return detalhes
+
+    def test_modos_append_e_paralelo(self):
+        """Testa se os dois modos geram o mesmo payload e o append faz uma só requisição"""
+        from unittest import mock
+        from .services import tmdb
+        payloads = {}
+        for modo in ('append', 'paralelo'):
+            self.chamadas = []
+            with mock.patch.object(tmdb, '_get', side_effect=self._fake_get):
+                payloads[modo] = tmdb.montar_payload_agregado(27205, region='BR', modo=modo)
+            self.assertEqual(len(self.chamadas), 1 if modo == 'append' else 3)
+        self.assertEqual(payloads['append'], payloads['paralelo'])
+        self.assertEqual(payloads['append']['plataformas'][0]['nome'], 'Netflix')
+
+
+class TrilhosHomeTests(TestCase):
+    """Testes dos trilhos da página inicial"""
+
+    def test_trending_reaproveita_filme_cache(self):
+        """Testa se o trending usa o FilmeCache e busca só os detalhes que faltam"""
+        from unittest import mock
+        from .models import FilmeCache
+        from .services import tmdb
+        FilmeCache.objects.create(id_tmdb=1, payload={'duracao_min': 90, 'generos': ['Drama']})
+        trending = {'results': [{'id': 1, 'title': 'A'}, {'id': 2, 'title': 'B', 'genre_ids': [35]}]}
+        with mock.patch.object(tmdb, '_get', return_value=trending), \
+                mock.patch.object(tmdb, 'buscar_detalhes_filme', side_effect=Exception('offline')) as detalhes:
+            filmes = tmdb.obter_trending(usar_cache=False)
+        detalhes.assert_called_once_with(2)
+        self.assertEqual(filmes[0]['duracao'], '1h 30min')
+        self.assertEqual(filmes[0]['generos'], ['Drama'])
+        self.assertEqual(filmes[1]['generos'], ['Comédia'])
+
+
+class CacheEmCamadasTests(TestCase):
+    """Testes do cache em camadas na frente do FilmeCache"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .services.cache import cache_filmes
+        cache.clear()
+        cache_filmes.local.clear()
+
+    def test_lru_respeita_limite(self):
+        """Testa se o LRU descarta o item menos usado"""
+        from .services.cache import CacheLRU
+        lru = CacheLRU(max_itens=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), 1)
+
+    def test_filme_quente_nao_consulta_banco(self):
+        """Testa se um payload já lido é servido sem consultar o banco"""
+        from .models import FilmeCache
+        from .services.tmdb import obter_detalhes_com_cache
+        FilmeCache.objects.create(id_tmdb=27205, payload={'titulo': 'Inception'})
+        self.assertEqual(obter_detalhes_com_cache(27205)['titulo'], 'Inception')
+        with self.assertNumQueries(0):
+            self.assertEqual(obter_detalhes_com_cache(27205)['titulo'], 'Inception')
+
+    def test_camada_local_herda_validade_do_backend(self):
+        """Testa que o valor lido do backend fica na camada local só pelo tempo que resta nele"""
+        import time
+        from .services.cache import CacheEmCamadas
+        camadas = CacheEmCamadas('teste', ttl_local=300)
+        camadas.set('404', True, ttl=10)
+        camadas.local.clear()  # outro worker: só o backend tem o valor
+        self.assertTrue(camadas.get('404'))
+        _, expira_em = camadas.local._itens['teste:404']
+        self.assertLessEqual(expira_em - time.monotonic(), 10)
+
+
+class StampedeTests(TestCase):
+    """Testes de single-flight e stale-while-revalidate"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .services.cache import cache_filmes
+        cache.clear()
+        cache_filmes.local.clear()
+
+    def test_single_flight_executa_uma_vez(self):
+        """Testa se chamadas simultâneas para a mesma chave executam a função uma só vez"""
+        import threading
+        import time
+        from .services.cache import executar_uma_vez
+        chamadas = []
+
+        def lenta():
+            chamadas.append(1)
+            time.sleep(0.2)
+            return 'ok'
+
+        resultados = []
+        threads = [
+            threading.Thread(target=lambda: resultados.append(executar_uma_vez('teste', lenta)))
+            for _ in range(5)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(chamadas), 1)
+        self.assertEqual(resultados, ['ok'] * 5)
+
+    def test_cache_expirado_serve_valor_antigo(self):
+        """Testa se um FilmeCache expirado é servido enquanto é atualizado"""
+        from datetime import timedelta
+        from unittest import mock
+        from django.utils import timezone
+        from .models import FilmeCache
+        from .services import tmdb
+        FilmeCache.objects.create(id_tmdb=27205, payload={'titulo': 'Antigo'})
+        FilmeCache.objects.filter(id_tmdb=27205).update(atualizado_em=timezone.now() - timedelta(days=2))
+        with self.settings(CACHE_REVALIDAR_EM_SEGUNDO_PLANO=False), \
+                mock.patch.object(tmdb, 'montar_payload_agregado', return_value={'titulo': 'Novo'}):
+            self.assertEqual(tmdb.obter_detalhes_com_cache(27205)['titulo'], 'Antigo')
+        self.assertEqual(FilmeCache.objects.get(id_tmdb=27205).payload['titulo'], 'Novo')
+        self.assertEqual(tmdb.obter_detalhes_com_cache(27205)['titulo'], 'Novo')
+
+
+class TrilhoCacheTests(TestCase):
+    """Testes do cache de trilhos da home"""
+
+    def test_variantes_nao_se_sobrescrevem(self):
+        """Testa se limites diferentes do mesmo trilho têm linhas de cache próprias"""
+        from unittest import mock
+        from .models import TrilhoCache
+        from .services import tmdb
+        em_cartaz = {'results': [{'id': i, 'title': f'Filme {i}'} for i in range(1, 21)]}
+        with mock.patch.object(tmdb, '_get', return_value=em_cartaz) as get:
+            self.assertEqual(len(tmdb.obter_em_cartaz(limit=5)), 5)
+            self.assertEqual(len(tmdb.obter_em_cartaz(limit=12)), 12)
+            self.assertEqual(len(tmdb.obter_em_cartaz(limit=5)), 5)
+            self.assertEqual(len(tmdb.obter_em_cartaz(limit=12)), 12)
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(TrilhoCache.objects.filter(trilho='now_playing').count(), 2)
+
+
+class AquecimentoTests(TestCase):
+    """Testes do aquecimento do cache"""
+
+    def test_aquece_trilhos_ausentes_e_filmes_vencendo(self):
+        """Testa se o aquecimento cria os trilhos da home e atualiza os filmes mais acessados"""
+        from datetime import timedelta
+        from unittest import mock
+        from django.utils import timezone
+        from .models import FilmeCache
+        from .services import aquecimento
+        FilmeCache.objects.create(id_tmdb=1, payload={}, acessos=10)
+        FilmeCache.objects.create(id_tmdb=2, payload={}, acessos=5)
+        FilmeCache.objects.create(id_tmdb=3, payload={}, acessos=0)
+        FilmeCache.objects.filter(id_tmdb__in=[1, 3]).update(atualizado_em=timezone.now() - timedelta(days=1))
+        with mock.patch.object(aquecimento.tmdb, 'atualizar_trilho') as trilho, \
+                mock.patch.object(aquecimento.tmdb, '_atualizar_filme_cache') as filme:
+            aquecimento.aquecer_tudo()
+        self.assertEqual(trilho.call_count, len(aquecimento.TRILHOS_HOME))
+        filme.assert_called_once_with(1, aquecimento.tmdb.TTL_FILME_MINUTOS)
+
+
+class AgendadorProcessoTests(TestCase):
+    """Testes de em quais processos o agendador de aquecimento sobe"""
+
+    def test_so_no_servidor(self):
+        """Testa que comandos e o pai do autoreloader não iniciam o agendador"""
+        import os
+        from unittest import mock
+        from .apps import _processo_servidor
+        casos = [
+            (['manage.py', 'migrate'], {}, False),
+            (['manage.py', 'test'], {}, False),
+            (['manage.py', 'runserver'], {}, False),
+            (['manage.py', 'runserver'], {'RUN_MAIN': 'true'}, True),
+            (['manage.py', 'runserver', '--noreload'], {}, True),
+            (['/usr/bin/gunicorn', 'setup.wsgi'], {}, True),
+        ]
+        for argv, ambiente, esperado in casos:
+            with mock.patch('sys.argv', argv), mock.patch.dict(os.environ, ambiente):
+                if 'RUN_MAIN' not in ambiente:
+                    os.environ.pop('RUN_MAIN', None)
+                self.assertEqual(_processo_servidor(), esperado, argv)
+
+
+class DisjuntorTests(TestCase):
+    """Testes do circuit breaker e do cache negativo"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .services.cache import cache_filmes, cache_negativo
+        cache.clear()
+        cache_filmes.local.clear()
+        cache_negativo.local.clear()
+
+    def test_circuito_abre_e_fecha(self):
+        """Testa se o disjuntor abre após falhas seguidas e libera uma chamada de teste"""
+        import time
+        from .services.http_client import Disjuntor
+        disjuntor = Disjuntor('teste', limite_falhas=2, tempo_aberto=0.05)
+        disjuntor.registrar_falha()
+        self.assertTrue(disjuntor.permitir())
+        disjuntor.registrar_falha()
+        self.assertFalse(disjuntor.permitir())
+        time.sleep(0.06)
+        self.assertTrue(disjuntor.permitir())
+        self.assertFalse(disjuntor.permitir())
+        disjuntor.registrar_sucesso()
+        self.assertTrue(disjuntor.permitir())
+
+    def test_filme_inexistente_fica_em_cache_negativo(self):
+        """Testa se um 404 da TMDb não é consultado de novo logo em seguida"""
+        from unittest import mock
+        from .services import tmdb
+        with mock.patch.object(tmdb, 'montar_payload_agregado',
+                               side_effect=tmdb.RecursoNaoEncontrado('404')) as montar:
+            self.assertIsNone(tmdb.obter_detalhes_com_cache(999))
+            self.assertIsNone(tmdb.obter_detalhes_com_cache(999))
+        montar.assert_called_once()
+
+    def test_detalhes_filme_404_so_quando_inexistente(self):
+        """Testa se o circuito aberto devolve 503 e só o 404 da TMDb vira 404"""
+        from unittest import mock
+        from .services import tmdb
+        with mock.patch.object(tmdb, 'montar_payload_agregado', side_effect=tmdb.CircuitoAberto('TMDb')):
+            self.assertEqual(self.client.get('/filmes/998/').status_code, 503)
+        with mock.patch.object(tmdb, 'montar_payload_agregado', side_effect=tmdb.RecursoNaoEncontrado('404')):
+            self.assertEqual(self.client.get('/filmes/999/').status_code, 404)
+
+
+class RatingsOmdbTests(TestCase):
+    """Testes dos ratings do OMDB guardados no payload do filme"""
+
+    def test_reaproveita_ratings_validos(self):
+        """Testa se ratings ainda válidos não geram nova chamada ao OMDB"""
+        from datetime import datetime, timedelta, timezone
+        from unittest import mock
+        from .services import tmdb
+        recente = datetime.now(timezone.utc).isoformat()
+        antigo = (datetime.now(timezone.utc) - timedelta(days=30)).isoformat()
+        with mock.patch.object(tmdb, 'obter_ratings_omdb', return_value={'metacritic': 90}) as omdb:
+            payload = tmdb._incluir_ratings_omdb(
+                {'imdb_id': 'tt1375666'},
+                {'imdb_id': 'tt1375666', 'ratings_omdb': {'metacritic': 74}, 'ratings_omdb_em': recente}
+            )
+            self.assertEqual(payload['ratings_omdb'], {'metacritic': 74})
+            omdb.assert_not_called()
+
+            payload = tmdb._incluir_ratings_omdb(
+                {'imdb_id': 'tt1375666'},
+                {'imdb_id': 'tt1375666', 'ratings_omdb': {'metacritic': 74}, 'ratings_omdb_em': antigo}
+            )
+            self.assertEqual(payload['ratings_omdb'], {'metacritic': 90})
+            omdb.assert_called_once_with('tt1375666')
+
+    def test_pagina_completa_ratings_pendentes(self):
+        """Testa se o payload gravado sem OMDB (enriquecimento) ganha os ratings na página do filme"""
+        from unittest import mock
+        from django.core.cache import cache
+        from .models import FilmeCache
+        from .services import tmdb
+        cache.clear()
+        tmdb.cache_filmes.local.clear()
+        FilmeCache.objects.create(id_tmdb=27205, payload={'imdb_id': 'tt1375666', 'omdb_pendente': True})
+        with self.settings(CACHE_REVALIDAR_EM_SEGUNDO_PLANO=False), \
+                mock.patch.object(tmdb, 'obter_ratings_omdb', return_value={'metacritic': 74}) as omdb:
+            tmdb.obter_detalhes_com_cache(27205)
+            self.assertEqual(tmdb.obter_detalhes_com_cache(27205)['ratings_omdb'], {'metacritic': 74})
+        omdb.assert_called_once_with('tt1375666')
+        self.assertNotIn('omdb_pendente', FilmeCache.objects.get(id_tmdb=27205).payload)
+
+
+class SerieCacheTests(TestCase):
+    """Testes do cache de detalhes de séries"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .services.cache import cache_series, cache_negativo
+        cache.clear()
+        cache_series.local.clear()
+        cache_negativo.local.clear()
+
+    def test_serie_buscada_uma_vez_sem_images(self):
+        """Testa se a série é gravada no SerieCache e o append_to_response não pede 'images'"""
+        from unittest import mock
+        from .models import SerieCache
+        from .services import tmdb
+        with mock.patch.object(tmdb, '_get', return_value={'id': 1399, 'name': 'Game of Thrones'}) as get:
+            self.assertEqual(tmdb.obter_detalhes_serie_com_cache(1399)['titulo'], 'Game of Thrones')
+            self.assertEqual(tmdb.obter_detalhes_serie_com_cache(1399)['titulo'], 'Game of Thrones')
+        self.assertEqual(get.call_count, 1)
+        self.assertNotIn('images', get.call_args[0][1]['append_to_response'])
+        self.assertTrue(SerieCache.objects.filter(id_tmdb=1399).exists())
+
+    def test_serie_inexistente_usa_cache_negativo(self):
+        """Testa se um 404 da TMDb não é consultado de novo logo em seguida"""
+        from unittest import mock
+        from .services import tmdb
+        from .services.http_client import RecursoNaoEncontrado
+        with mock.patch.object(tmdb, '_get', side_effect=RecursoNaoEncontrado('404')) as get:
+            self.assertIsNone(tmdb.obter_detalhes_serie_com_cache(999999))
+            self.assertIsNone(tmdb.obter_detalhes_serie_com_cache(999999))
+        self.assertEqual(get.call_count, 1)
+
+
+class TemporadaCacheTests(TestCase):
+    """Testes do cache de temporadas de séries"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .services.cache import cache_series, cache_temporadas, cache_negativo
+        cache.clear()
+        cache_series.local.clear()
+        cache_temporadas.local.clear()
+        cache_negativo.local.clear()
+
+    def test_ttl_conforme_status_da_serie(self):
+        """Testa se série finalizada tem validade longa e a temporada atual de série em exibição, curta"""
+        from .services import tmdb
+        finalizada = {'status': 'Finalizada', 'numero_temporadas': 8}
+        em_exibicao = {'status': 'Em exibição', 'numero_temporadas': 3}
+        self.assertEqual(tmdb._ttl_temporada(1, 8, finalizada), tmdb.TTL_TEMPORADAS['finalizada'])
+        self.assertEqual(tmdb._ttl_temporada(2, 3, em_exibicao), tmdb.TTL_TEMPORADAS['atual'])
+        self.assertEqual(tmdb._ttl_temporada(2, 1, em_exibicao), tmdb.TTL_TEMPORADAS['anterior'])
+
+    def test_precarregar_e_ler_do_cache(self):
+        """Testa se o pré-carregamento busca as temporadas em lote e a troca de aba não chama a TMDb"""
+        from unittest import mock
+        from .services import tmdb
+        serie = {'status': 'Finalizada', 'numero_temporadas': 2,
+                 'temporadas': [{'season_number': 1}, {'season_number': 2}]}
+        resposta = {
+            'season/1': {'season_number': 1, 'episodes': [{'episode_number': 1}]},
+            'season/2': {'season_number': 2, 'episodes': []},
+        }
+        with mock.patch.object(tmdb, '_get', return_value=resposta) as get:
+            self.assertEqual(tmdb.precarregar_temporadas(1399, serie), 2)
+            self.assertEqual(get.call_count, 1)
+            temporada = tmdb.obter_temporada_com_cache(1399, 1)
+            self.assertEqual(get.call_count, 1)
+        self.assertEqual(temporada['episodios'][0]['numero'], 1)
+
+
+class EnriquecimentoTests(TransactionTestCase):
+    """Testes do enriquecimento em lote de posters e datas (as buscas rodam em threads)"""
+
+    def test_usa_cache_e_busca_so_o_que_falta(self):
+        """Testa se o FilmeCache é usado primeiro e o resultado é gravado no Filme"""
+        from unittest import mock
+        from .models import Filme, FilmeCache
+        from .services import enriquecimento, tmdb
+        com_cache = Filme.objects.create(titulo='Inception', tmdb_id=27205)
+        sem_cache = Filme.objects.create(titulo='Matrix', tmdb_id=603)
+        completo = Filme.objects.create(
+            titulo='Alien', tmdb_id=348, poster='https://exemplo.com/p.jpg', data_lancamento='1979-05-25'
+        )
+        FilmeCache.objects.create(id_tmdb=27205, payload={'poster_path': '/a.jpg', 'data_lancamento': '2010-07-16'})
+        payload = {'poster_path': '/b.jpg', 'data_lancamento': '1999-03-31'}
+        with mock.patch.object(tmdb, 'montar_payload_agregado', return_value=payload) as montar, \
+                mock.patch.object(tmdb, 'obter_ratings_omdb') as omdb:
+            self.assertEqual(enriquecimento.enriquecer_filmes([com_cache, sem_cache, completo]), 2)
+        montar.assert_called_once_with(603, region=None)
+        omdb.assert_not_called()
+        self.assertTrue(FilmeCache.objects.get(id_tmdb=603).payload['omdb_pendente'])
+        # A busca passa pelo cache: a próxima página não vai à TMDb de novo
+        self.assertTrue(FilmeCache.objects.filter(id_tmdb=603).exists())
+        self.assertEqual(Filme.objects.get(tmdb_id=27205).poster, 'https://image.tmdb.org/t/p/w300/a.jpg')
+        self.assertEqual(str(Filme.objects.get(tmdb_id=603).data_lancamento), '1999-03-31')
+
+
+class LinhaDoTempoReviewsTests(TestCase):
+    """Testes da paginação keyset da linha do tempo de reviews"""
+
+    def test_paginas_mescladas_sem_repeticao(self):
+        """Testa se filmes e séries são mesclados por data e as páginas não se repetem"""
+        from datetime import timedelta
+        from django.contrib.auth.models import User
+        from django.utils import timezone
+        from .services.linha_do_tempo import pagina_de_reviews
+        usuario = User.objects.create_user(username='critico', password='senha12345')
+        filme = Filme.objects.create(titulo='Inception', poster='https://exemplo.com/p.jpg', data_lancamento='2010-07-16')
+        serie = Serie.objects.create(tmdb_id=1399, titulo='GoT', poster='https://exemplo.com/s.jpg',
+                                     data_primeira_exibicao='2011-04-17')
+        agora = timezone.now()
+        for i in range(5):
+            Critica.objects.filter(pk=Critica.objects.create(filme=filme, usuario=usuario, texto='f').pk) \
+                .update(criado_em=agora - timedelta(hours=2 * i))
+            CriticaSerie.objects.filter(pk=CriticaSerie.objects.create(serie=serie, usuario=usuario, texto='s').pk) \
+                .update(criado_em=agora - timedelta(hours=2 * i + 1))
+
+        vistas = []
+        reviews, cursor = pagina_de_reviews(usuario, limite=4)
+        vistas += reviews
+        while cursor:
+            reviews, cursor = pagina_de_reviews(usuario, cursor=cursor, limite=4)
+            vistas += reviews
+
+        self.assertEqual(len(vistas), 10)
+        self.assertEqual([c.tipo for c in vistas[:3]], ['filme', 'serie', 'filme'])
+        datas = [c.criado_em for c in vistas]
+        self.assertEqual(datas, sorted(datas, reverse=True))
+
+    def test_api_reviews_cursor_invalido(self):
+        """Testa se a API de rolagem infinita recusa cursor inválido e renderiza a primeira página"""
+        from django.contrib.auth.models import User
+        from django.urls import reverse
+        from .models import Critica
+        usuario = User.objects.create_user(username='critico', password='senha12345')
+        filme = Filme.objects.create(titulo='Inception', poster='https://exemplo.com/p.jpg', data_lancamento='2010-07-16')
+        Critica.objects.create(filme=filme, usuario=usuario, texto='Ótimo')
+        self.client.force_login(usuario)
+        url = reverse('backstage:reviews_api', args=['critico'])
+        self.assertEqual(self.client.get(url, {'cursor': 'xx'}).status_code, 400)
+        data = self.client.get(url).json()
+        self.assertEqual(len(data['reviews']), 1)
+        self.assertIn('Inception', data['html'])
+        self.assertIsNone(data['proximo_cursor'])
+        self.assertContains(self.client.get(reverse('backstage:reviews')), 'Inception')
+
+
+class PaginarCriticasTests(TestCase):
+    """Testes da listagem paginada de críticas nas telas de detalhes"""
+
+    def test_like_do_usuario_sem_query_por_critica(self):
+        """Testa se 'usuario_deu_like' vem na mesma consulta da página de críticas"""
+        from django.contrib.auth.models import User
+        from django.test import RequestFactory
+        from .models import LikeCritica
+        from .views import paginar_criticas
+        filme = Filme.objects.create(titulo='Inception', tmdb_id=27205)
+        leitor = User.objects.create_user(username='leitor', password='senha12345')
+        autor = User.objects.create_user(username='autor', password='senha12345')
+        criticas = [Critica.objects.create(filme=filme, usuario=autor, texto=f'Crítica {i}') for i in range(15)]
+        LikeCritica.objects.create(usuario=leitor, critica=criticas[-1])
+
+        request = RequestFactory().get('/', {'pagina_criticas': '1'})
+        request.user = leitor
+        with self.assertNumQueries(2):  # COUNT do paginador + a página
+            pagina = paginar_criticas(request, Critica.objects.filter(filme=filme), LikeCritica)
+            itens = [(c.texto, c.usuario_deu_like, c.total_likes) for c in pagina]
+        self.assertEqual(len(itens), 10)
+        self.assertEqual(itens[0], ('Crítica 14', True, 1))
+        self.assertFalse(any(deu_like for _, deu_like, _ in itens[1:]))
+
+
+class AvaliacaoAgregadaTests(TestCase):
+    """Testes da média do Backstage mantida incrementalmente"""
+
+    def setUp(self):
+        self.filme = Filme.objects.create(titulo='Inception', tmdb_id=27205)
+        self.ana = User.objects.create_user(username='ana', password='senha12345')
+        self.bia = User.objects.create_user(username='bia', password='senha12345')
+
+    def test_precedencia_diario_favorito_critica(self):
+        """Testa se cada usuário conta uma vez, com diário > favorito > crítica"""
+        from .models import DiarioFilme, FilmeFavorito
+        from .services.avaliacoes import obter_media_backstage
+        Critica.objects.create(filme=self.filme, usuario=self.ana, texto='ok', nota=2)
+        Critica.objects.create(filme=self.filme, usuario=self.bia, texto='bom', nota=4)
+        self.assertEqual(obter_media_backstage('filme', 27205), (3.0, 2))
+
+        favorito = FilmeFavorito.objects.create(usuario=self.ana, tmdb_id=27205, titulo='Inception', nota=3)
+        self.assertEqual(obter_media_backstage('filme', 27205), (3.5, 2))
+        DiarioFilme.objects.create(usuario=self.ana, filme=self.filme, data_assistido='2024-01-01', nota=5)
+        self.assertEqual(obter_media_backstage('filme', 27205), (4.5, 2))
+
+        favorito.delete()
+        DiarioFilme.objects.filter(usuario=self.ana).delete()
+        self.assertEqual(obter_media_backstage('filme', 27205), (3.0, 2))
+        self.bia.delete()
+        self.assertEqual(obter_media_backstage('filme', 27205), (2.0, 1))
+
+    def test_remocao_desfeita_nao_congela_notas(self):
+        """Testa se, depois de um delete de usuário desfeito, as notas dele voltam a ser contadas"""
+        from django.db import transaction
+        from .services.avaliacoes import obter_media_backstage
+        Critica.objects.create(filme=self.filme, usuario=self.bia, texto='bom', nota=4)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.bia.delete()
+            raise RuntimeError('rollback')
+        bia = User.objects.get(username='bia')
+        Critica.objects.create(filme=self.filme, usuario=bia, texto='melhor', nota=2)
+        self.assertEqual(obter_media_backstage('filme', 27205), (2.0, 1))
+
+    def test_reconstruir_igual_ao_incremental(self):
+        """Testa se o comando de reconstrução chega ao mesmo resultado dos sinais"""
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import AvaliacaoAgregada, FilmeFavorito
+        Critica.objects.create(filme=self.filme, usuario=self.ana, texto='ok', nota=2)
+        FilmeFavorito.objects.create(usuario=self.bia, tmdb_id=27205, titulo='Inception', nota=5)
+        antes = AvaliacaoAgregada.objects.get(tmdb_id=27205)
+        call_command('reconstruir_avaliacoes', stdout=StringIO())
+        depois = AvaliacaoAgregada.objects.get(tmdb_id=27205)
+        self.assertEqual((antes.soma, antes.total), (depois.soma, depois.total))
+
+
+class FeedAmigosTests(TestCase):
+    """Testes do feed de atividades com fan-out na escrita"""
+
+    def setUp(self):
+        from .models import Amizade
+        self.ana = User.objects.create_user(username='ana', password='senha12345')
+        self.bia = User.objects.create_user(username='bia', password='senha12345')
+        self.filme = Filme.objects.create(titulo='Inception', tmdb_id=27205)
+        Amizade.objects.create(usuario1=self.ana, usuario2=self.bia)
+
+    def test_evento_vai_para_timeline_do_amigo(self):
+        """Testa se crítica e favorito da amiga aparecem no feed, mais recente primeiro"""
+        from .models import FilmeFavorito
+        from .services.feed import pagina_do_feed
+        Critica.objects.create(filme=self.filme, usuario=self.bia, texto='Ótimo', nota=5)
+        FilmeFavorito.objects.create(usuario=self.bia, tmdb_id=27205, titulo='Inception', nota=5)
+        atividades, cursor = pagina_do_feed(self.ana)
+        self.assertEqual([a['evento'] for a in atividades], ['favorito', 'critica'])
+        self.assertIsNone(cursor)
+        self.assertEqual(pagina_do_feed(self.bia)[0], [])
+
+    def test_amizade_desfeita_e_paginacao(self):
+        """Testa a paginação por cursor e a limpeza da timeline ao desfazer a amizade"""
+        from .models import Amizade
+        from .services.feed import pagina_do_feed
+        for i in range(5):
+            Critica.objects.create(filme=self.filme, usuario=self.bia, texto=f'Crítica {i}', nota=4)
+        primeira, cursor = pagina_do_feed(self.ana, limite=3)
+        segunda, fim = pagina_do_feed(self.ana, cursor=cursor, limite=3)
+        self.assertEqual((len(primeira), len(segunda), fim), (3, 2, None))
+
+        Amizade.objects.all().delete()
+        self.assertEqual(pagina_do_feed(self.ana)[0], [])
+
+    def test_reconstruir_refaz_timelines_sem_arestas(self):
+        """Testa que reconstruir o feed sem arestas (amizades antigas) ainda preenche as timelines"""
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import ArestaAmizade, EntradaFeed
+        from .services.feed import pagina_do_feed
+        Critica.objects.create(filme=self.filme, usuario=self.bia, texto='Ótimo', nota=5)
+        ArestaAmizade.objects.all().delete()
+        EntradaFeed.objects.all().delete()
+        call_command('reconstruir_feed', stdout=StringIO())
+        self.assertEqual(len(pagina_do_feed(self.ana)[0]), 1)
+
+    def test_home_mostra_carregar_mais(self):
+        """Testa que a home oferece a próxima página do feed e que a API a entrega"""
+        for i in range(12):
+            Critica.objects.create(filme=self.filme, usuario=self.bia, texto=f'Crítica {i}', nota=4)
+        self.client.login(username='ana', password='senha12345')
+        resposta = self.client.get('/')
+        cursor = resposta.context['proximo_cursor_feed']
+        self.assertContains(resposta, 'id="activityLoadMore"')
+        dados = self.client.get('/api/feed/', {'cursor': cursor}).json()
+        self.assertEqual((len(dados['atividades']), dados['proximo_cursor']), (2, None))
+
+
+class ArestaAmizadeTests(TestCase):
+    """Testes das arestas simétricas de amizade"""
+
+    def test_arestas_acompanham_amizade(self):
+        """Testa se aceitar cria as duas direções e remover apaga as duas"""
+        from .models import Amizade, ArestaAmizade
+        from .services.amizades import amigos_ids, verificar_amizade
+        ana = User.objects.create_user(username='ana', password='senha12345')
+        bia = User.objects.create_user(username='bia', password='senha12345')
+        amizade = Amizade.objects.create(usuario1=ana, usuario2=bia)
+        self.assertTrue(verificar_amizade(ana, bia))
+        self.assertTrue(verificar_amizade(bia, ana))
+        self.assertEqual(amigos_ids(bia.id), [ana.id])
+
+        amizade.delete()
+        self.assertFalse(verificar_amizade(bia, ana))
+        self.assertFalse(ArestaAmizade.objects.exists())
+
+
+class StatusRelacionamentoTests(TestCase):
+    """Testes do cálculo em lote do status de amizade"""
+
+    def test_status_em_duas_consultas(self):
+        """Testa amigo, solicitação enviada, recebida e sem relação com número fixo de queries"""
+        from .models import Amizade, SolicitacaoAmizade
+        from .services.amizades import status_relacionamentos
+        eu, amigo, enviado, recebido, outro = [
+            User.objects.create_user(username=nome, password='senha12345')
+            for nome in ('eu', 'amigo', 'enviado', 'recebido', 'outro')
+        ]
+        Amizade.objects.create(usuario1=amigo, usuario2=eu)
+        SolicitacaoAmizade.objects.create(remetente=eu, destinatario=enviado)
+        SolicitacaoAmizade.objects.create(remetente=recebido, destinatario=eu)
+        with self.assertNumQueries(2):
+            status = status_relacionamentos(eu, [amigo.id, enviado.id, recebido.id, outro.id])
+        self.assertEqual(status, {
+            amigo.id: 'amigo', enviado.id: 'pendente_enviada',
+            recebido.id: 'pendente_recebida', outro.id: 'adicionar',
+        })
+
+
+class BuscaUsuariosTests(TestCase):
+    """Testes do índice de busca de pessoas (trie de prefixos fora do PostgreSQL)"""
+
+    def setUp(self):
+        from .services import busca_usuarios
+        busca_usuarios._trie.limpar()
+
+    def test_prefixo_sem_acento_e_renomeacao(self):
+        """Testa busca por prefixo de nome/sobrenome e atualização incremental ao renomear"""
+        from .services.busca_usuarios import buscar_usuarios
+        joao = User.objects.create_user(username='jsilva', first_name='João', last_name='Silva', password='x')
+        User.objects.create_user(username='maria', first_name='Maria', last_name='Souza', password='x')
+
+        self.assertEqual(buscar_usuarios('joa'), [joao])
+        self.assertEqual(buscar_usuarios('JOÃO SIL'), [joao])
+        self.assertEqual(buscar_usuarios('so'), [User.objects.get(username='maria')])
+        self.assertEqual(buscar_usuarios('joa', excluir_id=joao.id), [])
+
+        joao.first_name = 'Pedro'
+        joao.save()
+        self.assertEqual(buscar_usuarios('joa'), [])
+        self.assertEqual(buscar_usuarios('ped'), [joao])
+
+    def test_removido_em_outro_processo_nao_ocupa_vaga(self):
+        """Testa que um usuário apagado fora deste processo sai da trie e a busca completa o limite"""
+        from unittest import mock
+        from .services import busca_usuarios
+        ana = User.objects.create_user(username='ana1', password='x')
+        User.objects.create_user(username='ana2', password='x')
+        User.objects.create_user(username='ana3', password='x')
+        busca_usuarios.buscar_usuarios('ana')
+        ana_id = ana.id
+        # Outro processo apaga: o sinal de remoção não chega a esta trie
+        with mock.patch('backstage.signals.remover_usuario_do_indice'):
+            ana.delete()
+        self.assertEqual([u.username for u in busca_usuarios.buscar_usuarios('ana', limite=2)], ['ana2', 'ana3'])
+        self.assertNotIn(ana_id, busca_usuarios._trie.buscar('ana'))
+
+    def test_login_nao_reindexa(self):
+        """Testa que salvar só o last_login não toca no índice"""
+        from .models import IndiceBuscaUsuario
+        usuario = User.objects.create_user(username='ana', password='x')
+        marca = IndiceBuscaUsuario.objects.get(usuario=usuario).atualizado_em
+        usuario.save(update_fields=['last_login'])
+        self.assertEqual(IndiceBuscaUsuario.objects.get(usuario=usuario).atualizado_em, marca)
+
+
+class AmigosContadoresTests(TestCase):
+    """Testes da página de amigos com contadores anotados"""
+
+    def test_contadores_em_uma_consulta(self):
+        """Testa que os contadores de todos os amigos vêm em uma única consulta"""
+        from .models import Amizade, Critica, Filme
+        from .services.amizades import amigos_com_contadores
+        eu = User.objects.create_user(username='eu', password='x')
+        filme = Filme.objects.create(titulo='Filme', tmdb_id=1)
+        for i in range(5):
+            amigo = User.objects.create_user(username=f'amigo{i}', password='x')
+            Amizade.objects.create(usuario1=eu, usuario2=amigo)
+            for _ in range(i):
+                Critica.objects.create(usuario=amigo, filme=filme, nota=4, texto='ok')
+
+        with self.assertNumQueries(1):
+            amigos = list(amigos_com_contadores(eu))
+            contagens = {a.username: (a.criticas_count, a.listas_count, a.diario_count) for a in amigos}
+        # Cada usuário novo ganha a lista "Assistir Mais Tarde"
+        self.assertEqual(contagens, {f'amigo{i}': (i, 1, 0) for i in range(5)})
+
+
+class ChatTempoRealTests(TestCase):
+    """Testes do canal em tempo real do chat (pub/sub em memória + WebSocket ASGI)"""
+
+    def setUp(self):
+        from .models import Comunidade, MembroComunidade
+        self.usuario = User.objects.create_user(username='membro', password='senha12345')
+        self.comunidade = Comunidade.objects.create(nome='Cinéfilos', criador=self.usuario)
+        MembroComunidade.objects.create(comunidade=self.comunidade, usuario=self.usuario, role='admin')
+
+    def _scope(self, comunidade_id):
+        cookie = f"sessionid={self.client.cookies['sessionid'].value}"
+        return {
+            'type': 'websocket',
+            'path': f'/ws/comunidade/{comunidade_id}/',
+            'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+        }
+
+    def test_publicar_sem_conexoes_nao_entrega(self):
+        """Testa que sala sem ninguém conectado não guarda nada"""
+        from .services.chat_tempo_real import publicar_mensagem, conexoes_abertas
+        self.assertEqual(publicar_mensagem(self.comunidade.id, {'id': 1}), 0)
+        self.assertEqual(conexoes_abertas(), 0)
+
+    def test_websocket_recebe_mensagem_publicada(self):
+        """Testa que o WebSocket de um membro recebe o evento e libera a assinatura ao desconectar"""
+        import asyncio
+        from asgiref.sync import async_to_sync
+        from .websocket import aplicacao_websocket
+        from .services.chat_tempo_real import publicar_mensagem, conexoes_abertas
+        self.client.login(username='membro', password='senha12345')
+        scope = self._scope(self.comunidade.id)
+
+        async def cenario():
+            entrada, saida = asyncio.Queue(), asyncio.Queue()
+            await entrada.put({'type': 'websocket.connect'})
+            conexao = asyncio.ensure_future(aplicacao_websocket(scope, entrada.get, saida.put))
+            aceite = await saida.get()
+            publicar_mensagem(self.comunidade.id, {'id': 7, 'conteudo': 'Oi'})
+            enviado = await saida.get()
+            await entrada.put({'type': 'websocket.disconnect'})
+            await conexao
+            return aceite, enviado
+
+        aceite, enviado = async_to_sync(cenario)()
+        self.assertEqual(aceite['type'], 'websocket.accept')
+        self.assertEqual(json.loads(enviado['text']), {'tipo': 'mensagem', 'mensagem': {'id': 7, 'conteudo': 'Oi'}})
+        self.assertEqual(conexoes_abertas(), 0)
+
+    def test_websocket_recusa_quem_nao_e_membro(self):
+        """Testa que o WebSocket fecha com 4403 para quem não é membro"""
+        from asgiref.sync import async_to_sync
+        from .websocket import aplicacao_websocket
+        User.objects.create_user(username='intruso', password='senha12345')
+        self.client.login(username='intruso', password='senha12345')
+        scope = self._scope(self.comunidade.id)
+        enviados = []
+
+        async def receber():
+            return {'type': 'websocket.connect'}
+
+        async def enviar(evento):
+            enviados.append(evento)
+
+        async_to_sync(aplicacao_websocket)(scope, receber, enviar)
+        self.assertEqual(enviados, [{'type': 'websocket.close', 'code': 4403}])
+
+    def test_remover_membro_encerra_websocket(self):
+        """Testa que excluir o MembroComunidade avisa e fecha o WebSocket aberto (4403)"""
+        import asyncio
+        from asgiref.sync import async_to_sync, sync_to_async
+        from .models import MembroComunidade
+        from .websocket import aplicacao_websocket
+        from .services.chat_tempo_real import conexoes_abertas
+        self.client.login(username='membro', password='senha12345')
+        scope = self._scope(self.comunidade.id)
+
+        async def cenario():
+            entrada, saida = asyncio.Queue(), asyncio.Queue()
+            await entrada.put({'type': 'websocket.connect'})
+            conexao = asyncio.ensure_future(aplicacao_websocket(scope, entrada.get, saida.put))
+            await saida.get()
+            await sync_to_async(MembroComunidade.objects.filter(usuario=self.usuario).delete)()
+            aviso = await saida.get()
+            fechamento = await saida.get()
+            await conexao
+            return aviso, fechamento
+
+        aviso, fechamento = async_to_sync(cenario)()
+        self.assertEqual(json.loads(aviso['text']), {'tipo': 'removido'})
+        self.assertEqual(fechamento, {'type': 'websocket.close', 'code': 4403})
+        self.assertEqual(conexoes_abertas(), 0)
+
+    def test_enviar_mensagem_publica_no_canal(self):
+        """Testa que enviar_mensagem_chat publica a mensagem criada"""
+        from unittest import mock
+        self.client.login(username='membro', password='senha12345')
+        with mock.patch('backstage.views.publicar_mensagem') as publicar:
+            resposta = self.client.post(
+                f'/comunidade/{self.comunidade.id}/enviar-mensagem/',
+                data=json.dumps({'conteudo': 'Olá'}), content_type='application/json'
+            )
+        self.assertTrue(resposta.json()['success'])
+        publicar.assert_called_once_with(self.comunidade.id, resposta.json()['mensagem'])
+
+    def test_sse_fora_do_asgi_responde_503(self):
+        """Testa que o SSE servido pelo WSGI recusa na hora (o cliente cai no long-polling)"""
+        self.client.login(username='membro', password='senha12345')
+        resposta = self.client.get(f'/comunidade/{self.comunidade.id}/eventos/')
+        self.assertEqual(resposta.status_code, 503)
+
+
+class LongPollChatTests(TestCase):
+    """Testes do long-polling do chat com versão por comunidade no cache"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import Comunidade, MembroComunidade, MensagemComunidade
+        cache.clear()
+        self.usuario = User.objects.create_user(username='membro', password='senha12345')
+        self.comunidade = Comunidade.objects.create(nome='Séries', criador=self.usuario)
+        MembroComunidade.objects.create(comunidade=self.comunidade, usuario=self.usuario)
+        # A versão avança no commit da mensagem
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mensagem = MensagemComunidade.objects.create(
+                comunidade=self.comunidade, usuario=self.usuario, conteudo='Primeira'
+            )
+        self.client.login(username='membro', password='senha12345')
+
+    def test_sala_sem_novidade_nao_consulta_mensagens(self):
+        """Testa que, com a versão no cache, a resposta vazia não lê a tabela de mensagens"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from unittest import mock
+        url = f'/comunidade/{self.comunidade.id}/mensagens/novas/?after={self.mensagem.id}'
+        with mock.patch('backstage.services.chat_tempo_real.cache_compartilhado', return_value=True), \
+                CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url)
+        self.assertEqual(resposta.json(), {'success': True, 'mensagens': []})
+        self.assertFalse([q for q in consultas if 'mensagemcomunidade' in q['sql']])
+
+    def test_nova_mensagem_avanca_versao(self):
+        """Testa que a nova mensagem aparece para quem estava na versão anterior"""
+        from .models import MensagemComunidade
+        nova = MensagemComunidade.objects.create(comunidade=self.comunidade, usuario=self.usuario, conteudo='Oi')
+        resposta = self.client.get(f'/comunidade/{self.comunidade.id}/mensagens/novas/?after={self.mensagem.id}')
+        self.assertEqual([m['id'] for m in resposta.json()['mensagens']], [nova.id])
+
+    def test_cache_local_relê_versao_do_banco(self):
+        """Testa que, com cache por processo, a mensagem gravada por outro worker aparece no poll"""
+        from .models import MensagemComunidade
+        from .services.chat_tempo_real import aguardar_versao
+        # bulk_create não dispara o post_save: simula a escrita de outro processo
+        MensagemComunidade.objects.bulk_create([
+            MensagemComunidade(comunidade=self.comunidade, usuario=self.usuario, conteudo='De outro worker')
+        ])
+        nova = MensagemComunidade.objects.get(conteudo='De outro worker')
+        self.assertEqual(aguardar_versao(self.comunidade.id, self.mensagem.id, espera=1), nova.id)
+        resposta = self.client.get(f'/comunidade/{self.comunidade.id}/mensagens/novas/?after={self.mensagem.id}')
+        self.assertEqual([m['id'] for m in resposta.json()['mensagens']], [nova.id])
+
+    def test_long_poll_com_cache_local_espaca_releituras(self):
+        """Testa que, com cache local, o long-poll vazio lê o banco só na entrada e ao expirar"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        url = f'/comunidade/{self.comunidade.id}/mensagens/novas/?after={self.mensagem.id}&espera=1'
+        with self.settings(CHAT_LONG_POLL_INTERVALO=0.1, CHAT_LONG_POLL_INTERVALO_LOCAL=10), \
+                CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url)
+        self.assertEqual(resposta.json(), {'success': True, 'mensagens': []})
+        self.assertEqual(len([q for q in consultas if 'mensagemcomunidade' in q['sql']]), 2)
+
+    def test_mensagens_novas_limitadas(self):
+        """Testa que after=0 devolve no máximo CHAT_HISTORICO_MAX mensagens, as mais antigas primeiro"""
+        from .models import MensagemComunidade
+        for i in range(3):
+            MensagemComunidade.objects.create(comunidade=self.comunidade, usuario=self.usuario, conteudo=f'M{i}')
+        with self.settings(CHAT_HISTORICO_MAX=2):
+            resposta = self.client.get(f'/comunidade/{self.comunidade.id}/mensagens/novas/?after=0')
+        self.assertEqual([m['conteudo'] for m in resposta.json()['mensagens']], ['Primeira', 'M0'])
+
+    def test_versao_nao_volta_para_tras(self):
+        """Testa que uma escrita mais antiga não sobrescreve a versão, nem com o lock ocupado"""
+        from .services.cache import _backend, adquirir_lock, liberar_lock
+        from .services.chat_tempo_real import definir_versao_chat
+        chave = f'chat_versao:{self.comunidade.id}'
+        definir_versao_chat(self.comunidade.id, self.mensagem.id + 10)
+        definir_versao_chat(self.comunidade.id, self.mensagem.id + 5)
+        self.assertEqual(_backend().get(chave), self.mensagem.id + 10)
+        # Outro worker no meio do compare-and-set: quem já foi superado não espera nem grava
+        adquirir_lock(chave)
+        try:
+            definir_versao_chat(self.comunidade.id, self.mensagem.id + 7)
+        finally:
+            liberar_lock(chave)
+        self.assertEqual(_backend().get(chave), self.mensagem.id + 10)
+        definir_versao_chat(self.comunidade.id, self.mensagem.id + 12)
+        self.assertEqual(_backend().get(chave), self.mensagem.id + 12)
+
+    def test_aguardar_versao_acorda_na_publicacao(self):
+        """Testa que o long-poll acorda assim que a versão avança (sem esperar o timeout)"""
+        import threading
+        import time
+        from .services.chat_tempo_real import aguardar_versao, definir_versao_chat
+        from unittest import mock
+        threading.Timer(0.1, definir_versao_chat, args=(self.comunidade.id, self.mensagem.id + 1)).start()
+        inicio = time.monotonic()
+        with mock.patch('backstage.services.chat_tempo_real.cache_compartilhado', return_value=True):
+            versao = aguardar_versao(self.comunidade.id, self.mensagem.id, espera=5)
+        self.assertEqual(versao, self.mensagem.id + 1)
+        self.assertLess(time.monotonic() - inicio, 2)
+
+
+class HistoricoChatTests(TestCase):
+    """Testes do histórico do chat paginado por cursor de ID"""
+
+    def test_ultimas_e_anteriores(self):
+        """Testa a primeira página (mais recentes) e a seguinte (antes do cursor)"""
+        from .models import Comunidade, MembroComunidade, MensagemComunidade
+        usuario = User.objects.create_user(username='membro', password='senha12345')
+        comunidade = Comunidade.objects.create(nome='Clássicos', criador=usuario)
+        MembroComunidade.objects.create(comunidade=comunidade, usuario=usuario)
+        ids = [
+            MensagemComunidade.objects.create(comunidade=comunidade, usuario=usuario, conteudo=f'm{i}').id
+            for i in range(5)
+        ]
+        self.client.login(username='membro', password='senha12345')
+        url = f'/comunidade/{comunidade.id}/mensagens/'
+
+        pagina = self.client.get(url, {'limite': 2}).json()
+        self.assertEqual([m['id'] for m in pagina['mensagens']], ids[3:])
+        self.assertTrue(pagina['tem_mais'])
+        self.assertEqual(pagina['proximo_cursor'], ids[3])
+
+        pagina = self.client.get(url, {'limite': 2, 'antes': pagina['proximo_cursor']}).json()
+        self.assertEqual([m['id'] for m in pagina['mensagens']], ids[1:3])
+
+        pagina = self.client.get(url, {'limite': 2, 'antes': ids[1]}).json()
+        self.assertEqual([m['id'] for m in pagina['mensagens']], ids[:1])
+        self.assertFalse(pagina['tem_mais'])
+        self.assertIsNone(pagina['proximo_cursor'])
+
+
+class MembrosComunidadeCacheTests(TestCase):
+    """Testes do mapa de membros/papéis em cache usado pelo chat"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import Comunidade, MembroComunidade
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='x')
+        self.membro = User.objects.create_user(username='membro', password='x')
+        self.comunidade = Comunidade.objects.create(nome='Terror', criador=self.admin)
+        MembroComunidade.objects.create(comunidade=self.comunidade, usuario=self.admin, role='admin')
+        self.entrada = MembroComunidade.objects.create(comunidade=self.comunidade, usuario=self.membro)
+
+    def test_mapa_sem_consulta_e_invalidado_nas_mudancas(self):
+        """Testa leitura sem queries e invalidação ao promover e expulsar"""
+        from .services.chat import papeis_da_comunidade, papel_do_membro
+        papeis_da_comunidade(self.comunidade.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(papel_do_membro(self.comunidade.id, self.admin.id), 'admin')
+            self.assertEqual(papel_do_membro(self.comunidade.id, self.membro.id), 'member')
+
+        self.entrada.role = 'admin'
+        self.entrada.save()
+        self.assertEqual(papel_do_membro(self.comunidade.id, self.membro.id), 'admin')
+
+        self.entrada.delete()
+        self.assertIsNone(papel_do_membro(self.comunidade.id, self.membro.id))
+
+    def test_expulso_em_outro_processo_nao_envia(self):
+        """Testa que o envio confere o banco mesmo com o mapa em cache desatualizado"""
+        from unittest import mock
+        from .services.chat import papel_do_membro
+        self.assertEqual(papel_do_membro(self.comunidade.id, self.membro.id), 'member')
+        # Invalidação feita no cache local de outro worker: este processo não a vê
+        with mock.patch('backstage.signals.invalidar_membros'):
+            self.entrada.delete()
+        self.assertEqual(papel_do_membro(self.comunidade.id, self.membro.id), 'member')
+
+        self.client.login(username='membro', password='x')
+        resposta = self.client.post(
+            f'/comunidade/{self.comunidade.id}/enviar-mensagem/',
+            data=json.dumps({'conteudo': 'Ainda aqui?'}), content_type='application/json'
+        )
+        self.assertEqual(resposta.status_code, 403)
+
+
+class RetratoAutorMensagemTests(TestCase):
+    """Testes do retrato do autor gravado nas mensagens do chat"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import Comunidade, MembroComunidade
+        cache.clear()
+        self.usuario = User.objects.create_user(username='autor', password='senha12345')
+        self.comunidade = Comunidade.objects.create(nome='Animação', criador=self.usuario)
+        MembroComunidade.objects.create(comunidade=self.comunidade, usuario=self.usuario, role='admin')
+        self.client.login(username='autor', password='senha12345')
+
+    def test_lista_usa_json_pre_calculado(self):
+        """Testa que a lista do chat lê só a tabela de mensagens e devolve o retrato do envio"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self.client.post(
+            f'/comunidade/{self.comunidade.id}/enviar-mensagem/',
+            data=json.dumps({'conteudo': 'Olá'}), content_type='application/json'
+        )
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(f'/comunidade/{self.comunidade.id}/mensagens/')
+        mensagem = resposta.json()['mensagens'][0]
+        self.assertEqual(mensagem['usuario'], {'username': 'autor', 'foto_perfil': None, 'role': 'admin'})
+        self.assertEqual(mensagem['conteudo'], 'Olá')
+        leituras = [q['sql'] for q in consultas if 'mensagemcomunidade' in q['sql']]
+        self.assertEqual(len(leituras), 1)
+        self.assertNotIn('JOIN', leituras[0])
+
+    def test_renomear_atualiza_e_antigas_sao_preenchidas(self):
+        """Testa o refresh ao renomear e o preenchimento de mensagens antigas sem retrato"""
+        from .models import MensagemComunidade
+        from .services.chat import criar_mensagem
+        mensagem, _ = criar_mensagem(self.comunidade.id, self.usuario, 'admin', conteudo='Oi')
+        antiga = MensagemComunidade.objects.create(comunidade=self.comunidade, usuario=self.usuario, conteudo='Antiga')
+
+        self.usuario.username = 'autora'
+        self.usuario.save()
+        mensagem.refresh_from_db()
+        self.assertEqual(json.loads(mensagem.payload_json)['usuario']['username'], 'autora')
+
+        self.client.login(username='autora', password='senha12345')
+        dados = self.client.get(f'/comunidade/{self.comunidade.id}/mensagens/').json()['mensagens']
+        self.assertEqual([m['usuario']['username'] for m in dados], ['autora', 'autora'])
+        antiga.refresh_from_db()
+        self.assertTrue(antiga.payload_json)
+
+    def test_versao_avanca_depois_do_fragmento(self):
+        """Testa que a versão do chat só avança no commit, com o fragmento JSON já gravado"""
+        from unittest import mock
+        from .models import MensagemComunidade
+        from .services.chat import criar_mensagem
+
+        def conferir_fragmento(comunidade_id, mensagem_id):
+            self.assertTrue(MensagemComunidade.objects.get(pk=mensagem_id).payload_json)
+
+        with mock.patch('backstage.signals.definir_versao_chat', side_effect=conferir_fragmento) as definir, \
+                mock.patch('backstage.services.chat.preencher_retratos') as preencher:
+            with self.captureOnCommitCallbacks(execute=True):
+                mensagem, _ = criar_mensagem(self.comunidade.id, self.usuario, 'admin', conteudo='Oi')
+                definir.assert_not_called()
+        definir.assert_called_once_with(self.comunidade.id, mensagem.id)
+        preencher.assert_not_called()
+
+
+class TrilhosLegadosTests(TestCase):
+    """Testes da limpeza dos trilhos antigos gravados no FilmeCache"""
+
+    def test_remove_so_linhas_de_trilho(self):
+        """Testa que só os IDs falsos com 'cache_type' são apagados"""
+        from .models import FilmeCache
+        from .services.tmdb import remover_trilhos_legados
+        FilmeCache.objects.create(id_tmdb=999999, payload={'cache_type': 'top_rated', 'filmes': []})
+        FilmeCache.objects.create(id_tmdb=550, payload={'titulo': 'Clube da Luta'})
+        self.assertEqual(remover_trilhos_legados(), 1)
+        self.assertEqual(remover_trilhos_legados(), 0)
+        self.assertEqual(list(FilmeCache.objects.values_list('id_tmdb', flat=True)), [550])
@@ -27,6 +27,7 @@ urlpatterns = [
     path("pesquisar/", views.barra_buscar, name="barra_buscar"),
     path("filmes/<int:tmdb_id>/relatorio/", views.relatorio, name="relatorio"),
     path('api/filmes-home/', views.filmes_home, name='filmes_home'),
+    path('api/feed/', views.feed_api, name='feed_api'),
     path('api/filmes/', views.filmes_api, name='filmes_api'),
     path('api/series/', views.series_api, name='series_api'),
     path('api/listas/', views.lists_api, name='lists_api'),
@@ -78,6 +79,7 @@ urlpatterns = [
     # IMPORTANT: These must come BEFORE slug-based URLs to match correctly
     path('comunidade/<int:comunidade_id>/mensagens/', views.obter_mensagens_comunidade, name='obter_mensagens_comunidade'),
     path('comunidade/<int:comunidade_id>/mensagens/novas/', views.obter_mensagens_novas, name='obter_mensagens_novas'),
+    path('comunidade/<int:comunidade_id>/eventos/', views.eventos_chat_comunidade, name='eventos_chat_comunidade'),
     path('comunidade/<int:comunidade_id>/enviar-mensagem/', views.enviar_mensagem_chat, name='enviar_mensagem_chat'),
     path('comunidade/<int:comunidade_id>/recomendar-filme/', views.recomendar_filme_chat, name='recomendar_filme_chat'),
     path('comunidade/<int:comunidade_id>/recomendar-serie/', views.recomendar_serie_chat, name='recomendar_serie_chat'),
@@ -97,6 +99,7 @@ urlpatterns = [
     path('meu-diario/', views.meu_diario, name='meu_diario'),
     path('reviews/', views.reviews, name='reviews'),
     path('reviews/<str:username>/', views.reviews, name='reviews_usuario'),
+    path('api/reviews/<str:username>/', views.reviews_api, name='reviews_api'),
     path('watchlist/', views.watchlist, name='watchlist'),
     path('lista/<int:lista_id>/', views.lista_detalhes, name='lista_detalhes'),
     path('favoritos/', views.favoritos, name='favoritos'),
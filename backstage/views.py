@@ -1,10 +1,14 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from .models import Filme, Critica, Lista, ItemLista, Serie, CriticaSerie, ItemListaSerie, Comunidade, MembroComunidade, SolicitacaoAmizade, Amizade, DiarioFilme, DiarioSerie, MensagemComunidade, FilmeFavorito
 from django.contrib import messages
 import json
-from django.http import JsonResponse
+import asyncio
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse, Http404, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.conf import settings
@@ -17,6 +21,7 @@ from rest_framework import status
 from functools import wraps
 from .services.tmdb import (
     obter_detalhes_com_cache,
+    registrar_acesso_filme,
     montar_payload_agregado,
     obter_top_filmes,
     obter_trending,
@@ -27,15 +32,34 @@ from .services.tmdb import (
     obter_classicos,
     converter_para_estrelas,
     buscar_series_populares,
-    buscar_detalhes_serie,
-    buscar_temporada,
+    obter_detalhes_serie_com_cache,
+    obter_temporada_com_cache,
     buscar_filme_destaque,
     buscar_filmes_populares,
     buscar_filme_por_titulo,
     buscar_serie_por_titulo,
+    inexistente_na_tmdb,
+)
+from .services.http_client import RecursoNaoEncontrado
+from .services.enriquecimento import enriquecer_filmes, enriquecer_series
+from .services.linha_do_tempo import pagina_de_reviews, decodificar_cursor
+from .services.avaliacoes import obter_media_backstage
+from .services.amizades import (
+    amigos_de, amigos_com_contadores, contar_amigos, obter_amizade, verificar_amizade,
+    status_relacionamentos, STATUS_RELACIONAMENTO,
+)
+from .services.feed import pagina_do_feed, decodificar_cursor as decodificar_cursor_feed
+from .services.busca_usuarios import buscar_usuarios
+from .services.chat import (
+    pagina_de_mensagens, papel_do_membro, papel_do_membro_no_banco, criar_mensagem,
+    fragmentos_das_mensagens, json_da_lista, MENSAGENS_POR_PAGINA,
+)
+from .services.chat_tempo_real import (
+    assinar, cancelar_assinatura, publicar_mensagem, publicar_chat_limpo, EVENTO_REMOVIDO,
+    versao_chat, definir_versao_chat, reiniciar_versao_chat, aguardar_versao,
 )
 #####################
-from django.db.models import Q, Count
+from django.db.models import Q, Count, Exists, OuterRef, Value, BooleanField
 from django.core.paginator import Paginator
 from rapidfuzz import fuzz
 
@@ -175,52 +199,11 @@ def pagina_login(request):
     return render(request, 'backstage/login.html')
 
 def index(request):
-    # Buscar atividades dos amigos (críticas recentes)
+    # Atividades dos amigos (críticas, diário e favoritos), já gravadas na timeline do usuário
     atividades_amigos = []
+    proximo_cursor_feed = None
     if request.user.is_authenticated:
-        # Buscar amigos do usuário
-        amigos_ids = []
-        amizades_como_usuario1 = Amizade.objects.filter(usuario1=request.user).values_list('usuario2_id', flat=True)
-        amizades_como_usuario2 = Amizade.objects.filter(usuario2=request.user).values_list('usuario1_id', flat=True)
-        amigos_ids = list(amizades_como_usuario1) + list(amizades_como_usuario2)
-
-        if amigos_ids:
-            # Buscar críticas de filmes dos amigos
-            criticas_filmes = Critica.objects.filter(
-                usuario_id__in=amigos_ids
-            ).select_related('usuario', 'filme').order_by('-criado_em')[:10]
-
-            # Buscar críticas de séries dos amigos
-            criticas_series = CriticaSerie.objects.filter(
-                usuario_id__in=amigos_ids
-            ).select_related('usuario', 'serie').order_by('-criado_em')[:10]
-
-            # Combinar e ordenar todas as atividades
-            for critica in criticas_filmes:
-                atividades_amigos.append({
-                    'tipo': 'filme',
-                    'usuario': critica.usuario,
-                    'titulo': critica.filme.titulo,
-                    'nota': critica.nota,
-                    'data': critica.criado_em,
-                    'filme_id': critica.filme.id,
-                    'tmdb_id': critica.filme.tmdb_id,
-                })
-
-            for critica in criticas_series:
-                atividades_amigos.append({
-                    'tipo': 'serie',
-                    'usuario': critica.usuario,
-                    'titulo': critica.serie.titulo,
-                    'nota': critica.nota,
-                    'data': critica.criado_em,
-                    'serie_id': critica.serie.id,
-                    'tmdb_id': critica.serie.tmdb_id,
-                })
-
-            # Ordenar por data (mais recente primeiro)
-            atividades_amigos.sort(key=lambda x: x['data'], reverse=True)
-            atividades_amigos = atividades_amigos[:10]  # Limitar a 10 atividades
+        atividades_amigos, proximo_cursor_feed = pagina_do_feed(request.user)
 
     # Buscar recomendações personalizadas
     filmes_recomendados = []
@@ -237,10 +220,36 @@ def index(request):
     context = {
         'tmdb_image_base': settings.TMDB_IMAGE_BASE_URL,
         'atividades_amigos': atividades_amigos,
+        'proximo_cursor_feed': proximo_cursor_feed,
         'filmes_recomendados': filmes_recomendados_json,
     }
     return render(request, 'backstage/index.html', context)
 
+@login_required(login_url='backstage:login')
+def feed_api(request):
+    """API do feed de atividades dos amigos, paginada por cursor (?cursor=...)"""
+    cursor = request.GET.get('cursor')
+    if cursor and decodificar_cursor_feed(cursor) is None:
+        return JsonResponse({'success': False, 'error': 'Cursor inválido'}, status=400)
+
+    atividades, proximo_cursor = pagina_do_feed(request.user, cursor=cursor)
+    return JsonResponse({
+        'success': True,
+        'atividades': [
+            {
+                'tipo': atividade['tipo'],
+                'evento': atividade['evento'],
+                'usuario': atividade['usuario'].username,
+                'titulo': atividade['titulo'],
+                'nota': atividade['nota'],
+                'data': atividade['data'].isoformat(),
+                'tmdb_id': atividade['tmdb_id'],
+            }
+            for atividade in atividades
+        ],
+        'proximo_cursor': proximo_cursor,
+    })
+
 def sair(request):
     logout(request)
     return redirect('backstage:index')
@@ -449,19 +458,7 @@ def detalhes_comunidade(request, slug):
         comunidade=comunidade
     ).select_related('usuario').order_by('role', '-data_entrada')
     
-    # Buscar mensagens recentes do chat (últimas 50)
-    mensagens_list = list(MensagemComunidade.objects.filter(
-        comunidade=comunidade
-    ).select_related('usuario', 'usuario__profile').order_by('criado_em')[:50])
-    
-    # Adicionar flag para identificar se deve mostrar header (primeira mensagem ou usuário diferente)
-    for i, mensagem in enumerate(mensagens_list):
-        if i == 0:
-            mensagem.mostrar_header = True
-        else:
-            mensagem.mostrar_header = mensagens_list[i-1].usuario != mensagem.usuario
-        # Adicionar flag para identificar mensagens do usuário logado
-        mensagem.is_own = mensagem.usuario == request.user
+    # As mensagens do chat são carregadas pelo community-chat.js (histórico paginado)
     
     # Buscar todas as comunidades que o usuário participa
     minhas_comunidades = Comunidade.objects.filter(
@@ -472,7 +469,6 @@ def detalhes_comunidade(request, slug):
         'comunidade': comunidade,
         'meu_papel': meu_papel,
         'membros': membros,
-        'mensagens': mensagens_list,
         'minhas_comunidades': minhas_comunidades,
         'is_admin': meu_papel == 'admin' if meu_papel else False,
     }
@@ -582,10 +578,9 @@ def buscar_midia_para_chat(request):
 def recomendar_filme_chat(request, comunidade_id):
     """API para recomendar filme na comunidade (via chat)"""
     try:
-        comunidade = get_object_or_404(Comunidade, id=comunidade_id)
-
-        # Verificar se o usuário é membro
-        if not MembroComunidade.objects.filter(comunidade=comunidade, usuario=request.user).exists():
+        # Verificar se o usuário é membro (escrita: papel lido do banco)
+        papel = papel_do_membro_no_banco(comunidade_id, request.user.id)
+        if papel is None:
             return JsonResponse({'success': False, 'error': 'Você precisa ser membro da comunidade'}, status=403)
 
         data = json.loads(request.body)
@@ -600,10 +595,9 @@ def recomendar_filme_chat(request, comunidade_id):
         if not detalhes:
             return JsonResponse({'success': False, 'error': 'Filme não encontrado'}, status=404)
 
-        # Criar mensagem de recomendação
-        mensagem = MensagemComunidade.objects.create(
-            comunidade=comunidade,
-            usuario=request.user,
+        # Criar mensagem de recomendação (com o retrato do autor)
+        mensagem, dados_mensagem = criar_mensagem(
+            comunidade_id, request.user, papel,
             tipo_mensagem='recomendacao',
             conteudo=mensagem_texto if mensagem_texto else '',
             filme_tmdb_id=tmdb_id,
@@ -611,31 +605,10 @@ def recomendar_filme_chat(request, comunidade_id):
             filme_poster=f"https://image.tmdb.org/t/p/w500{detalhes['poster_path']}" if detalhes.get('poster_path') else None,
         )
 
-        # Get user role
-        membro = MembroComunidade.objects.get(comunidade=comunidade, usuario=request.user)
+        # Entrega às conexões abertas do chat (WebSocket/SSE)
+        publicar_mensagem(comunidade_id, dados_mensagem)
 
-        # Get user's profile photo
-        foto_perfil = None
-        if hasattr(request.user, 'profile') and request.user.profile.foto_perfil:
-            foto_perfil = request.user.profile.foto_perfil.url
-
-        return JsonResponse({
-            'success': True,
-            'mensagem': {
-                'id': mensagem.id,
-                'usuario': {
-                    'username': request.user.username,
-                    'foto_perfil': foto_perfil,
-                    'role': membro.role
-                },
-                'conteudo': mensagem.conteudo,
-                'tipo_mensagem': mensagem.tipo_mensagem,
-                'filme_tmdb_id': mensagem.filme_tmdb_id,
-                'filme_titulo': mensagem.filme_titulo,
-                'filme_poster': mensagem.filme_poster,
-                'criado_em': mensagem.criado_em.isoformat(),
-            }
-        })
+        return JsonResponse({'success': True, 'mensagem': dados_mensagem})
 
     except Exception as e:
         import traceback
@@ -648,10 +621,9 @@ def recomendar_filme_chat(request, comunidade_id):
 def recomendar_serie_chat(request, comunidade_id):
     """API para recomendar série na comunidade (via chat)"""
     try:
-        comunidade = get_object_or_404(Comunidade, id=comunidade_id)
-
-        # Verificar se o usuário é membro
-        if not MembroComunidade.objects.filter(comunidade=comunidade, usuario=request.user).exists():
+        # Verificar se o usuário é membro (escrita: papel lido do banco)
+        papel = papel_do_membro_no_banco(comunidade_id, request.user.id)
+        if papel is None:
             return JsonResponse({'success': False, 'error': 'Você precisa ser membro da comunidade'}, status=403)
 
         data = json.loads(request.body)
@@ -661,15 +633,14 @@ def recomendar_serie_chat(request, comunidade_id):
         if not tmdb_id:
             return JsonResponse({'success': False, 'error': 'ID da série não fornecido'}, status=400)
 
-        # Buscar detalhes da série no TMDB
-        detalhes = buscar_detalhes_serie(tmdb_id)
+        # Buscar detalhes da série (SerieCache / TMDB)
+        detalhes = obter_detalhes_serie_com_cache(tmdb_id)
         if not detalhes:
             return JsonResponse({'success': False, 'error': 'Série não encontrada'}, status=404)
 
-        # Criar mensagem de recomendação
-        mensagem = MensagemComunidade.objects.create(
-            comunidade=comunidade,
-            usuario=request.user,
+        # Criar mensagem de recomendação (com o retrato do autor)
+        mensagem, dados_mensagem = criar_mensagem(
+            comunidade_id, request.user, papel,
             tipo_mensagem='recomendacao',
             conteudo=mensagem_texto if mensagem_texto else '',
             filme_tmdb_id=tmdb_id,
@@ -677,31 +648,10 @@ def recomendar_serie_chat(request, comunidade_id):
             filme_poster=f"https://image.tmdb.org/t/p/w500{detalhes['poster_path']}" if detalhes.get('poster_path') else None,
         )
 
-        # Get user role
-        membro = MembroComunidade.objects.get(comunidade=comunidade, usuario=request.user)
+        # Entrega às conexões abertas do chat (WebSocket/SSE)
+        publicar_mensagem(comunidade_id, dados_mensagem)
 
-        # Get user's profile photo
-        foto_perfil = None
-        if hasattr(request.user, 'profile') and request.user.profile.foto_perfil:
-            foto_perfil = request.user.profile.foto_perfil.url
-
-        return JsonResponse({
-            'success': True,
-            'mensagem': {
-                'id': mensagem.id,
-                'usuario': {
-                    'username': request.user.username,
-                    'foto_perfil': foto_perfil,
-                    'role': membro.role
-                },
-                'conteudo': mensagem.conteudo,
-                'tipo_mensagem': mensagem.tipo_mensagem,
-                'filme_tmdb_id': mensagem.filme_tmdb_id,
-                'filme_titulo': mensagem.filme_titulo,
-                'filme_poster': mensagem.filme_poster,
-                'criado_em': mensagem.criado_em.isoformat(),
-            }
-        })
+        return JsonResponse({'success': True, 'mensagem': dados_mensagem})
 
     except Exception as e:
         import traceback
@@ -716,16 +666,17 @@ def limpar_chat_comunidade(request, comunidade_id):
     try:
         comunidade = get_object_or_404(Comunidade, id=comunidade_id)
 
-        # Verificar se o usuário é admin da comunidade
-        try:
-            membro = MembroComunidade.objects.get(comunidade=comunidade, usuario=request.user)
-            if membro.role != 'admin':
-                return JsonResponse({'success': False, 'error': 'Apenas administradores podem limpar o chat'}, status=403)
-        except MembroComunidade.DoesNotExist:
+        # Verificar se o usuário é admin da comunidade (moderação: papel lido do banco)
+        papel = papel_do_membro_no_banco(comunidade.id, request.user.id)
+        if papel is None:
             return JsonResponse({'success': False, 'error': 'Você não é membro desta comunidade'}, status=403)
+        if papel != 'admin':
+            return JsonResponse({'success': False, 'error': 'Apenas administradores podem limpar o chat'}, status=403)
 
         # Deletar todas as mensagens da comunidade
         deleted_count = MensagemComunidade.objects.filter(comunidade=comunidade).delete()[0]
+        reiniciar_versao_chat(comunidade.id)
+        publicar_chat_limpo(comunidade.id)
 
         return JsonResponse({
             'success': True,
@@ -1695,9 +1646,43 @@ def wireframer(request):
 
 # back vitor e henrique ###########################################################################
 
+CRITICAS_POR_PAGINA = 10
+
+def paginar_criticas(request, criticas, modelo_like, por_pagina=CRITICAS_POR_PAGINA):
+    """
+    Página de críticas (mais recentes primeiro) para as telas de detalhes.
+
+    Cada crítica vem com `total_likes` e `usuario_deu_like` calculados na
+    mesma consulta, então o número de queries não cresce com a quantidade
+    de críticas. A página é escolhida por ?pagina_criticas=N.
+    """
+    if request.user.is_authenticated:
+        deu_like = Exists(modelo_like.objects.filter(usuario=request.user, critica=OuterRef('pk')))
+    else:
+        deu_like = Value(False, output_field=BooleanField())
+
+    criticas = criticas.select_related('usuario').annotate(
+        total_likes=Count('likes', distinct=True),
+        usuario_deu_like=deu_like,
+    ).order_by('-criado_em', '-id')
+
+    return Paginator(criticas, por_pagina).get_page(request.GET.get('pagina_criticas'))
+
+def _pagina_indisponivel(request, titulo):
+    """503 quando a TMDb está fora (o navegador e os buscadores tentam de novo depois)"""
+    resposta = render(request, 'backstage/indisponivel.html', {'titulo': titulo}, status=503)
+    resposta['Retry-After'] = str(getattr(settings, "DISJUNTOR_TEMPO_ABERTO", 30))
+    return resposta
+
 def detalhes_filme(request, tmdb_id):
 
     dados_filme = obter_detalhes_com_cache(tmdb_id)
+    if not dados_filme:
+        if inexistente_na_tmdb("filme", tmdb_id):
+            raise Http404("Filme não encontrado")
+        # Circuito aberto ou erro da TMDb: o filme pode existir, só não deu para buscar agora
+        return _pagina_indisponivel(request, "Filme indisponível no momento")
+    registrar_acesso_filme(tmdb_id)
 
     # Formatar data de lançamento para formato brasileiro
     if dados_filme.get('data_lancamento'):
@@ -1710,12 +1695,8 @@ def detalhes_filme(request, tmdb_id):
     else:
         dados_filme['data_lancamento_formatada'] = None
 
-    # Buscar ratings do OMDB (Metacritic, Rotten Tomatoes, etc)
-    from .services.tmdb import obter_ratings_omdb
-    ratings_omdb = None
-    if dados_filme.get('imdb_id'):
-        ratings_omdb = obter_ratings_omdb(dados_filme['imdb_id'])
-        print(f"[DEBUG] Ratings OMDB para {tmdb_id}: {ratings_omdb}")
+    # Ratings do OMDB (Metacritic, Rotten Tomatoes, etc) já vêm no payload em cache
+    ratings_omdb = dados_filme.get('ratings_omdb')
 
     # Criar ou buscar filme local para críticas
     filme_local, created = Filme.objects.get_or_create(
@@ -1726,53 +1707,16 @@ def detalhes_filme(request, tmdb_id):
         })
 
     # Buscar críticas locais com contagem de likes
-    from .models import LikeCritica, FilmeFavorito, DiarioFilme
-    from django.db.models import Avg
+    from .models import LikeCritica
 
-    criticas = Critica.objects.filter(filme=filme_local).annotate(
-        total_likes=Count('likes', distinct=True)
-    )
+    criticas_filme = Critica.objects.filter(filme=filme_local)
 
-    # Calcular média das notas do Backstage (uma nota por usuário)
-    # Prioridade: diário > favoritos > críticas (para evitar duplicatas)
-    notas_por_usuario = {}
+    # Média do Backstage (uma nota por usuário: diário > favoritos > críticas),
+    # mantida incrementalmente em AvaliacaoAgregada
+    media_backstage, total_avaliacoes = obter_media_backstage('filme', tmdb_id)
 
-    # Notas das críticas
-    for usuario_id, nota in criticas.values_list('usuario_id', 'nota'):
-        if usuario_id not in notas_por_usuario:
-            notas_por_usuario[usuario_id] = nota
-
-    # Notas dos favoritos (sobrescreve críticas)
-    for usuario_id, nota in FilmeFavorito.objects.filter(tmdb_id=tmdb_id).values_list('usuario_id', 'nota'):
-        notas_por_usuario[usuario_id] = nota
-
-    # Notas do diário (sobrescreve tudo - é a mais recente)
-    for usuario_id, nota in DiarioFilme.objects.filter(filme__tmdb_id=tmdb_id).values_list('usuario_id', 'nota'):
-        notas_por_usuario[usuario_id] = nota
-
-    todas_notas = list(notas_por_usuario.values())
-
-    if todas_notas:
-        media_backstage = round(sum(todas_notas) / len(todas_notas), 1)
-        total_avaliacoes = len(todas_notas)
-    else:
-        media_backstage = None
-        total_avaliacoes = 0
-    
-    # Formatar média para 1 casa decimal, ou None se não houver avaliações
-    if media_backstage is not None:
-        media_backstage = round(media_backstage, 1)
-
-    # Adicionar informação se o usuário atual deu like em cada crítica
-    if request.user.is_authenticated:
-        for critica in criticas:
-            critica.usuario_deu_like = LikeCritica.objects.filter(
-                usuario=request.user,
-                critica=critica
-            ).exists()
-    else:
-        for critica in criticas:
-            critica.usuario_deu_like = False
+    # Críticas paginadas; o like do usuário atual vem na mesma consulta (Exists)
+    criticas = paginar_criticas(request, criticas_filme, LikeCritica)
 
     # Passar dados de crew e cast para o JavaScript via JSON
     # Garantir que sempre sejam listas válidas, mesmo que vazias
@@ -2524,8 +2468,12 @@ def remover_item_lista(request, lista_id):
 def detalhes_serie(request, tmdb_id):
     """View para mostrar detalhes de uma série"""
 
-    # Buscar dados da API
-    dados_serie = buscar_detalhes_serie(tmdb_id)
+    # Buscar dados da série (cache ou TMDb)
+    dados_serie = obter_detalhes_serie_com_cache(tmdb_id)
+    if not dados_serie:
+        if inexistente_na_tmdb("serie", tmdb_id):
+            raise Http404("Série não encontrada")
+        return _pagina_indisponivel(request, "Série indisponível no momento")
     
     # Criar ou buscar série no banco local
     serie_local, created = Serie.objects.get_or_create(
@@ -2540,47 +2488,15 @@ def detalhes_serie(request, tmdb_id):
     )
     
     # Buscar críticas locais com contagem de likes
-    from .models import LikeCriticaSerie, SerieFavorita, DiarioSerie
-    criticas = CriticaSerie.objects.filter(serie=serie_local).annotate(
-        total_likes=Count('likes', distinct=True)
-    ).order_by('-criado_em')
-
-    # Calcular média das notas do Backstage (uma nota por usuário)
-    # Prioridade: diário > favoritos > críticas (para evitar duplicatas)
-    notas_por_usuario = {}
-
-    # Notas das críticas
-    for usuario_id, nota in criticas.values_list('usuario_id', 'nota'):
-        if usuario_id not in notas_por_usuario:
-            notas_por_usuario[usuario_id] = nota
+    from .models import LikeCriticaSerie
+    criticas_serie = CriticaSerie.objects.filter(serie=serie_local)
 
-    # Notas dos favoritos (sobrescreve críticas)
-    for usuario_id, nota in SerieFavorita.objects.filter(tmdb_id=tmdb_id).values_list('usuario_id', 'nota'):
-        notas_por_usuario[usuario_id] = nota
-
-    # Notas do diário (sobrescreve tudo - é a mais recente)
-    for usuario_id, nota in DiarioSerie.objects.filter(serie__tmdb_id=tmdb_id).values_list('usuario_id', 'nota'):
-        notas_por_usuario[usuario_id] = nota
-
-    todas_notas = list(notas_por_usuario.values())
-
-    if todas_notas:
-        media_backstage = round(sum(todas_notas) / len(todas_notas), 1)
-        total_avaliacoes = len(todas_notas)
-    else:
-        media_backstage = None
-        total_avaliacoes = 0
+    # Média do Backstage (uma nota por usuário: diário > favoritos > críticas),
+    # mantida incrementalmente em AvaliacaoAgregada
+    media_backstage, total_avaliacoes = obter_media_backstage('serie', tmdb_id)
 
-    # Adicionar informação se o usuário atual deu like em cada crítica
-    if request.user.is_authenticated:
-        for critica in criticas:
-            critica.usuario_deu_like = LikeCriticaSerie.objects.filter(
-                usuario=request.user,
-                critica=critica
-            ).exists()
-    else:
-        for critica in criticas:
-            critica.usuario_deu_like = False
+    # Críticas paginadas; o like do usuário atual vem na mesma consulta (Exists)
+    criticas = paginar_criticas(request, criticas_serie, LikeCriticaSerie)
 
     # Converter temporadas e vídeos para JSON
     import json
@@ -2648,11 +2564,16 @@ def buscar_temporada_api(request, tmdb_id, numero_temporada):
     """API endpoint para buscar episódios de uma temporada"""
     
     try:
-        dados_temporada = buscar_temporada(tmdb_id, numero_temporada)
+        dados_temporada = obter_temporada_com_cache(tmdb_id, numero_temporada)
         return JsonResponse({
             'success': True,
             'temporada': dados_temporada
         })
+    except RecursoNaoEncontrado:
+        return JsonResponse({
+            'success': False,
+            'error': 'Temporada não encontrada'
+            }, status=404)
     except Exception as e:
         return JsonResponse({
             'success': False,
@@ -2672,15 +2593,14 @@ def buscar_sugestoes(request):
         return JsonResponse({'sugestoes': []})
 
     try:
-        import requests
-        from django.conf import settings
+        from .services import http_client
 
         # Formatar resultados
         sugestoes = []
 
         # Buscar filmes (se tipo_filtro for 'filme' ou 'all')
         if tipo_filtro in ['filme', 'all']:
-            url_filmes = f"https://api.themoviedb.org/3/search/movie"
+            url_filmes = f"{settings.TMDB_BASE_URL}/search/movie"
             params_filmes = {
                 'api_key': settings.TMDB_API_KEY,
                 'language': 'pt-BR',
@@ -2688,7 +2608,7 @@ def buscar_sugestoes(request):
                 'page': 1
             }
             print(f"Buscando filmes na TMDb: {url_filmes}")
-            response_filmes = requests.get(url_filmes, params=params_filmes, timeout=5)
+            response_filmes = http_client.get(url_filmes, params=params_filmes, timeout=5)
             print(f"Status da resposta TMDb (filmes): {response_filmes.status_code}")
             filmes = response_filmes.json().get('results', [])[:5]  # Limitar a 5 resultados
             print(f"Filmes encontrados: {len(filmes)}")
@@ -2697,14 +2617,14 @@ def buscar_sugestoes(request):
 
         # Buscar séries (se tipo_filtro for 'serie' ou 'all')
         if tipo_filtro in ['serie', 'all']:
-            url_series = f"https://api.themoviedb.org/3/search/tv"
+            url_series = f"{settings.TMDB_BASE_URL}/search/tv"
             params_series = {
                 'api_key': settings.TMDB_API_KEY,
                 'language': 'pt-BR',
                 'query': query,
                 'page': 1
             }
-            response_series = requests.get(url_series, params=params_series, timeout=5)
+            response_series = http_client.get(url_series, params=params_series, timeout=5)
             series = response_series.json().get('results', [])[:5]  # Limitar a 5 resultados
         else:
             series = []
@@ -2753,7 +2673,6 @@ def buscar_sugestoes(request):
 @login_required(login_url='backstage:login')
 def perfil(request, username=None):
     """Página de perfil do usuário"""
-    from .services.tmdb import buscar_detalhes_filme, buscar_detalhes_serie
     
     if username:
         usuario_perfil = get_object_or_404(User, username=username)
@@ -2771,31 +2690,9 @@ def perfil(request, username=None):
         total_likes=Count('likes', distinct=True)
     ).order_by('-criado_em')[:4]
     
-    # Enriquecer críticas de filmes com dados do TMDB
-    for critica in criticas_filmes:
-        if critica.filme.tmdb_id:
-            try:
-                detalhes = buscar_detalhes_filme(critica.filme.tmdb_id)
-                if detalhes.get('poster_path'):
-                    critica.filme.poster = f"https://image.tmdb.org/t/p/w300{detalhes['poster_path']}"
-                if detalhes.get('release_date'):
-                    from datetime import datetime
-                    critica.filme.data_lancamento = datetime.strptime(detalhes['release_date'], '%Y-%m-%d').date()
-            except:
-                pass
-    
-    # Enriquecer críticas de séries com dados do TMDB
-    for critica in criticas_series:
-        if critica.serie.tmdb_id:
-            try:
-                detalhes = buscar_detalhes_serie(critica.serie.tmdb_id)
-                if detalhes.get('poster_path'):
-                    critica.serie.poster = f"https://image.tmdb.org/t/p/w300{detalhes['poster_path']}"
-                if detalhes.get('first_air_date'):
-                    from datetime import datetime
-                    critica.serie.data_primeira_exibicao = datetime.strptime(detalhes['first_air_date'], '%Y-%m-%d').date()
-            except:
-                pass
+    # Poster e data de lançamento: banco e caches primeiro, TMDb só para o que faltar
+    enriquecer_filmes([critica.filme for critica in criticas_filmes])
+    enriquecer_series([critica.serie for critica in criticas_series])
     
     # Buscar listas - se for perfil de amigo, mostrar todas as listas públicas
     listas = Lista.objects.filter(usuario=usuario_perfil).prefetch_related('itens__filme').order_by('-atualizada_em')
@@ -2806,17 +2703,12 @@ def perfil(request, username=None):
     total_listas = Lista.objects.filter(usuario=usuario_perfil).count()
     
     # Contar amigos
-    amigos_count = Amizade.objects.filter(
-        Q(usuario1=usuario_perfil) | Q(usuario2=usuario_perfil)
-    ).count()
+    amigos_count = contar_amigos(usuario_perfil)
     
     # Verificar se são amigos (se não for o próprio perfil)
     sao_amigos = False
     if not is_own_profile:
-        sao_amigos = Amizade.objects.filter(
-            Q(usuario1=request.user, usuario2=usuario_perfil) |
-            Q(usuario1=usuario_perfil, usuario2=request.user)
-        ).exists()
+        sao_amigos = verificar_amizade(request.user, usuario_perfil)
     
     context = {
         'usuario_perfil': usuario_perfil,
@@ -2851,7 +2743,6 @@ def meu_diario(request):
 @login_required(login_url='backstage:login')
 def reviews(request, username=None):
     """Página com todas as reviews do usuário"""
-    from .services.tmdb import buscar_detalhes_filme, buscar_detalhes_serie
     
     # Determinar qual usuário mostrar
     if username:
@@ -2861,44 +2752,12 @@ def reviews(request, username=None):
     
     is_own_profile = (request.user == usuario_perfil)
     
-    # Buscar todas as reviews do usuário com contagem de likes
-    criticas_filmes = Critica.objects.filter(usuario=usuario_perfil).select_related('filme').annotate(
-        total_likes=Count('likes', distinct=True)
-    ).order_by('-criado_em')
-    
-    criticas_series = CriticaSerie.objects.filter(usuario=usuario_perfil).select_related('serie').annotate(
-        total_likes=Count('likes', distinct=True)
-    ).order_by('-criado_em')
-    
-    # Enriquecer críticas de filmes com dados do TMDB
-    for critica in criticas_filmes:
-        if critica.filme.tmdb_id:
-            try:
-                detalhes = buscar_detalhes_filme(critica.filme.tmdb_id)
-                if detalhes.get('poster_path'):
-                    critica.filme.poster = f"https://image.tmdb.org/t/p/w300{detalhes['poster_path']}"
-                if detalhes.get('release_date'):
-                    from datetime import datetime
-                    critica.filme.data_lancamento = datetime.strptime(detalhes['release_date'], '%Y-%m-%d').date()
-            except:
-                pass
-    
-    # Enriquecer críticas de séries com dados do TMDB
-    for critica in criticas_series:
-        if critica.serie.tmdb_id:
-            try:
-                detalhes = buscar_detalhes_serie(critica.serie.tmdb_id)
-                if detalhes.get('poster_path'):
-                    critica.serie.poster = f"https://image.tmdb.org/t/p/w300{detalhes['poster_path']}"
-                if detalhes.get('first_air_date'):
-                    from datetime import datetime
-                    critica.serie.data_primeira_exibicao = datetime.strptime(detalhes['first_air_date'], '%Y-%m-%d').date()
-            except:
-                pass
+    # Primeira página da linha do tempo (filmes e séries mesclados no banco)
+    reviews_pagina, proximo_cursor = pagina_de_reviews(usuario_perfil)
     
     context = {
-        'criticas_filmes': criticas_filmes,
-        'criticas_series': criticas_series,
+        'reviews_pagina': reviews_pagina,
+        'proximo_cursor': proximo_cursor,
         'usuario_perfil': usuario_perfil,
         'is_own_profile': is_own_profile,
     }
@@ -2906,6 +2765,40 @@ def reviews(request, username=None):
     return render(request, 'backstage/reviews.html', context)
 
 
+@login_required(login_url='backstage:login')
+def reviews_api(request, username):
+    """API da rolagem infinita de reviews: próxima página a partir do cursor"""
+    usuario_perfil = get_object_or_404(User, username=username)
+    cursor = request.GET.get('cursor')
+    if cursor and decodificar_cursor(cursor) is None:
+        return JsonResponse({'success': False, 'error': 'Cursor inválido'}, status=400)
+
+    reviews_pagina, proximo_cursor = pagina_de_reviews(usuario_perfil, cursor=cursor)
+    html = ''.join(
+        render_to_string('backstage/_review_card.html', {'critica': critica}, request=request)
+        for critica in reviews_pagina
+    )
+    return JsonResponse({
+        'success': True,
+        'html': html,
+        'reviews': [
+            {
+                'id': critica.id,
+                'tipo': critica.tipo,
+                'tmdb_id': critica.obra.tmdb_id,
+                'titulo': critica.obra.titulo,
+                'poster': critica.obra.poster,
+                'nota': critica.nota,
+                'texto': critica.texto,
+                'total_likes': critica.total_likes,
+                'criado_em': critica.criado_em.isoformat(),
+            }
+            for critica in reviews_pagina
+        ],
+        'proximo_cursor': proximo_cursor,
+    })
+
+
 @login_required(login_url='backstage:login')
 def watchlist(request):
     """Página de listas do usuário"""
@@ -3071,25 +2964,14 @@ def amigos(request):
     """Página de amigos"""
     usuario = request.user
     
-    # Buscar amigos do usuário
-    amizades = Amizade.objects.filter(
-        Q(usuario1=usuario) | Q(usuario2=usuario)
-    )
-    
-    # Extrair lista de amigos
-    amigos_list = []
-    for amizade in amizades:
-        amigo = amizade.usuario2 if amizade.usuario1 == usuario else amizade.usuario1
-        # Contar reviews do amigo
-        criticas_count = Critica.objects.filter(usuario=amigo).count()
-        amigo.criticas_count = criticas_count
-        amigos_list.append(amigo)
+    # Amigos com os contadores já anotados (uma consulta só)
+    amigos_list = list(amigos_com_contadores(usuario))
     
     # Buscar solicitações recebidas
-    solicitacoes_recebidas = SolicitacaoAmizade.objects.filter(
+    solicitacoes_recebidas = list(SolicitacaoAmizade.objects.filter(
         destinatario=usuario,
         status='pending'
-    ).select_related('remetente').order_by('-data_criacao')
+    ).select_related('remetente').order_by('-data_criacao'))
     
     # Buscar solicitações enviadas
     solicitacoes_enviadas = SolicitacaoAmizade.objects.filter(
@@ -3102,7 +2984,7 @@ def amigos(request):
         'amigos_count': len(amigos_list),
         'solicitacoes_recebidas': solicitacoes_recebidas,
         'solicitacoes_enviadas': solicitacoes_enviadas,
-        'solicitacoes_pendentes_count': solicitacoes_recebidas.count(),
+        'solicitacoes_pendentes_count': len(solicitacoes_recebidas),
     }
     
     return render(request, 'backstage/amigos.html', context)
@@ -3238,8 +3120,6 @@ def diario_entradas(request):
 def diario_adicionar(request):
     """API para adicionar filme ou série ao diário"""
     from datetime import datetime
-    from .services.tmdb import buscar_detalhes_serie
-
     try:
         data = json.loads(request.body)
         item_id = data.get('filme_id')
@@ -3264,7 +3144,7 @@ def diario_adicionar(request):
             try:
                 serie = Serie.objects.get(tmdb_id=item_id)
             except Serie.DoesNotExist:
-                detalhes = buscar_detalhes_serie(item_id)
+                detalhes = obter_detalhes_serie_com_cache(item_id)
                 if detalhes and isinstance(detalhes, dict):
                     generos = detalhes.get('generos', []) or []
                     generos_str = ', '.join(generos[:3]) if generos else ''
@@ -3461,47 +3341,16 @@ def buscar_usuarios_realtime(request):
                 'usuarios': []
             })
         
-        # Buscar usuários (exceto o usuário atual)
-        usuarios = User.objects.filter(
-            Q(username__icontains=query) |
-            Q(first_name__icontains=query) |
-            Q(last_name__icontains=query)
-        ).exclude(id=request.user.id)[:10]  # Limitar a 10 resultados
+        # Buscar usuários pelo índice de busca (exceto o usuário atual)
+        usuarios = buscar_usuarios(query, limite=10, excluir_id=request.user.id)
+        
+        # Status de amizade de todos os resultados de uma vez
+        status_por_id = status_relacionamentos(request.user, [u.id for u in usuarios])
         
         resultados = []
         for usuario in usuarios:
-            # Verificar status de amizade
-            ja_amigo = Amizade.objects.filter(
-                Q(usuario1=request.user, usuario2=usuario) |
-                Q(usuario1=usuario, usuario2=request.user)
-            ).exists()
-            
-            if ja_amigo:
-                status = 'amigo'
-                status_text = 'Amigo'
-            else:
-                # Verificar solicitação pendente
-                solicitacao_enviada = SolicitacaoAmizade.objects.filter(
-                    remetente=request.user,
-                    destinatario=usuario,
-                    status='pending'
-                ).exists()
-                
-                solicitacao_recebida = SolicitacaoAmizade.objects.filter(
-                    remetente=usuario,
-                    destinatario=request.user,
-                    status='pending'
-                ).exists()
-                
-                if solicitacao_enviada:
-                    status = 'pendente_enviada'
-                    status_text = 'Solicitação enviada'
-                elif solicitacao_recebida:
-                    status = 'pendente_recebida'
-                    status_text = 'Aceitar solicitação'
-                else:
-                    status = 'adicionar'
-                    status_text = 'Adicionar amigo'
+            status = status_por_id[usuario.id]
+            status_text = STATUS_RELACIONAMENTO[status]
             
             # Obter foto de perfil (se existir)
             foto_perfil = None
@@ -3554,10 +3403,7 @@ def enviar_solicitacao(request):
             })
         
         # Verificar se já são amigos
-        ja_amigo = Amizade.objects.filter(
-            Q(usuario1=request.user, usuario2=destinatario) |
-            Q(usuario1=destinatario, usuario2=request.user)
-        ).exists()
+        ja_amigo = verificar_amizade(request.user, destinatario)
         
         if ja_amigo:
             return JsonResponse({
@@ -3667,10 +3513,7 @@ def aceitar_solicitacao(request):
             })
         
         # Verificar se já são amigos
-        ja_amigos = Amizade.objects.filter(
-            Q(usuario1=request.user, usuario2=solicitacao.remetente) |
-            Q(usuario1=solicitacao.remetente, usuario2=request.user)
-        ).exists()
+        ja_amigos = verificar_amizade(request.user, solicitacao.remetente)
         
         if ja_amigos:
             return JsonResponse({
@@ -3789,11 +3632,8 @@ def remover_amigo(request):
         
         amigo = get_object_or_404(User, id=amigo_id)
         
-        # Buscar e deletar amizade
-        amizade = Amizade.objects.filter(
-            Q(usuario1=request.user, usuario2=amigo) |
-            Q(usuario1=amigo, usuario2=request.user)
-        ).first()
+        # Buscar e deletar amizade (as arestas saem em cascata)
+        amizade = obter_amizade(request.user, amigo)
         
         if not amizade:
             return JsonResponse({
@@ -3822,25 +3662,18 @@ def buscar_amigos(request):
     try:
         query = request.GET.get('q', '').strip()
 
-        # Buscar amizades onde o usuário é usuario1 ou usuario2
-        amizades = Amizade.objects.filter(
-            Q(usuario1=request.user) | Q(usuario2=request.user)
-        ).select_related('usuario1', 'usuario2')
+        amigos_qs = amigos_de(request.user).select_related('profile')
+        if query:
+            # Filtrar pelo nome no banco
+            amigos_qs = amigos_qs.filter(username__icontains=query)
 
         amigos = []
-        for amizade in amizades:
-            # Pegar o outro usuário da amizade
-            amigo = amizade.usuario2 if amizade.usuario1 == request.user else amizade.usuario1
-
-            # Se houver query, filtrar pelo nome
-            if query and query.lower() not in amigo.username.lower():
-                continue
-
+        for amigo in amigos_qs:
             amigos.append({
                 'id': amigo.id,
                 'username': amigo.username,
                 'nome_completo': f"{amigo.first_name} {amigo.last_name}".strip() or amigo.username,
-                'foto_perfil': amigo.profile.foto.url if hasattr(amigo, 'profile') and amigo.profile.foto else None
+                'foto_perfil': amigo.profile.foto_perfil.url if hasattr(amigo, 'profile') and amigo.profile.foto_perfil else None
             })
 
         return JsonResponse({
@@ -4116,48 +3949,30 @@ def limpar_listas(request):
 @require_http_methods(["GET"])
 def obter_mensagens_comunidade(request, comunidade_id):
     """
-    API endpoint to get all messages from a community
+    API endpoint to get the chat history, newest page first:
+    ?limite=N returns the latest N messages and ?antes=<id> the N before that id
     """
     try:
-        comunidade = get_object_or_404(Comunidade, id=comunidade_id)
-
-        # Verify user is member
-        if not MembroComunidade.objects.filter(comunidade=comunidade, usuario=request.user).exists():
+        # Membership comes from the cached map (no query)
+        if papel_do_membro(comunidade_id, request.user.id) is None:
             return JsonResponse({'success': False, 'error': 'Você não é membro desta comunidade'}, status=403)
 
-        # Get messages
-        mensagens = MensagemComunidade.objects.filter(comunidade=comunidade).select_related('usuario', 'usuario__profile').order_by('criado_em')
-
-        # Get user's role
-        user_roles = {}
-        membros = MembroComunidade.objects.filter(comunidade=comunidade).select_related('usuario')
-        for membro in membros:
-            user_roles[membro.usuario.id] = membro.role
-
-        # Serialize messages
-        mensagens_data = []
-        for msg in mensagens:
-            foto_perfil = None
-            if hasattr(msg.usuario, 'profile') and msg.usuario.profile.foto_perfil:
-                foto_perfil = msg.usuario.profile.foto_perfil.url
-
-            mensagens_data.append({
-                'id': msg.id,
-                'usuario': {
-                    'username': msg.usuario.username,
-                    'foto_perfil': foto_perfil,
-                    'role': user_roles.get(msg.usuario.id, 'member')
-                },
-                'conteudo': msg.conteudo,
-                'tipo_mensagem': msg.tipo_mensagem,
-                'filme_tmdb_id': msg.filme_tmdb_id,
-                'filme_titulo': msg.filme_titulo,
-                'filme_poster': msg.filme_poster,
-                'criado_em': msg.criado_em.isoformat(),
-                'editado': msg.editado
-            })
-
-        return JsonResponse({'success': True, 'mensagens': mensagens_data})
+        try:
+            antes_de = int(request.GET['antes']) if request.GET.get('antes') else None
+            limite = int(request.GET.get('limite', MENSAGENS_POR_PAGINA))
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Parâmetros de paginação inválidos'}, status=400)
+        limite = min(max(limite, 1), getattr(settings, "CHAT_HISTORICO_MAX", 100))
+
+        # Get messages (one page, in chronological order)
+        mensagens, tem_mais = pagina_de_mensagens(comunidade_id, antes_de=antes_de, limite=limite)
+
+        # Precomputed JSON fragments (single-table read, no serialization)
+        return HttpResponse(json_da_lista(
+            fragmentos_das_mensagens(mensagens),
+            tem_mais=tem_mais,
+            proximo_cursor=mensagens[0].id if tem_mais else None,
+        ), content_type='application/json')
 
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
@@ -4170,58 +3985,100 @@ def obter_mensagens_novas(request, comunidade_id):
     API endpoint to get new messages after a specific message ID (for polling)
     """
     try:
-        comunidade = get_object_or_404(Comunidade, id=comunidade_id)
-
-        # Verify user is member
-        if not MembroComunidade.objects.filter(comunidade=comunidade, usuario=request.user).exists():
+        # Membership comes from the cached map (no query)
+        if papel_do_membro(comunidade_id, request.user.id) is None:
             return JsonResponse({'success': False, 'error': 'Você não é membro desta comunidade'}, status=403)
 
         # Get after_id parameter
-        after_id = request.GET.get('after', 0)
+        try:
+            after_id = int(request.GET.get('after', 0))
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Parâmetro after inválido'}, status=400)
 
-        # Get new messages
-        mensagens = MensagemComunidade.objects.filter(
-            comunidade=comunidade,
+        # Long-polling: ?espera=<segundos> segura a requisição até chegar mensagem
+        try:
+            espera = min(max(float(request.GET.get('espera', 0)), 0), getattr(settings, "CHAT_LONG_POLL_MAX", 25))
+        except ValueError:
+            espera = 0
+
+        # Versão da sala (ID da última mensagem) no cache: sala sem novidade
+        # é respondida sem consultar as mensagens
+        versao = versao_chat(comunidade_id)
+        if versao is None:
+            versao = MensagemComunidade.objects.filter(comunidade_id=comunidade_id) \
+                .order_by('-id').values_list('id', flat=True).first() or 0
+            definir_versao_chat(comunidade_id, versao)
+        if versao <= after_id and espera:
+            versao = aguardar_versao(comunidade_id, after_id, espera, versao_atual=versao)
+        if versao is not None and versao <= after_id:
+            return JsonResponse({'success': True, 'mensagens': []})
+
+        # Get new messages (precomputed JSON fragments); a client far behind
+        # gets the next CHAT_HISTORICO_MAX and catches up on the following polls
+        mensagens = list(MensagemComunidade.objects.filter(
+            comunidade_id=comunidade_id,
             id__gt=after_id
-        ).select_related('usuario', 'usuario__profile').order_by('criado_em')
-
-        # Get user's role
-        user_roles = {}
-        if mensagens.exists():
-            user_ids = mensagens.values_list('usuario_id', flat=True).distinct()
-            membros = MembroComunidade.objects.filter(comunidade=comunidade, usuario_id__in=user_ids).select_related('usuario')
-            for membro in membros:
-                user_roles[membro.usuario.id] = membro.role
-
-        # Serialize messages
-        mensagens_data = []
-        for msg in mensagens:
-            foto_perfil = None
-            if hasattr(msg.usuario, 'profile') and msg.usuario.profile.foto_perfil:
-                foto_perfil = msg.usuario.profile.foto_perfil.url
-
-            mensagens_data.append({
-                'id': msg.id,
-                'usuario': {
-                    'username': msg.usuario.username,
-                    'foto_perfil': foto_perfil,
-                    'role': user_roles.get(msg.usuario.id, 'member')
-                },
-                'conteudo': msg.conteudo,
-                'tipo_mensagem': msg.tipo_mensagem,
-                'filme_tmdb_id': msg.filme_tmdb_id,
-                'filme_titulo': msg.filme_titulo,
-                'filme_poster': msg.filme_poster,
-                'criado_em': msg.criado_em.isoformat(),
-                'editado': msg.editado
-            })
+        ).only('id', 'comunidade_id', 'payload_json').order_by('id')[:getattr(settings, "CHAT_HISTORICO_MAX", 100)])
 
-        return JsonResponse({'success': True, 'mensagens': mensagens_data})
+        return HttpResponse(json_da_lista(fragmentos_das_mensagens(mensagens)), content_type='application/json')
 
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
+@login_required(login_url='backstage:login')
+@require_http_methods(["GET"])
+async def eventos_chat_comunidade(request, comunidade_id):
+    """
+    Server-Sent Events do chat (alternativa ao WebSocket de setup/asgi.py).
+    A conexão fica parada sem custo até chegar um evento da comunidade e é
+    encerrada após CHAT_SSE_DURACAO segundos; o EventSource reconecta sozinho.
+
+    Só funciona servido pelo ASGI (uvicorn/daphne): no WSGI o Django junta o
+    gerador inteiro antes de responder, prendendo o worker sem entregar nada.
+    Nesse caso responde 503 e o cliente cai no long-polling.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'success': False, 'error': 'Eventos em tempo real exigem o servidor ASGI'}, status=503)
+
+    usuario = await request.auser()
+    if await sync_to_async(papel_do_membro)(comunidade_id, usuario.id) is None:
+        return JsonResponse({'success': False, 'error': 'Você não é membro desta comunidade'}, status=403)
+
+    duracao = getattr(settings, "CHAT_SSE_DURACAO", 300)
+    intervalo_ping = getattr(settings, "CHAT_SSE_PING", 15)
+    recheck = getattr(settings, "CHAT_MEMBRO_RECHECAGEM", 60)
+
+    async def fluxo():
+        assinatura = assinar(comunidade_id, usuario.id)
+        loop = asyncio.get_running_loop()
+        fim = loop.time() + duracao
+        rechecar_em = loop.time() + recheck
+        try:
+            yield 'retry: 3000\n\n'
+            while loop.time() < fim:
+                # Expulsão feita em outro processo não chega pelo pub/sub local
+                if loop.time() >= rechecar_em:
+                    rechecar_em = loop.time() + recheck
+                    if await sync_to_async(papel_do_membro_no_banco)(comunidade_id, usuario.id) is None:
+                        yield f"data: {json.dumps(EVENTO_REMOVIDO)}\n\n"
+                        break
+                evento = await assinatura.proximo(timeout=intervalo_ping)
+                if evento is None:
+                    yield ': ping\n\n'  # mantém proxies sem fechar a conexão ociosa
+                else:
+                    yield f"data: {json.dumps(evento)}\n\n"
+                    if evento == EVENTO_REMOVIDO:
+                        break
+        finally:
+            cancelar_assinatura(assinatura)
+
+    resposta = StreamingHttpResponse(fluxo(), content_type='text/event-stream')
+    resposta['Cache-Control'] = 'no-cache'
+    resposta['X-Accel-Buffering'] = 'no'
+    return resposta
+
+
 @login_required(login_url='backstage:login')
 @require_http_methods(["POST"])
 def enviar_mensagem_chat(request, comunidade_id):
@@ -4229,10 +4086,9 @@ def enviar_mensagem_chat(request, comunidade_id):
     API endpoint to send a new message
     """
     try:
-        comunidade = get_object_or_404(Comunidade, id=comunidade_id)
-
-        # Verify user is member
-        if not MembroComunidade.objects.filter(comunidade=comunidade, usuario=request.user).exists():
+        # Verify user is member (writes read the role from the database)
+        papel = papel_do_membro_no_banco(comunidade_id, request.user.id)
+        if papel is None:
             return JsonResponse({'success': False, 'error': 'Você não é membro desta comunidade'}, status=403)
 
         # Get data from request
@@ -4242,41 +4098,18 @@ def enviar_mensagem_chat(request, comunidade_id):
         if not conteudo:
             return JsonResponse({'success': False, 'error': 'Mensagem vazia'}, status=400)
 
-        # Create message
-        mensagem = MensagemComunidade.objects.create(
-            comunidade=comunidade,
-            usuario=request.user,
+        # Create message (with the sender snapshot and its JSON fragment)
+        mensagem, dados_mensagem = criar_mensagem(
+            comunidade_id, request.user, papel,
             conteudo=conteudo,
             tipo_mensagem='texto'
         )
 
-        # Get user's role
-        membro = MembroComunidade.objects.get(comunidade=comunidade, usuario=request.user)
-
-        # Get user's profile photo
-        foto_perfil = None
-        if hasattr(request.user, 'profile') and request.user.profile.foto_perfil:
-            foto_perfil = request.user.profile.foto_perfil.url
+        # Entrega às conexões abertas do chat (WebSocket/SSE)
+        publicar_mensagem(comunidade_id, dados_mensagem)
 
         # Return created message
-        return JsonResponse({
-            'success': True,
-            'mensagem': {
-                'id': mensagem.id,
-                'usuario': {
-                    'username': request.user.username,
-                    'foto_perfil': foto_perfil,
-                    'role': membro.role
-                },
-                'conteudo': mensagem.conteudo,
-                'tipo_mensagem': mensagem.tipo_mensagem,
-                'filme_tmdb_id': mensagem.filme_tmdb_id,
-                'filme_titulo': mensagem.filme_titulo,
-                'filme_poster': mensagem.filme_poster,
-                'criado_em': mensagem.criado_em.isoformat(),
-                'editado': mensagem.editado
-            }
-        })
+        return JsonResponse({'success': True, 'mensagem': dados_mensagem})
 
     except json.JSONDecodeError:
         return JsonResponse({'success': False, 'error': 'JSON inválido'}, status=400)
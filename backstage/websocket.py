@@ -0,0 +1,121 @@
+"""
+Canal WebSocket do chat das comunidades (ASGI puro, montado em setup/asgi.py).
+
+O cliente só recebe: as mensagens continuam sendo enviadas pelas APIs HTTP,
+que publicam no pub/sub em memória (services.chat_tempo_real).
+"""
+import asyncio
+import json
+import re
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import urlparse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections
+from .services.chat import papel_do_membro, papel_do_membro_no_banco
+from .services.chat_tempo_real import EVENTO_REMOVIDO, assinar, cancelar_assinatura
+
+ROTA_CHAT = re.compile(r'^/ws/comunidade/(?P<comunidade_id>\d+)/$')
+
+
+def _cabecalhos(scope):
+    return {nome.decode('latin1').lower(): valor.decode('latin1') for nome, valor in scope.get('headers', [])}
+
+
+def _origem_permitida(cabecalhos):
+    """Bloqueia conexões abertas por páginas de outros domínios (o cookie de sessão vai junto)"""
+    origem = cabecalhos.get('origin')
+    if not origem:
+        return True
+    return urlparse(origem).netloc == cabecalhos.get('host')
+
+
+@sync_to_async
+def _membro_autenticado(cabecalhos, comunidade_id):
+    """Usuário da sessão (cookie) se ele for membro da comunidade, senão None"""
+    close_old_connections()
+    try:
+        cookies = SimpleCookie()
+        cookies.load(cabecalhos.get('cookie', ''))
+        sessao = cookies.get(settings.SESSION_COOKIE_NAME)
+        if not sessao:
+            return None
+
+        engine = import_module(settings.SESSION_ENGINE)
+        usuario = get_user(SimpleNamespace(session=engine.SessionStore(sessao.value)))
+        if not usuario.is_authenticated:
+            return None
+        if papel_do_membro(comunidade_id, usuario.id) is None:
+            return None
+        return usuario
+    finally:
+        close_old_connections()
+
+
+@sync_to_async
+def _ainda_membro(comunidade_id, usuario_id):
+    close_old_connections()
+    try:
+        return papel_do_membro_no_banco(comunidade_id, usuario_id) is not None
+    finally:
+        close_old_connections()
+
+
+async def aplicacao_websocket(scope, receive, send):
+    """ws(s)://<host>/ws/comunidade/<id>/ — envia cada evento da comunidade como JSON"""
+    if (await receive())['type'] != 'websocket.connect':
+        return
+
+    rota = ROTA_CHAT.match(scope['path'])
+    if not rota:
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+
+    cabecalhos = _cabecalhos(scope)
+    comunidade_id = int(rota.group('comunidade_id'))
+    usuario = None
+    if _origem_permitida(cabecalhos):
+        usuario = await _membro_autenticado(cabecalhos, comunidade_id)
+    if not usuario:
+        await send({'type': 'websocket.close', 'code': 4403})
+        return
+
+    await send({'type': 'websocket.accept'})
+    assinatura = assinar(comunidade_id, usuario.id)
+    recebendo = asyncio.ensure_future(receive())
+    proximo = asyncio.ensure_future(assinatura.proximo())
+    recheck = getattr(settings, "CHAT_MEMBRO_RECHECAGEM", 60)
+    loop = asyncio.get_running_loop()
+    rechecar_em = loop.time() + recheck
+    try:
+        while True:
+            await asyncio.wait({recebendo, proximo}, timeout=recheck, return_when=asyncio.FIRST_COMPLETED)
+
+            # Expulsão feita em outro processo não chega pelo pub/sub local
+            if loop.time() >= rechecar_em:
+                rechecar_em = loop.time() + recheck
+                if not await _ainda_membro(comunidade_id, usuario.id):
+                    await send({'type': 'websocket.send', 'text': json.dumps(EVENTO_REMOVIDO)})
+                    await send({'type': 'websocket.close', 'code': 4403})
+                    break
+
+            if proximo.done():
+                evento = proximo.result()
+                await send({'type': 'websocket.send', 'text': json.dumps(evento)})
+                if evento == EVENTO_REMOVIDO:
+                    await send({'type': 'websocket.close', 'code': 4403})
+                    break
+                proximo = asyncio.ensure_future(assinatura.proximo())
+
+            if recebendo.done():
+                if recebendo.result()['type'] == 'websocket.disconnect':
+                    break
+                # Mensagens do cliente são ignoradas (o envio é pela API HTTP)
+                recebendo = asyncio.ensure_future(receive())
+    finally:
+        proximo.cancel()
+        recebendo.cancel()
+        cancelar_assinatura(assinatura)
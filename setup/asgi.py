@@ -3,4 +3,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'setup.settings')
 
-application = get_asgi_application()
\ No newline at end of file
+django_application = get_asgi_application()
+
+# Importado depois do setup do Django (usa os models)
+from backstage.websocket import aplicacao_websocket  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """HTTP (inclusive o SSE do chat) vai para o Django; WebSocket para o canal do chat"""
+    if scope['type'] == 'websocket':
+        await aplicacao_websocket(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
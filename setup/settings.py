@@ -63,6 +63,10 @@ INSTALLED_APPS = [
     "whitenoise.runserver_nostatic",
 ]
 
+# Lookups de trigrama (busca de usuários) no PostgreSQL
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    INSTALLED_APPS.append('django.contrib.postgres')
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -97,6 +101,65 @@ WSGI_APPLICATION = 'setup.wsgi.application'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Backend compartilhado entre processos (ex.: django.core.cache.backends.redis.RedisCache
+# ou filebased.FileBasedCache). Em desenvolvimento, memória local.
+# Em produção com mais de um worker use Redis ou Memcached: locks, versão do
+# chat e long-polling dependem de um cache visível a todos os processos. Com
+# LocMem o long-poll relê o banco a cada CHAT_LONG_POLL_INTERVALO_LOCAL segundos.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'backstage'),
+    }
+}
+
+# Camada LRU em memória de cada processo, na frente do backend acima
+CACHE_LOCAL_MAX_ITENS = int(os.getenv('CACHE_LOCAL_MAX_ITENS', '1000'))
+CACHE_LOCAL_TTL = int(os.getenv('CACHE_LOCAL_TTL', '300'))
+
+# Proteção contra stampede: um único worker atualiza cada chave expirada
+# enquanto os demais recebem o valor antigo (stale-while-revalidate)
+CACHE_REVALIDAR_EM_SEGUNDO_PLANO = True
+CACHE_STALE_TTL = 60
+CACHE_LOCK_TTL = 30
+CACHE_SINGLE_FLIGHT_TIMEOUT = 15
+
+# Aquecimento do cache (comando aquecer_cache ou agendador dentro do processo)
+AQUECIMENTO_AGENDADOR_ATIVO = os.getenv('AQUECIMENTO_AGENDADOR_ATIVO', '0').lower() in ['true', 't', '1']
+AQUECIMENTO_INTERVALO = 600  # segundos entre ciclos
+AQUECIMENTO_JITTER = 60  # variação aleatória do intervalo, em segundos
+AQUECIMENTO_JANELA_MINUTOS = 30  # aquecer o que vence dentro desta janela
+AQUECIMENTO_TOP_FILMES = 50
+AQUECIMENTO_MAX_WORKERS = 4
+ACESSOS_INTERVALO_GRAVACAO = 60
+
+# Busca de usuários: similaridade mínima de trigramas (PostgreSQL) e máximo de resultados
+BUSCA_USUARIOS_SIMILARIDADE = 0.3
+BUSCA_USUARIOS_LIMITE = 10
+
+# Chat em tempo real (WebSocket em setup/asgi.py, SSE como alternativa). Exige servidor ASGI, ex.:
+#   gunicorn setup.asgi:application -k uvicorn.workers.UvicornWorker
+# O pub/sub é por processo: com vários workers, o cliente recebe na hora o que foi
+# enviado pelo mesmo worker e o resto pelo poll de reconciliação (catchUpInterval em community-chat.js).
+CHAT_FILA_MAX_EVENTOS = 100  # eventos pendentes por conexão antes de descartar os mais antigos
+CHAT_SSE_DURACAO = 300  # segundos até o servidor encerrar o stream (o navegador reconecta)
+CHAT_SSE_PING = 15
+CHAT_MEMBRO_RECHECAGEM = 60  # segundos entre conferências no banco se quem está conectado ainda é membro
+
+# Long-polling do chat (obter_mensagens_novas?espera=N)
+CHAT_LONG_POLL_MAX = 25  # espera máxima por requisição, em segundos
+CHAT_LONG_POLL_INTERVALO = 1  # releitura da versão no cache (mensagens de outros processos)
+CHAT_LONG_POLL_INTERVALO_LOCAL = 10  # releitura no banco quando o cache é por processo (LocMem)
+CHAT_VERSAO_TTL = 300
+CHAT_VERSAO_LOCK_TTL = 2  # lock do compare-and-set da versão (cache.add)
+CHAT_HISTORICO_MAX = 100  # mensagens por página no histórico do chat
+CHAT_MEMBROS_TTL = 3600  # mapa de membros/papéis por comunidade (invalidado a cada mudança)
+CHAT_MEMBROS_TTL_LOCAL = 30  # mesmo mapa quando o cache é por processo (LocMem não invalida os outros workers)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -159,7 +222,26 @@ TMDB_IMAGE_BASE_URL = "https://image.tmdb.org/t/p/"
 TMDB_BACKDROP_BASE_URL = "https://image.tmdb.org/t/p/original/"
 TMDB_DEFAULT_REGION = "BR"
 
+# ===== Pool de conexões HTTP (TMDb / OMDB) =====
+# Sessão compartilhada com keep-alive; o tamanho do pool é por host
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+
+# Circuit breaker por serviço externo: abre após N falhas seguidas e recusa
+# chamadas por alguns segundos antes de testar de novo
+DISJUNTOR_LIMITE_FALHAS = 5
+DISJUNTOR_TEMPO_ABERTO = 30
+# Tempo (segundos) que um ID inexistente na TMDb/OMDB fica em cache negativo
+CACHE_NEGATIVO_TTL = 300
+
+# Montagem do payload de filmes: 'append' (1 requisição) ou 'paralelo' (3 simultâneas)
+TMDB_PAYLOAD_MODO = os.getenv("TMDB_PAYLOAD_MODO", "append")
+# Limite de threads para chamadas simultâneas à TMDb
+TMDB_MAX_WORKERS = int(os.getenv("TMDB_MAX_WORKERS", "8"))
+
 # ===== Configurações OMDB API =====
 # API para obter ratings do Metacritic e Rotten Tomatoes
 OMDB_API_KEY = os.getenv("OMDB_API_KEY", "2d97868b")
-OMDB_BASE_URL = "http://www.omdbapi.com/"
\ No newline at end of file
+OMDB_BASE_URL = "http://www.omdbapi.com/"
+# Validade dos ratings do OMDB guardados no payload do filme (FilmeCache)
+OMDB_TTL_HORAS = 168
\ No newline at end of file